@@ -1,58 +1,75 @@
+import glob
+import os
 import pandas as pd
-import numpy
-import seaborn
-import matplotlib.pyplot as plt
-import matplotlib as mpl
-import numpy as np
-from sklearn.model_selection import train_test_split
-from sklearn.ensemble import RandomForestClassifier as rfc
-from sklearn.metrics import classification_report, confusion_matrix, accuracy_score
-from sklearn.svm import SVC as svc
-from sklearn.linear_model import LogisticRegression
-from sklearn import datasets
-
-def create_csv_file_with_remain_time(data_set, path, file_name):
-    list_size = len(data_set)
-    end_index = 0
-    start_index = 0
-    index_is_set = False
-    working_time = 0
-
-    #Looping from the beginn of the csv file to the end to set r_t
-    while(end_index < list_size):
-
-        #set the start range
-        if(not index_is_set):
-            start_index = end_index
-            index_is_set = True
-
-        #if broken the end range have been found and the r_t can be setted beginning from the start_index
-        if (data_set['status'].iloc[end_index] == "BROKEN"):
-            working_time = data_set['working_time'].iloc[end_index]
-            while(start_index <= end_index):
-                    data_set['remain_time'].iloc[start_index] = working_time - data_set['working_time'].iloc[start_index]
-                    start_index += 1
-
-        end_index += 1
-
-    while(start_index < list_size):
-        data_set = data_set.drop(start_index)
-        start_index += 1
-
-    #Write to given filename
-    data_set.to_csv(str(path)+str(file_name), index = False, header = True)
 
-#Inputs
-csv_file_path = "~/machine_reports.csv" #input("Path to Machine Report file: ")
-result_csv_file_path = "~/" #input("Path to result csv directory: ")
-amount_of_machines = 3 #int(input("Amount of Machines: "))
+def label_chunk(data_set, carry):
+    #Labels the rows of one chunk with the r_t. The rows of every machine are split in segments that end with an BROKEN row,
+    #the r_t of an row is the working_time at the BROKEN row minus its working_time.
+    #The last segment of an machine that isnt BROKEN yet is kept in carry (MACHINE_ID -> rows) and labeled with the next chunk
+    labeled = []
+
+    for machine_id, rows in data_set.groupby('MACHINE_ID', sort=False):
+        if machine_id in carry:
+            rows = pd.concat([carry.pop(machine_id), rows], ignore_index=True)
+        else:
+            rows = rows.reset_index(drop=True)
+
+        broken = (rows['status'] == "BROKEN").to_numpy()
+
+        #Segment of every row: the amount of BROKEN rows before it
+        segment = pd.Series(broken).shift(fill_value=False).cumsum().to_numpy()
+
+        #Rows after the last BROKEN row -> wait for the next chunk
+        complete = segment < broken.sum()
+        if not complete.all():
+            carry[machine_id] = rows[~complete]
+
+        if complete.any():
+            rows = rows[complete].copy()
+            rows['remain_time'] = rows.groupby(segment[complete])['working_time'].transform('last') - rows['working_time']
+            labeled.append((machine_id, rows))
 
-df = pd.read_csv(csv_file_path)
+    return labeled
 
-i = 0
-while (i < amount_of_machines):
-    create_csv_file_with_remain_time(df.loc[df['MACHINE_ID'] == i], result_csv_file_path, "machine_" + str(i) + ".csv")
-    print("Created at"+ result_csv_file_path + "machine_" + str(i) + ".csv")
-    i += 1
+def read_machine_report(path, chunk_size):
+    #Yields the machine report in chunks of about chunk_size rows, so files larger than the memory can be labeled
+    #Arrow archive of the edge device (RECORD_FORMAT=arrow): the rotated parts (name.1.arrows, ...) and the actual file.
+    #The files are memory mapped, so only the decompressed columns of one record batch are loaded
+    path = os.path.expanduser(path)
+    if path.endswith(".arrows"):
+        import pyarrow as pa
+        root = path[:-len(".arrows")]
+        parts = sorted((p for p in glob.glob(glob.escape(root) + ".*.arrows") if p[len(root) + 1:-len(".arrows")].isdigit()),
+                       key=lambda p: int(p[len(root) + 1:-len(".arrows")]))
+        if os.path.isfile(path):
+            parts.append(path)
+        for part in parts:
+            for batch in pa.ipc.open_stream(pa.memory_map(part)):
+                data_set = batch.to_pandas()
+                data_set['status'] = data_set['status'].astype(str)
+                yield data_set
+        return
+
+    yield from pd.read_csv(path, chunksize=chunk_size)
+
+def create_csv_files_with_remain_time(path, result_path, chunk_size):
+    #Labels the machine report in one pass and appends the rows of every machine to machine_MACHINE_ID.csv.
+    #The machine ids are taken from the data. Rows after the last BROKEN row of an machine have no r_t and are dropped
+    carry = {}
+    created = set()
+
+    for data_set in read_machine_report(path, chunk_size):
+        for machine_id, rows in label_chunk(data_set, carry):
+            file_name = os.path.join(os.path.expanduser(result_path), "machine_" + str(machine_id) + ".csv")
+            rows.to_csv(file_name, mode='a' if machine_id in created else 'w', index=False, header=machine_id not in created)
+            created.add(machine_id)
+
+    for machine_id in sorted(created, key=str):
+        print("Created at " + os.path.join(result_path, "machine_" + str(machine_id) + ".csv"))
+
+#Inputs
+csv_file_path = "~/machine_reports.csv" #input("Path to Machine Report file (.csv or .arrows): ")
+result_csv_file_path = "~/" #input("Path to result csv directory: ")
+chunk_size = 1000000 #int(input("Rows per chunk: "))
 
-#print(df['status'].iloc[0])
\ No newline at end of file
+create_csv_files_with_remain_time(csv_file_path, result_csv_file_path, chunk_size)
@@ -1,39 +1,41 @@
-from airtable import Airtable
+import json
 import os
 import random
-import time
+import sys
+
+# generate_jobs() and load_workload() of the headless simulator, the simulator puts project/edge-device on the path for the job table
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "project", "simulator"))
+
+from simulator import generate_jobs, load_workload
+from job_table import open_job_table
 
 # Set Env Variables
-AIRTABLE_BASE_KEY   = os.environ["AIRTABLE_BASE_KEY"]
-AIRTABLE_API_KEY    = os.environ["AIRTABLE_API_KEY"]
-AIRTABLE_TABLE_NAME = os.environ["AIRTABLE_TABLE_NAME"]
+JOBS                = int(os.environ.get("JOBS", 10))                                   # Amount of jobs
+MIX                 = tuple(os.environ.get("MIX", "hard,normal,soft").split(","))        # Job types to choose from, an type can be repeated to weight it
+JOB_TIME            = tuple(int(value) for value in os.environ.get("JOB_TIME", "5-30").split("-"))     # Lowest-highest job_time
+QUANTITY            = tuple(int(value) for value in os.environ.get("QUANTITY", "1-14").split("-"))     # Lowest-highest quantity
+SEED                = os.environ.get("SEED", "0")                                       # Seed of the jobs, the same SEED gives the same jobs
+WORKLOAD            = os.environ.get("WORKLOAD", "workload.json")                       # Workload file (JSON list of jobs)
+REPLAY              = os.environ.get("REPLAY", "False") != "False"                      # True -> load the existing WORKLOAD instead of generating it
+LOAD                = os.environ.get("LOAD", "True") != "False"                         # True -> insert the jobs into the job table
+JOB_TABLE_BACKEND   = os.environ.get("JOB_TABLE_BACKEND", "airtable")                   # airtable (AIRTABLE_*) or local (LOCAL_JOB_TABLE)
+WRITE_JOB_ID        = os.environ.get("WRITE_JOB_ID", str(JOB_TABLE_BACKEND == "local")) != "False"     # False -> the table numbers the jobs (autonumber of the Airtable)
+
+# Generate the jobs and write them to the workload file, or read an existing workload file
+if REPLAY:
+    jobs = load_workload(WORKLOAD)
+    print("Read " + str(len(jobs)) + " jobs from " + WORKLOAD)
+else:
+    jobs = generate_jobs(JOBS, random.Random(SEED), MIX, QUANTITY, JOB_TIME)
 
-i = 0
-# Loop
-while i < 10:
-    
-    # Get Unfinished Jobs
-    if len(Airtable(AIRTABLE_BASE_KEY, AIRTABLE_TABLE_NAME, AIRTABLE_API_KEY).search('status','unfinished')) < 10:
-        
-        # Generate random job type
-        job_type = random.randint(0,2)
-        
-        if job_type == 0:
-            job_type = "hard"
-        elif job_type == 1:
-            job_type = "normal"
-        elif job_type == 2:
-            job_type = "soft"
-        
-        job_time = random.randint(5,30)
+    with open(WORKLOAD + ".tmp", "w") as workload_file:
+        json.dump(jobs, workload_file, indent=1)
+    os.replace(WORKLOAD + ".tmp", WORKLOAD)
 
-        #Insert Job into Airtable
-        Airtable(AIRTABLE_BASE_KEY, AIRTABLE_TABLE_NAME, AIRTABLE_API_KEY).insert({"job_time": job_time, "remaining_job_time": job_time , "quantity": random.randint(1,14), "type": job_type,"status": "unfinished"})
-        print("Insert new Job: "+str(i))
-        i += 1
+    print("Wrote " + str(len(jobs)) + " jobs (SEED " + SEED + ") to " + WORKLOAD)
 
-    else:
-        print("Unfinished Job exist")
-        time.sleep(5)
-    
-    
\ No newline at end of file
+# Insert all jobs with batch inserts (the Airtable wrapper sends 10 records per request)
+if LOAD:
+    records = [job if WRITE_JOB_ID else {field: value for field, value in job.items() if field != "JOB_ID"} for job in jobs]
+    open_job_table(JOB_TABLE_BACKEND).batch_insert(records)
+    print("Inserted " + str(len(records)) + " jobs into the job table (" + JOB_TABLE_BACKEND + ")")
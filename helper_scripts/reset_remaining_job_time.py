@@ -1,32 +1,66 @@
-from airtable import Airtable
 import os
-import random
-import time
+import sys
+
+# The job table of the edge device (Airtable or local JSON file)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "project", "edge-device"))
+
+from job_table import open_job_table
 
 # Set Env Variables
-AIRTABLE_BASE_KEY   = os.environ["AIRTABLE_BASE_KEY"]
-AIRTABLE_API_KEY    = os.environ["AIRTABLE_API_KEY"]
+JOB_TABLE_BACKEND   = os.environ.get("JOB_TABLE_BACKEND", "airtable")                   # airtable (AIRTABLE_BASE_KEY, AIRTABLE_TABLE_NAME, AIRTABLE_API_KEY) or local (LOCAL_JOB_TABLE)
+DRY_RUN             = os.environ.get("DRY_RUN", "False") != "False"                     # True -> only print the resets
+PRESERVE_PROGRESS   = os.environ.get("PRESERVE_PROGRESS", "False") != "False"           # True -> processing jobs keep their last remaining_job_time
+RESET_FINISHED      = os.environ.get("RESET_FINISHED", "True") != "False"               # True -> jobs with remaining_job_time = 0 start again from job_time
+BATCH_SIZE          = int(os.environ.get("BATCH_SIZE", 10))                             # Records per update request (the Airtable allows 10)
+
+def reset_fields(fields):
+    #Fields that reset an job or None if the job doesnt need an reset
+    job_time = fields.get("job_time", 0)
+
+    #Stuck jobs -> unfinished, with the last reported progress or from the beginning
+    if fields.get("status") == "processing":
+        remaining_job_time = job_time
+        if PRESERVE_PROGRESS and fields.get("remaining_job_time", 0) > 0:
+            remaining_job_time = fields["remaining_job_time"]
+        reset = {"remaining_job_time": remaining_job_time, "status": "unfinished"}
+
+    #Done jobs -> start again
+    elif RESET_FINISHED and fields.get("remaining_job_time", 0) == 0:
+        reset = {"remaining_job_time": job_time, "status": "unfinished"}
+
+    else:
+        return None
+
+    #Lease and owner of the edge device (only when the table has these columns)
+    if "lease_expires" in fields:
+        reset["lease_expires"] = 0
+    if "owner" in fields:
+        reset["owner"] = ""
 
-list_of_jobs = Airtable(AIRTABLE_BASE_KEY, 'Job', AIRTABLE_API_KEY).search("status", "processing")
-i = 0
+    return reset
 
-# Update where status = processing
-while i < len(list_of_jobs):
-    
-    fields      = {"remaining_job_time": list_of_jobs[i]["fields"]["job_time"], "status": "unfinished"}
-    Airtable(AIRTABLE_BASE_KEY, 'Job', AIRTABLE_API_KEY).update_by_field("JOB_ID", list_of_jobs[i]["fields"]["JOB_ID"] ,fields)
-    
-    i += 1
+# Fetch the whole table once
+table   = open_job_table(JOB_TABLE_BACKEND)
+records = table.get_all()
 
+# Compute all resets in memory
+updates = []
+for record in records:
+    fields = reset_fields(record["fields"])
+    if fields is not None:
+        updates.append({"id": record["id"], "fields": fields})
 
-list_of_jobs = Airtable(AIRTABLE_BASE_KEY, 'Job', AIRTABLE_API_KEY).search('remaining_job_time',0)
-i = 0
+print("Jobs: " + str(len(records)) + ", resets: " + str(len(updates)) + (" (dry run)" if DRY_RUN else ""))
 
-# Update where remaining_job_time = 0
-while i < len(list_of_jobs):
-    
-    fields      = {"remaining_job_time": list_of_jobs[i]["fields"]["job_time"], "status": "unfinished"}
-    Airtable(AIRTABLE_BASE_KEY, 'Job', AIRTABLE_API_KEY).update_by_field("JOB_ID", list_of_jobs[i]["fields"]["JOB_ID"] ,fields)
-    
-    i += 1
+if DRY_RUN:
+    fields_by_id = {record["id"]: record["fields"] for record in records}
+    for update in updates:
+        fields = fields_by_id[update["id"]]
+        print("JOB_ID " + str(fields.get("JOB_ID")) + ": " + str(fields.get("status")) + ", remaining_job_time " + str(fields.get("remaining_job_time"))
+              + " -> " + str(update["fields"]["status"]) + ", remaining_job_time " + str(update["fields"]["remaining_job_time"]))
+    sys.exit(0)
 
+# Apply the resets with batch updates, the job table keeps the requests under AIRTABLE_REQUESTS_PER_SECOND and retries throttled requests
+for start in range(0, len(updates), BATCH_SIZE):
+    table.batch_update(updates[start:start + BATCH_SIZE])
+    print("Reset " + str(min(start + BATCH_SIZE, len(updates))) + "/" + str(len(updates)))
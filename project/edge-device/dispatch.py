@@ -0,0 +1,100 @@
+"""Dispatch
+
+Decisions of the edge device without Mqtt and database, shared by edge-device.py and the headless
+simulator (project/simulator/simulator.py): which job an RUNNABLE machine gets and how long an
+broken machine gets repaired.
+
+Functions:
+    * choose_job(jobs, machine, prediction): tuple          - Decides what an RUNNABLE machine gets: an job, an riskly job, an maintenance or nothing.
+
+    * repair_time(rng, repair_time, total_damage_repair_time, total_damage_probability): int
+                                                            - Repair time of an broken machine.
+"""
+
+# -------------------------------- Variables -------------------------------- #
+
+REPAIR_TIME                 = 5         # Constant repair time (also for an maintenance instead of an riskly job)
+TOTAL_DAMAGE_REPAIR_TIME    = 50        # Constant total damage repair time
+TOTAL_DAMAGE_PROBABILITY    = 80        # Probability (0 - 100) that an broken machine has an total damage
+
+WAIT                        = "wait"        # No job -> the machine has to wait
+JOB                         = "job"         # Job that fits under the remain_time or the shortest job without prediction
+RISKY_JOB                   = "risky"       # Shortest job although it doesnt fit under the remain_time
+MAINTANCE                   = "maintance"   # No job fits -> the machine gets repaired before it breaks
+
+# -------------------------------- Functions -------------------------------- #
+
+def choose_job(jobs, machine, prediction):
+    """Decides what an RUNNABLE machine gets.
+    With prediction the largest job that is shorter then the remain_time of the machine is taken.
+    When there isnt any job_remain_time that is shorter then the remain_time of the machine then
+    decide between send machine to MAINTANCE (when machine.working_time > 0) or give machine
+    an riskly job (the shortest job).
+    Without prediction the shortest job is taken.
+    The job store can change between its calls (e.g. the sync thread), so when the job that was chosen is gone the machine waits.
+
+    Parameters
+    ----------
+    jobs : any
+        job store with ready_count(), shortest_job() and largest_job_under(limit) (e.g. JobStore)
+    machine : dict
+        the machine (remain_time and working_time are used)
+    prediction : bool
+        True if the remain_time of the machine is predicted
+
+    Returns
+    -------
+    tuple :
+        (WAIT, None), (JOB, job), (RISKY_JOB, job) or (MAINTANCE, None)
+    """
+    # When no job is unfinished the machine has to wait
+    if jobs.ready_count() <= 0:
+        return WAIT, None
+
+    # Without prediction give machine the shortest job
+    if not prediction:
+        job = jobs.shortest_job()
+        return (WAIT, None) if job is None else (JOB, job)
+
+    # Try to find the largest Job for the Machine that is shorter then the remain_time of the machine
+    job = jobs.largest_job_under(machine["remain_time"])
+    if job is not None:
+        return JOB, job
+
+    # The last jobs were taken in the meantime
+    if jobs.ready_count() <= 0:
+        return WAIT, None
+
+    # If the machine have worked before -> set repair time
+    if machine["working_time"] > 0:
+        return MAINTANCE, None
+
+    # Else the reason that any job for the machine didnt found is that the remain_time is to small
+    # But the Jobs must be done. So the only way to do the jobs is to take the risk and give the machine the smallest job
+    job = jobs.shortest_job()
+    return (WAIT, None) if job is None else (RISKY_JOB, job)
+
+def repair_time(rng, repair_time=REPAIR_TIME, total_damage_repair_time=TOTAL_DAMAGE_REPAIR_TIME, total_damage_probability=TOTAL_DAMAGE_PROBABILITY):
+    """Repair time of an broken machine. With an probability of total_damage_probability the machine has an
+    total damage and gets an huge repair time.
+
+    Parameters
+    ----------
+    rng : random.Random
+        random values of the edge device
+    repair_time : int
+        constant repair time
+    total_damage_repair_time : int
+        constant total damage repair time
+    total_damage_probability : int
+        probability (0 - 100) of an total damage
+
+    Returns
+    -------
+    int :
+        remaining_repair_time for the machine
+    """
+    # Check if Totaldamage is present. If true set an huge repairtime
+    if rng.randint(0,100) < total_damage_probability:
+        return total_damage_repair_time
+    return repair_time
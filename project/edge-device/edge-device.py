@@ -5,32 +5,66 @@ virtual orders that are received via an interface to the database (Airtable).
 With the approaches of edge computing and communication via an Mqtt protocol,
 these virtual machines are supplied with orders so that the orders are also processed in a cyclical rhythm.
 The orders are processed by using a machine learning approach wich will be more accurancy after an amount of data have saved.
-To save the data, an Azure Storage (Blob Storage) must be created and the connection string must be setted via an ENV variable. The KI will be setted
-after an model get downloaded from the cloud. If all Jobs have been done an csv file with the machine data will be uploaded to the cloud.
+To save the data, an Azure Storage (Blob Storage) must be created and the connection string must be setted via an ENV variable
+(or STORAGE_BACKEND=local is used to keep the files in an local directory, see storage.py). With JOB_TABLE_BACKEND=local
+the jobs are read from an JSON file instead of the Airtable (see job_table.py). The KI will be setted
+after an model get downloaded from the cloud. An new version of the model in the cloud is loaded in the background every
+__MODEL_RELOAD_INTERVAL seconds and replaces the KI between two predictions without an restart (see reload_model()).
+An model that was compiled to an JSON artifact (PATH_TO_ML_FILE=*.json, see model_artifact.py) is evaluated with NumPy,
+then sklearn and joblib are not imported. If all Jobs have been done an csv file with the machine data will be uploaded to the cloud.
 To establish the communication between machines and edge-device an Mqtt broker has to be started which can be reached via "localhost: 1883".
 The communication to the cloud is etablished via the IoT-Hub wich will be reached with the connection string.
 
 This script can be started without any arguments.
+At the end of the startup an report with the duration of every startup step, the amount of loaded modules
+and the memory usage is printed. With STARTUP_PROFILE=True it also prints which packages every step imported
+(for the import time of every module start with PYTHONPROFILEIMPORTTIME=1).
 
 Required imports: 
-    - airtable-python-wrapper
+    - airtable-python-wrapper                               (only loaded with JOB_TABLE_BACKEND=airtable)
     - paho-mqtt
-    - pandas
-    - sklearn
+    - sklearn                                               (only loaded with PREDICTION=True and an pickled model or ONLINE_TRAINING=True)
     - azure-iot-device
     - azure-iot-hub
     - azure-iothub-service-client
     - azure-iothub-device-client
-    - azure-storage-blob
-    - joblib
-
-The main loop will go through the machine list and check the states of the machines. 
+    - azure-storage-blob                                    (only loaded with STORAGE_BACKEND=azure)
+    - joblib                                                (only loaded with PREDICTION=True and an pickled model)
+    - numpy                                                 (only loaded with PREDICTION=True)
+    - pyarrow                                               (only loaded with RECORD_FORMAT=arrow)
+
+The main loop is event driven. It sleeps until an event arrives and handles only the machines that are affected by it:
+    * an message on machines/                               - the machine that send the message gets handled.
+    * an change in the job table                            - the RUNNABLE machines get handled (they can get an job now).
+    * an claimed job (scale-out)                            - the job is deployed to the machine that it was claimed for.
+    * an tick (every __TICK_INTERVAL seconds)               - the RUNNABLE machines and machines that didnt answer an command get handled
+                                                              and the upload of the data is checked.
+After the edge device sent an command to an machine (job, repair time, finished job) it waits until the machine reports the
+expected state, so the state transition is handled exactly once. When the machine doesnt answer within __ACK_TIMEOUT
+seconds the machine gets handled again.
+Machines with CLOCK_MODE=ack (see machine.py) get an message on ack/MACHINE_ID after their message was handled,
+so they start the next cycle as fast as the edge device can handle them. With SEED the repair times are reproducible.
+With EDGE_ID several edge device instances share the machines and the jobs of the same job table (scale-out, see membership.py).
+Every instance handles only the machines that it owns, the messages of the other machines are dropped. When an instance joins
+or leaves, the machines are rebalanced (see rebalance()). The jobs are not partitioned: every instance can deploy every job that is
+not processed by an other alive instance, so no machine waits while an other instance still has jobs. The processing jobs of an
+instance that left wait __OWNER_GRACE seconds for the new owner of their machine, that writes itself as owner directly. Every job is claimed in the db
+before it gets deployed (see JobStore.claim()), that makes it unlikely that two instances deploy the same job, but not impossible.
+The claim runs in the background thread of the job store, the machine stays RUNNABLE until the result arrives as event (see claimed_job()).
+With LEASE_TIME an deployed job gets an lease (lease_expires) of __LEASE_TIME seconds that is renewed by the messages of the WORKING machine
+together with the remaining_job_time. When the edge device dies the lease expires and an other instance gives the job back
+(see JobStore.expire_leases()). When the machine dies (no message for __LEASE_TIME seconds) the edge device forgets the machine at the
+next tick and ends the lease of its job (see forget_dead_machines()). Either way the job gets unfinished again and is deployed again
+with the progress that was reported last.
+The leases need the column lease_expires and the scale-out the column owner in the job table, they are checked at the start.
 It will react to three states:
     * RUNNABLE                                              - When an machine is RUNNABLE it will call the deploy_job function 
                                                               with the index for the actual machine.
     
     * WORKING                                               - When an machine is WORKING the edge device will publish an predicted 
                                                               remain_time for the machine with his actual values at this moment.
+                                                              The remain_time of all machines that sent an message in one cycle is predicted
+                                                              with one call of the KI (see predict_remain_times()).
                                                               When the job have be done then it will publish to the machine that the machine can change
                                                               his state to RUNNABLE and it will take the job from the machine and write it as finished back to the DB.
                                                               When an machine have taken an riskly job (see below: deploy_job()) and finished it succesfully,
@@ -43,38 +77,84 @@ It will react to three states:
 Functions: 
     * on_connect(client, userdata, flags, rc): none         - Gets triggered when the client connect to the Mqtt broker.
 
-    * on_message(client, userdata, msg): none               - Gets messages that are sended to the topic machines/#. When __record_machine_data == True 
+    * on_message(client, userdata, msg): none               - Gets messages that are sended to the topic machines/#. The message is decoded once
+                                                              (JSON or binary, see telemetry.py) and machines that support the binary format get
+                                                              told to switch on telemetry_format/MACHINE_ID. When __record_machine_data == True 
                                                               then it will save the Machine data in a csv file.
-                                                              At the end it will update the machine variables.
+                                                              At the end it will put the machine as event to the main loop.
+
+    * handle_machine(machine_index): none                   - Reacts to the state of the machine (RUNNABLE, WORKING, BROKEN). Gets called by the main loop.
+
+    * predict_remain_times(machines): none                  - Predicts the remain_time of all given machines with one call of the KI and publishes
+                                                              the remain_time to every machine where it changed.
 
-    * deploy_job(machine_index): none                       - Gets unfinished jobs from Airtable and deploys the makeable job 
+    * expect_machine_state(machine_index, status, JOB_ID): none
+                                                            - Remembers that the edge device sent an command to the machine and waits for the
+                                                              machine to report the status (and JOB_ID).
+
+    * deploy_job(machine_index): none                       - Takes an unfinished job from the ready queue of the job store and deploys the largest makeable job 
                                                               to the given machine (machine_index). For an Machine its makeable when
                                                               machine.remain_time > job.remain_time. When there isnt any Job that 
                                                               is shorter then the machine.remain_time then send the machine to the Maintance before
                                                               its gets broken but only if the machine worked before (machine.wokring_time > 0). 
                                                               When machine.working_time == 0 then give the machine the shortest Job 
-                                                              that is over the remain_time (riskly job).
+                                                              that is over the remain_time (riskly job). Without prediction the shortest job is deployed.
+
+    * start_job(machine_index, job): none                   - Publishes the job to the machine and sets it on processing.
+
+    * claimed_job(MACHINE_ID, JOB_ID, won): none            - Starts an claimed job on its machine or gives it back when the claim was lost.
 
-    * update_machine_list(msg): none                        - Gets triggered in the on_message function.
+    * update_machine_list(machine): int                         - Gets triggered by the main loop for every message of an machine.
                                                               Only if an Machine update his Values or an new Machine send his 
                                                               first Message will trigger this method.
                                                               It will add an new Machine to the list or change values of an already exist Machine in the List.
-                                                              When an Machine gets registered for the first time or after an MAINTANCE it will become an predicted remain_time.
+                                                              When an Machine gets registered for the first time or after an MAINTANCE it will be put to
+                                                              __unpredicted to become an predicted remain_time. Returns the index of the machine in the list or None.
     
-    * set_job(JOB_ID, field, value): none                   - Updates an exist Entry in the DB (Airtable). 
+    * is_job_ready(fields): bool                            - Decides if an job can be deployed by this instance (unfinished and not claimed).
+
+    * renew_lease(JOB_ID, remaining_job_time): none         - Renews the lease of an job (heartbeat of the WORKING machine).
+
+    * is_claimed(fields): bool                              - True if an job is processed by an other alive instance.
+
+    * expires_lease(fields): bool                           - True if this instance gives the job back when its lease expired.
+
+    * forget_dead_machines(): none                          - Forgets the WORKING machines without an message for __LEASE_TIME seconds
+                                                              and ends the lease of their jobs.
+
+    * rebalance(): none                                     - Forgets the machines that belong to an other instance after an instance joined or left.
+
+    * set_job(JOB_ID, field, value): none                   - Updates an exist Entry in the job store. The DB (Airtable) gets updated write-behind. 
 
-    * write_machine_info_in_csv_file(machine, path): none   - This method just used to generate an Trainings csv file.
-                                                              It will write the Machine values in an csv file except when an Machine is at MAINTANCE
-                                                              and except the remain_time of the machine.
+    * write_machine_info_in_csv_file(machine): none         - This method just used to generate an Trainings csv file.
+                                                              It will put the Machine values to the telemetry sink (see telemetry_sink.py) that writes
+                                                              them buffered in an csv file except when an Machine is at MAINTANCE
+                                                              and except the remain_time of the machine. With RECORD_FORMAT=arrow the values
+                                                              are written in the columnar archive format instead (see telemetry_archive.py).
+                                                              With RECORD_LABELED=True (default) the rows are labeled online with the remain_time
+                                                              when the machine breaks (see telemetry_labeler.py), so the uploaded files are ready
+                                                              for the training. With ONLINE_TRAINING=True the labeled segments also train
+                                                              an incremental model in the background that replaces the KI when its
+                                                              better (see online_training.py).
+
+    * load_model(path): any                                 - Loads the KI-model from an JSON artifact or from an pickled model.
+
+    * reload_model(path, version): none                     - Loads an new version of the KI-model, validates it and swaps it into the prediction.
+
+    * train_segment(rows): none                             - Gives an labeled segment to the online training.
+
+    * print_job_table_stats(): none                         - Prints the calls, retries, throttled requests and latency of the job table (at exit).
 
     * all_jobs_is_done(): bool                              - This method will just check if all Jobs have been done.
                                                               True : If all jobs have been done
                                                               Flase: If any job exist that is unfinished
     
     * send_data_to_cloud(): none                            - This Method will upload the data to the an Container in the cloud.
-                                                              It will be an csv file of the machine data and will be named with the 
-                                                              actual time and date. For this the __CONNECTION_STRING_TO_AZURE_STORAGE
-                                                              and __CONTAINER_NAME need to be setted correct.
+                                                              It completes the actual file of the machine data. Every completed part is uploaded
+                                                              in the background by upload_telemetry_part().
+
+    * upload_telemetry_part(path): none                     - Queues an completed part of the machine data for the upload. It will be named with the
+                                                              actual time and date and the part number. After the upload the local file is renamed to *.uploaded.
 
     * check_if_data_can_uploaded(): none                    - This method will check if all Jobs have been done. When True then
                                                               it will call the method send_data_to_cloud() once until new jobs added
@@ -84,40 +164,96 @@ Functions:
 
 # -------------------------------- Imports -------------------------------- #
 
+# Heavy dependencies (sklearn, joblib, numpy, pyarrow, azure) are imported where the feature that needs them gets enabled
+
 import time
+__started                               = time.perf_counter()                               # Start of the edge device, for the startup report
 import random
+import atexit
 import os
-import csv
+import signal
+import sys
 import json
+import queue
+import resource
 import paho.mqtt.client as mqtt
-import pandas as pd
-import sklearn
-import joblib
-from azure.storage.blob import BlobServiceClient, BlobClient, ContainerClient
 from datetime import datetime
-from sklearn.neural_network import MLPClassifier
-from sklearn.preprocessing import StandardScaler
-from sklearn import preprocessing
-from sklearn.cluster import KMeans
-from sklearn.linear_model import LinearRegression
-from airtable import Airtable
+from job_table import open_job_table
+from job_store import JobStore
+from ready_queue import LEASE_EXPIRES, is_leased, is_unfinished
+from membership import Membership
+from telemetry_sink import UPLOADED, TelemetrySink
+from telemetry_labeler import TelemetryLabeler
+from storage import ModelCache, ModelWatcher, StorageUploader, open_storage
+import telemetry
+import dispatch
 
 # -------------------------------- Variables -------------------------------- #
 
-__AIRTABLE_TABLE_NAME                   = os.environ["AIRTABLE_TABLE_NAME"]                 # The db table name (Airtable)
-__AIRTABLE_BASE_KEY                     = os.environ["AIRTABLE_BASE_KEY"]                   # Env Variable to etablish an connection to the db
-__AIRTABLE_API_KEY                      = os.environ["AIRTABLE_API_KEY"]                    # Env Variable to etablish an connection to the db
-__CONNECTION_STRING_TO_AZURE_STORAGE    = os.environ["CONNECTION_STRING_TO_AZURE_STORAGE"]  # Env Variable to etablish an connection to the Azure Storage
-__CONTAINER_NAME                        = os.environ["CONTAINER_NAME"]                      # The Containername in the Cloud where the data get uploaded
+__JOB_TABLE_BACKEND                     = os.environ.get("JOB_TABLE_BACKEND", "airtable")   # airtable (AIRTABLE_TABLE_NAME, AIRTABLE_BASE_KEY, AIRTABLE_API_KEY) or local (LOCAL_JOB_TABLE)
+__STORAGE_BACKEND                       = os.environ.get("STORAGE_BACKEND", "azure")        # azure (CONNECTION_STRING_TO_AZURE_STORAGE, CONTAINER_NAME) or local (LOCAL_STORAGE_PATH)
+__storage                               = None                                              # Storage of the KI-model and the recorded data
+__MODEL_CACHE_DIR                       = os.environ.get("MODEL_CACHE_DIR", "model_cache")  # Local cache of the downloaded KI-model
+__MODEL_RELOAD_INTERVAL                 = float(os.environ.get("MODEL_RELOAD_INTERVAL", 60))        # Seconds between two checks for an new KI-model (0 -> no reload)
+__model_watcher                         = None                                              # Loads an new version of the KI-model in the background
+__uploader                              = None                                              # Uploads the recorded data in the background
 __machines                              = list()                                            # Actual registered machine list
 __prediction                            = os.environ["PREDICTION"]                          # Flag if ki prediction is wanted. If false deploy shortest job first 
-__REPAIR_TIME                           = 5                                                 # Constant repair time
-__TOTAL_DAMAGE_REPAIR_TIME              = 50                                                # Constant total damage repair time
+__REPAIR_TIME                           = dispatch.REPAIR_TIME                              # Constant repair time
+__TOTAL_DAMAGE_REPAIR_TIME              = dispatch.TOTAL_DAMAGE_REPAIR_TIME                 # Constant total damage repair time
 __path_to_ml_file                       = os.environ["PATH_TO_ML_FILE"]                     # ML file with filled right remain_time. IF __prediction == true this will be used
 __path_to_ml_file_without_r_t           = "machine_reports_without_remain_time.csv"         # ML file without remain_time. IF __prediction == false this will be used
 __uploaded                              = False                                             # Flag if the data get uploaded before 
 __record_machine_data                   = os.environ["RECORD_MACHINE_DATA"]                 # Flag if the data get saved in a csv file
+__telemetry_sink                        = None                                              # Buffered writer of the csv file
+__TELEMETRY_BUFFER_SIZE                 = int(os.environ.get("TELEMETRY_BUFFER_SIZE", 1 << 20))     # Write buffer of the csv file in bytes
+__TELEMETRY_FLUSH_INTERVAL              = float(os.environ.get("TELEMETRY_FLUSH_INTERVAL", 5))      # Seconds after that the write buffer gets flushed
+__TELEMETRY_MAX_BYTES                   = int(os.environ.get("TELEMETRY_MAX_BYTES", 64 << 20))      # Size after that the csv file gets rotated (0 -> no rotation)
+__RECORD_FORMAT                         = os.environ.get("RECORD_FORMAT", "csv")            # Format of the recorded data: csv or arrow (columnar archive, see telemetry_archive.py)
+__RECORD_COMPRESSION                    = os.environ.get("RECORD_COMPRESSION", "zstd")      # Compression of the arrow archive: zstd, lz4 or none
+__path_to_archive_file                  = "machine_reports_without_remain_time.arrows"      # Archive file without remain_time. IF __RECORD_FORMAT == arrow this will be used
+__RECORD_LABELED                        = os.environ.get("RECORD_LABELED", "True") != "False"       # Flag if the rows are labeled with the remain_time at the edge
+__RECORD_UNLABELED                      = os.environ.get("RECORD_UNLABELED", "False") != "False"    # Flag if rows of an segment without an break are written with an empty remain_time
+__path_to_labeled_file                  = "machine_reports.csv"                             # ML file with labeled remain_time. IF __RECORD_LABELED == true this will be used
+__path_to_labeled_archive_file          = "machine_reports.arrows"                          # Archive file with labeled remain_time. IF __RECORD_LABELED == true and __RECORD_FORMAT == arrow this will be used
+__labeler                               = None                                              # Labels the rows of every machine when it breaks
+__ONLINE_TRAINING                       = os.environ.get("ONLINE_TRAINING", "False") != "False"     # Flag if the KI is trained with the labeled segments while running (needs PREDICTION)
+__ONLINE_HOLDOUT                        = float(os.environ.get("ONLINE_HOLDOUT", 0.2))      # Part of the labeled segments that are used to compare the models
+__ONLINE_MIN_IMPROVEMENT                = float(os.environ.get("ONLINE_MIN_IMPROVEMENT", 0.05))     # Part by that the new model must be better to replace the KI
+__trainer                               = None                                              # Trains an incremental model in the background
 __ki                                    = None                                              # KI-Model 
+__STARTUP_PROFILE                       = os.environ.get("STARTUP_PROFILE", "False") != "False"     # Flag if the startup report lists the imported packages of every step
+__startup_steps                         = list()                                            # (name, seconds, imported packages) of every startup step
+__startup_modules                       = set(sys.modules)                                  # Modules that were loaded before the last startup step
+__startup_last                          = __started                                         # End of the last startup step
+__predictor                             = None                                              # Batched and memoized prediction with the KI-Model
+__unpredicted                           = dict()                                            # MACHINE_ID -> machine that needs an first remain_time
+__JOB_SYNC_INTERVAL                     = float(os.environ.get("JOB_SYNC_INTERVAL", 5))     # Seconds between two polls of modified jobs from the db
+__JOB_FLUSH_INTERVAL                    = float(os.environ.get("JOB_FLUSH_INTERVAL", 2))    # Seconds between two batch writes of the updated jobs to the db
+__CLAIM_SETTLE                          = float(os.environ.get("CLAIM_SETTLE", 0.5))        # Seconds between the claim of an job and its verification
+__job_store                             = JobStore(open_job_table(__JOB_TABLE_BACKEND),
+                                                   __JOB_SYNC_INTERVAL, flush_interval=__JOB_FLUSH_INTERVAL,
+                                                   on_change=lambda: __events.put(__JOBS_CHANGED),
+                                                   is_ready=lambda fields: is_job_ready(fields),
+                                                   is_claimed=lambda fields: is_claimed(fields), claim_settle=__CLAIM_SETTLE)    # Local copy of the job table
+__TICK_INTERVAL                         = float(os.environ.get("TICK_INTERVAL", 1))         # Seconds between two ticks of the main loop
+__ACK_TIMEOUT                           = float(os.environ.get("ACK_TIMEOUT", 10))          # Seconds to wait for an machine to answer an command
+__events                                = queue.Queue()                                     # Events for the main loop: decoded machine messages or __JOBS_CHANGED
+__JOBS_CHANGED                          = "JOBS_CHANGED"                                    # Event when the job table have been changed
+__pending                               = dict()                                            # MACHINE_ID -> state that the edge device expects from the machine
+__ack_machines                          = set()                                             # MACHINE_ID of the machines that wait for an ack of every message
+__SEED                                  = os.environ.get("SEED")                            # Seed of the random values -> reproducible scenarios
+__random                                = random.Random(__SEED)                             # Random values of the edge device (repair time)
+__EDGE_ID                               = os.environ.get("EDGE_ID")                         # Unique ID of this instance for the scale-out. None -> this instance handles everything
+__membership                            = None                                              # Alive instances and the owner of an machine or job (only with EDGE_ID)
+__MEMBERS_CHANGED                       = "MEMBERS_CHANGED"                                 # Event when an instance joined or left
+__OWNER_GRACE                           = float(os.environ.get("OWNER_GRACE", 2 * __JOB_SYNC_INTERVAL + __ACK_TIMEOUT))   # Seconds that the jobs of an instance that left wait for the new owner of their machine
+__reindex_at                            = time.monotonic() + __OWNER_GRACE                  # Time when the ready queue is built again (the grace of an instance that left is over)
+__JOB_CLAIMED                           = "JOB_CLAIMED"                                     # Event (JOB_CLAIMED, MACHINE_ID, JOB_ID, won) when the claim of an job is done
+__claims                                = dict()                                            # MACHINE_ID -> job that is claimed for the machine
+__LEASE_TIME                            = float(os.environ.get("LEASE_TIME", 0))            # Seconds after that an job without an message of its machine gets unfinished again (0 -> no leases)
+__leases                                = dict()                                            # JOB_ID -> end of the lease that was written last (unix time)
+__last_seen                             = dict()                                            # MACHINE_ID -> time.monotonic() of the last message of the machine
 # -------------------------------- Functions -------------------------------- #
 
 def on_connect(client, userdata, flags, rc):
@@ -159,11 +295,18 @@ def on_connect(client, userdata, flags, rc):
     """
     print("Connected with result code " + str(rc))
 
+    # Announce the instance (again after an reconnect) and get the other instances
+    if __membership is not None:
+        __membership.announce()
+
 def on_message(client, userdata, msg):
     """ Gets triggered when an subscribed topic receive an message.
         When __record_machine_data == True then it will save the 
         Machine data in a csv file.
-        At the end it will update the machine variables.
+        The message is decoded once (JSON or binary) and machines that send JSON but support
+        the binary format get told to switch.
+        At the end it will put the machine to the events of the main loop
+        which will update the machine variables.
 
         Define the message received callback implementation.
 
@@ -175,21 +318,34 @@ def on_message(client, userdata, msg):
         message:    an instance of MQTTMessage.
                     This is a class with members topic, payload, qos, retain.
     """
-    if __record_machine_data:
-        
-        # Machine that gets updated
-        machine     = json.loads(msg.payload)        
+    # An instance joined or left
+    if __membership is not None and __membership.handle(msg):
+        return
+
+    # Machine that gets updated. Decoded once from JSON or from the binary format
+    machine     = telemetry.decode(msg.payload)
+
+    # The machine belongs to an other instance
+    if __membership is not None and not __membership.owns(machine["MACHINE_ID"]):
+        return
+
+    # Machine that sends JSON but supports an binary format -> tell the machine to switch
+    telemetry_format = telemetry.supported_format(machine)
+    if telemetry_format is not None:
+        client.publish("telemetry_format/" + machine["MACHINE_ID"] + "/", json.dumps({"format": telemetry_format}))
+
+    if __record_machine_data or __labeler is not None:
         
         # Writes the values of the machine in a csv file except remain_time and except when the machine is at state MAINTANCE 
-        write_machine_info_in_csv_file(machine, __path_to_ml_file_without_r_t)        
+        write_machine_info_in_csv_file(machine)
 
-    update_machine_list(msg)
+    # Wake up the main loop
+    __events.put(machine)
 
-def deploy_job(machine_index):
-    """Gets jobs from the db and deploys an suitable unfinished job to the Machine.
-    When there isnt any job_remain_time that is shorter then the remain_time of the machine then 
-    decide between send machine to MAINTANCE (when machine.working_time > 0) or give machine
-    an riskly job.
+def handle_machine(machine_index):
+    """Reacts to the state of the machine. Gets called by the main loop when the machine sent an message,
+    the job table changed or at an tick. When the edge device waits for the machine to answer an command
+    nothing is done until the __ACK_TIMEOUT is over.
 
     Parameters
     ----------
@@ -204,113 +360,249 @@ def deploy_job(machine_index):
 
     global __machines
 
-    # Get all Jobs
-    all_jobs = Airtable(__AIRTABLE_BASE_KEY, __AIRTABLE_TABLE_NAME, __AIRTABLE_API_KEY).get_all()
-    
-    # List of unfinished jobs
-    jobs = list()
-    i = 0
+    # Wait for the claim of the job of the machine
+    if __machines[machine_index]["MACHINE_ID"] in __claims:
+        return
+
+    # Wait for the answer of the machine
+    pending = __pending.get(__machines[machine_index]["MACHINE_ID"])
+    if pending is not None:
+        if time.monotonic() - pending["since"] < __ACK_TIMEOUT:
+            return
 
-    # Go over all jobs and push the unfinished jobs to the list
-    while i < len(all_jobs):
-        k  = 0
-        already_taken = False
+        # The machine didnt answer. Give an job that wasnt taken back to the other machines
+        print("Machine with ID: " + __machines[machine_index]["MACHINE_ID"] + " didnt answer. Expected status: " + pending["status"])
+        del __pending[__machines[machine_index]["MACHINE_ID"]]
 
-        while k < len(__machines):
-            if __machines[k]["Job"]["JOB_ID"] == all_jobs[i]["fields"]["JOB_ID"]:
-                already_taken = True
-            k += 1
+        if pending["JOB_ID"] != "none":
+            set_job(pending["JOB_ID"], "status", "unfinished")
+            __job_store.release(pending["JOB_ID"])
+            __leases.pop(pending["JOB_ID"], None)
         
-        if not (already_taken or all_jobs[i]["fields"]["status"] == "finished" or all_jobs[i]["fields"]["remaining_job_time"] <= 0):
-            jobs.insert(len(jobs), all_jobs[i])
+    if __machines[machine_index]["status"] == "RUNNABLE":
+        
+        # Find an job for the machine
+        deploy_job(machine_index)
 
-        i += 1
+    elif __machines[machine_index]["status"] == "WORKING":
 
-    i = 0
-    job_found = False
-    
-    # When any job is unfinished
-    if len(jobs) > 0:
+        # The r_t of the machine is predicted and published by predict_remain_times()
+
+        # The machine still works on the job -> renew the lease
+        if __machines[machine_index]["Job"]["remaining_job_time"] > 0:
+            renew_lease(__machines[machine_index]["Job"]["JOB_ID"], __machines[machine_index]["Job"]["remaining_job_time"])
+
+        # If the machine have done the job set the job in db to finished and publish to the machine that it can be again RUNNABLE.
+        # At the end fit the KI with this values.
+        if __machines[machine_index]["Job"]["remaining_job_time"] <= 0:
+            
+            # Set Job in DB
+            set_job(__machines[machine_index]["Job"]["JOB_ID"], "status", "finished")
+            set_job(__machines[machine_index]["Job"]["JOB_ID"], "remaining_job_time", 0)
+            __job_store.release(__machines[machine_index]["Job"]["JOB_ID"])
+            __leases.pop(__machines[machine_index]["Job"]["JOB_ID"], None)
+            
+            # Publish to the machine
+            client.publish("finished_job/" + __machines[machine_index]["MACHINE_ID"] + "/", json.dumps(__machines[machine_index]["Job"]))
+            expect_machine_state(machine_index, "RUNNABLE")
+
+            # Only when an riskly job have been taken and its sucessfully have be done then it will be written in the csv file.
+            # fit_ki_with_machine_data(i ,__path_to_ml_file)
+
+    elif __machines[machine_index]["status"] == "BROKEN":
         
-        if __prediction:
-            # Try to find an Job for the Machine that is shorter then the remain_time of the machine
-            while i < len(jobs):
+        # The KI is trained with the labeled segment of the machine by the online training (see train_segment())
 
-                # If remain_time of the machine is bigger than the job. Deploy the job to the machine
-                if jobs[i]["fields"]["remaining_job_time"] < __machines[machine_index]["remain_time"]:
-                
-                    # Publish Job to the machine
-                    client.publish("jobs/" +__machines[machine_index]["MACHINE_ID"] + "/", json.dumps(jobs[i]["fields"]))
+        # Set Job in Airtable 
+        if __machines[machine_index]["Job"]["remaining_job_time"] > 0:
+            set_job(__machines[machine_index]["Job"]["JOB_ID"],"status", "unfinished")
+        else:
+            set_job(__machines[machine_index]["Job"]["JOB_ID"],"status", "finished")
+        
+        # Set remaining_job_time
+        set_job(__machines[machine_index]["Job"]["JOB_ID"],"remaining_job_time", int(__machines[machine_index]["Job"]["remaining_job_time"]))
 
-                    # Set job to proccessing in DB
-                    set_job(jobs[0]["fields"]["JOB_ID"],"status","processing")
+        # The job can be deployed to an other machine again
+        __job_store.release(__machines[machine_index]["Job"]["JOB_ID"])
+        __leases.pop(__machines[machine_index]["Job"]["JOB_ID"], None)
+        
+        # Set an Constant repairtime or an huge repairtime when Totaldamage is present
+        data = {"remaining_repair_time": dispatch.repair_time(__random, __REPAIR_TIME, __TOTAL_DAMAGE_REPAIR_TIME)}
+        
+        # Publish it to the machine
+        client.publish("remaining_repair_time/"+__machines[machine_index]["MACHINE_ID"] + "/", json.dumps(data))
+        
+        # Set status on MAINTANCE
+        __machines[machine_index]["status"] = "MAINTANCE"
+        expect_machine_state(machine_index, "MAINTANCE")
 
-                    # Set state of machine on WORKING
-                    __machines[machine_index]["status"] = "WORKING"
+def predict_remain_times(machines):
+    """Predicts the remain_time of all given machines with one call of the KI and publishes
+    the remain_time to every machine where it changed.
 
-                    # Out of while loop
-                    i = len(jobs)                
+    Parameters
+    ----------
+    machines : list
+        machines that need an predicted remain_time
 
-                    # Job was found so set flag  
-                    job_found = True
+    Returns
+    -------
+    none
+    
+    """
+    if len(machines) <= 0:
+        return
 
-                i += 1
+    # Feature vectors of all machines
+    features        = [[machine["working_time"], machine["wear"], machine["alignment"], machine["temperatur"]] for machine in machines]
+    remain_times    = __predictor.predict(features)
 
-            # If any Job for the Machine didnt found decide betwween if send machine
-            # to MAINTANCE or give machine an riskly job    
-            if not job_found:
+    for machine, remain_time in zip(machines, remain_times):
 
-                # If the machine have worked before -> set repair time
-                if __machines[machine_index]["working_time"] > 0:
+        # Publish the r_t to the machine only when it changed
+        if remain_time != machine["remain_time"]:
+            client.publish("remain_time/" + machine["MACHINE_ID"] + "/", json.dumps({"remain_time": remain_time}))
 
-                    # Set normal repair time
-                    data = {"remaining_repair_time": __REPAIR_TIME}    
+        # Print first predicted r_t
+        if int(machine["remain_time"]) == -1:
+            print(machine["MACHINE_ID"]+ ": FIRST PREDICTED REMAIN_TIME: " + str(remain_time))
 
-                    # Publish it to the machine
-                    client.publish("remaining_repair_time/" +__machines[machine_index]["MACHINE_ID"] + "/", json.dumps(data))
+def deploy_job(machine_index):
+    """Takes an suitable unfinished job from the ready queue of the job store and deploys it to the Machine.
+    With prediction the largest job that is shorter then the remain_time of the machine is taken.
+    When there isnt any job_remain_time that is shorter then the remain_time of the machine then 
+    decide between send machine to MAINTANCE (when machine.working_time > 0) or give machine
+    an riskly job (the shortest job).
+    Without prediction the shortest job is taken.
 
-                    # Set state of machine
-                    __machines[machine_index]["status"] = "MAINTANCE" 
+    Parameters
+    ----------
+    machine_index : any
+        index of the machine in the __machines list.
 
-                # Else the reason that any job for the machine didnt found is that the remain_time is to small
-                # But the Jobs must be done. So the only way to do the jobs is to take the risk and give the machine the smallest job             
-                else:
+    Returns
+    -------
+    none
+    
+    """
 
-                    # Sort jobs -> shortest first
-                    jobs = sorted(jobs, key=lambda jobs: jobs["fields"]["remaining_job_time"])
+    global __machines
 
-                    # Publish Job to the machine
-                    client.publish("jobs/" +__machines[machine_index]["MACHINE_ID"] + "/", json.dumps(jobs[0]["fields"]))
+    # Decide between an job, an riskly job, an maintenance or waiting (see dispatch.choose_job())
+    action, job = dispatch.choose_job(__job_store, __machines[machine_index], __prediction)
 
-                    # Set job on processing in DB
-                    set_job(jobs[0]["fields"]["JOB_ID"],"status","processing")
+    # When no job is unfinished the machine has to wait
+    if action == dispatch.WAIT:
+        print("No Jobs. Machine with ID:" + __machines[machine_index]["MACHINE_ID"] + " is waiting for an Job...")
+        return
 
-                    # Set machine state on WORKING
-                    __machines[machine_index]["status"] = "WORKING"
+    # If the machine have worked before and no job fits -> set repair time
+    if action == dispatch.MAINTANCE:
 
-                    # Prints an information that an riskly job was given to the machine
-                    print("GIVE MACHINE: " + str(__machines[machine_index]["MACHINE_ID"]) +" AN JOB OVER THE REMAIN_TIME: " + str(jobs[0]["fields"]["JOB_ID"]) + " remaining_job_time: " + str(jobs[0]["fields"]["remaining_job_time"]))
-        
-        # Without prediction give machine the shortest job
-        else:
-            # Sort jobs -> shortest first
-            jobs = sorted(jobs, key=lambda jobs: jobs["fields"]["remaining_job_time"])
-                    
-            # Publish Job to the machine
-            client.publish("jobs/" +__machines[machine_index]["MACHINE_ID"] + "/", json.dumps(jobs[0]["fields"]))
-    
-            # Set job on processing in DB
-            set_job(jobs[0]["fields"]["JOB_ID"],"status","processing")
+        # Set normal repair time
+        data = {"remaining_repair_time": __REPAIR_TIME}    
+
+        # Publish it to the machine
+        client.publish("remaining_repair_time/" +__machines[machine_index]["MACHINE_ID"] + "/", json.dumps(data))
+
+        # Set state of machine
+        __machines[machine_index]["status"] = "MAINTANCE" 
+        expect_machine_state(machine_index, "MAINTANCE")
+
+        return
+
+    # Prints an information that an riskly job was given to the machine
+    if action == dispatch.RISKY_JOB:
+        print("GIVE MACHINE: " + str(__machines[machine_index]["MACHINE_ID"]) +" AN JOB OVER THE REMAIN_TIME: " + str(job["JOB_ID"]) + " remaining_job_time: " + str(job["remaining_job_time"]))
+
+    # Prints an information about the job that was given to the machine
+    else:
+        print("GIVE MACHINE: " + str(__machines[machine_index]["MACHINE_ID"]) +" AN JOB: " + str(job["JOB_ID"]) + " remaining_job_time: " + str(job["remaining_job_time"]))
+
+    # Mark job as taken so it wont be deployed to an other machine
+    __job_store.take(job["JOB_ID"])
+
+    # An other instance can deploy the same job -> claim it in the db first. The claim runs in the background,
+    # the machine stays RUNNABLE until claimed_job() gets the result
+    if __membership is not None:
+        MACHINE_ID              = __machines[machine_index]["MACHINE_ID"]
+        __claims[MACHINE_ID]    = job
+        __job_store.claim_async(job["JOB_ID"], {"status": "processing", "owner": __EDGE_ID},
+                                lambda JOB_ID, won: __events.put((__JOB_CLAIMED, MACHINE_ID, JOB_ID, won)))
+        return
+
+    start_job(machine_index, job)
+
+def start_job(machine_index, job):
+    """Publishes the job to the machine, sets the job on processing in the job store and waits for the machine to work on it.
+    The job must be taken in the job store.
+
+    Parameters
+    ----------
+    machine_index : any
+        index of the machine in the __machines list.
+    job : dict
+        fields of the job
+
+    Returns
+    -------
+    none
     
-            # Set machine state on WORKING
-            __machines[machine_index]["status"] = "WORKING"
+    """
+
+    global __machines
+
+    # Publish Job to the machine
+    client.publish("jobs/" +__machines[machine_index]["MACHINE_ID"] + "/", json.dumps(job))
+
+    # Set job on processing in DB
+    set_job(job["JOB_ID"],"status","processing")
+
+    # No other edge device deploys the job until the lease expires
+    renew_lease(job["JOB_ID"])
+
+    # Other instances dont deploy the job while this instance is alive
+    if __membership is not None:
+        set_job(job["JOB_ID"], "owner", __EDGE_ID)
+
+    # Set machine state on WORKING
+    __machines[machine_index]["status"] = "WORKING"
+    expect_machine_state(machine_index, "WORKING", job["JOB_ID"])
+
+def claimed_job(MACHINE_ID, JOB_ID, won):
+    """Gets called by the main loop when the claim of an job is done. An won job is started on the machine that it was
+    claimed for, when the machine is still RUNNABLE and handled by this instance. Else the job is given back.
+
+    Parameters
+    ----------
+    MACHINE_ID : str
+        ID of the machine that the job was claimed for
+    JOB_ID : any
+        ID of the job
+    won : bool
+        True if the claim is won
+
+    Returns
+    -------
+    none
     
-            # Prints an information about the job that was given to the machine
-            print("GIVE MACHINE: " + str(__machines[machine_index]["MACHINE_ID"]) +" AN JOB: " + str(jobs[0]["fields"]["JOB_ID"]) + " remaining_job_time: " + str(jobs[0]["fields"]["remaining_job_time"]))
-      
+    """
+    job             = __claims.pop(MACHINE_ID, None)
+    machine_index   = next((i for i, machine in enumerate(__machines) if machine["MACHINE_ID"] == MACHINE_ID), None)
+
+    if won and job is not None and machine_index is not None and __machines[machine_index]["status"] == "RUNNABLE":
+        start_job(machine_index, job)
+        return
+
+    __job_store.release(JOB_ID)
+
+    # The machine doesnt wait for the job anymore (e.g. rebalanced to an other instance) -> give the claim back
+    if won:
+        set_job(JOB_ID, "status", "unfinished")
+        set_job(JOB_ID, "owner", "")
     else:
-        print("No Jobs. Machine with ID:" + __machines[machine_index]["MACHINE_ID"] + " is waiting for an Job...")
-    
+        print("Job: " + str(JOB_ID) + " is claimed by an other edge device. Machine with ID: " + MACHINE_ID + " is waiting...")
+
 def update_machine_list(machine):
     """Only if an Machine update his Values or an new Machine send his 
     first Message will trigger this method.
@@ -319,41 +611,36 @@ def update_machine_list(machine):
 
     Parameters
     ----------
-    machine : any
-        machine that send an message to the edge device. This machine will get updated.
+    machine : dict
+        decoded message of the machine that send an message to the edge device. This machine will get updated.
 
     Returns
     -------
-    none
+    int :
+        index of the machine in the __machines list or None if the machine isnt in the list
     
     """
 
     global __machines
 
-    # Machine that gets updated
-    machine     = json.loads(machine.payload)
-    
     i           = 0
     isUpdated   = False
     
-    # If machine dont get an r_t give him one and then add to the list __machines 
+    # If machine dont get an r_t give him one in this cycle and then add to the list __machines 
     if int(machine["remain_time"]) == -1 and __prediction:
         
-        # Get predicted r_t
-        remain_time =  int(__ki.predict([[machine["working_time"], machine["wear"], machine["alignment"], machine["temperatur"]]]))
-        
-        # If r_t is negative
-        if remain_time < 0:
-            remain_time = 0
+        # Predicted together with the other machines by predict_remain_times()
+        __unpredicted[machine["MACHINE_ID"]] = machine
 
-        # Publish r_t to the machine    
-        client.publish("remain_time/" + machine["MACHINE_ID"] + "/", json.dumps({"remain_time": remain_time}))
-        
-        # Print first predicted r_t
-        print(machine["MACHINE_ID"]+ ": FIRST PREDICTED REMAIN_TIME: " + str(remain_time))
+        return None
 
     # Else machine has already an r_t so add to the list or update values
     else:
+        # The machine answered an command of the edge device
+        pending = __pending.get(machine["MACHINE_ID"])
+        if pending is not None and pending["status"] == machine["status"] and pending["JOB_ID"] in ("none", machine["Job"]["JOB_ID"]):
+            del __pending[machine["MACHINE_ID"]]
+
         # Itterating over the Machine List to check if the Machine that send an message is already in the list.
         # if: true -> Updating Values, false -> Insert to the end of the list
         while i < len(__machines) and isUpdated == False:
@@ -361,6 +648,17 @@ def update_machine_list(machine):
             # true -> Updating Values
             if machine["MACHINE_ID"] == __machines[i]["MACHINE_ID"]:
                 
+                # When the machine changed his job release the old one and mark the new one as taken
+                if __machines[i]["Job"]["JOB_ID"] != machine["Job"]["JOB_ID"]:
+                    if __machines[i]["Job"]["JOB_ID"] != "none":
+                        __job_store.release(__machines[i]["Job"]["JOB_ID"])
+                    if machine["Job"]["JOB_ID"] != "none":
+                        __job_store.take(machine["Job"]["JOB_ID"])
+
+                # Print the machine when its status changed
+                if __machines[i]["status"] != machine["status"]:
+                    print_machine(machine)
+
                 # Updating values
                 __machines[i]   = machine
                 
@@ -373,12 +671,233 @@ def update_machine_list(machine):
 
             # Insert at the end if the list
             __machines.insert(len(__machines), machine)
+
+            # A machine that already works on an job (e.g. after an restart of the edge device) keeps it
+            if machine["Job"]["JOB_ID"] != "none":
+                __job_store.take(machine["Job"]["JOB_ID"])
+
+                # The machine came from an other instance -> this instance processes the job now. Written directly, the other instances
+                # see it before the grace of the old owner is over
+                if __membership is not None:
+                    __job_store.write_through(machine["Job"]["JOB_ID"], {"owner": __EDGE_ID})
             
             # Prints machine that is added to the list
             print("Machine with ID: " + machine["MACHINE_ID"] + " dont exist so add to List")
+
+        return i - 1 if isUpdated else len(__machines) - 1
+
+def print_machine(machine):
+    """Prints the important information of an machine.
+
+    Parameters
+    ----------
+    machine : any
+        machine that gets printed
+
+    Returns
+    -------
+    none
+    
+    """
+    print(str("ID: " + machine["MACHINE_ID"]) + ", status: " + str(machine["status"]) + ", w: " + str(machine["wear"]) + ", t: " + str(machine["temperatur"]) +
+    ", a: " + str(machine["alignment"]) + ", w_t: " + str(machine["working_time"]) + " r_t: " + str(machine["remain_time"]) +
+    ", r_r_t: " + str(machine["remaining_repair_time"]) + ", Job: " + str(machine["Job"]["JOB_ID"])  + ", remaining_job_time: " + str(machine["Job"]["remaining_job_time"]))
+
+def expect_machine_state(machine_index, status, JOB_ID="none"):
+    """Remembers that the edge device sent an command to the machine. Until the machine reports the
+    status (and the JOB_ID) or the __ACK_TIMEOUT is over, the machine wont be handled again. So old messages
+    of the machine that were sent before the command arrived dont trigger the same transition twice.
+
+    Parameters
+    ----------
+    machine_index : any
+        index of the machine in the __machines list.
+    status : str
+        status that the machine will report after the command
+    JOB_ID : any
+        ID of the job that the machine will report after the command ("none" if any)
+
+    Returns
+    -------
+    none
+    
+    """
+    __pending[__machines[machine_index]["MACHINE_ID"]] = {"status": status, "JOB_ID": JOB_ID, "since": time.monotonic()}
   
+def is_job_ready(fields):
+    """Decides if an job can be deployed by this instance. Without scale-out every unfinished job can be deployed.
+    With scale-out only the jobs that are not processed by an other alive instance. The jobs are not partitioned, the races
+    between the instances are resolved by the claim (see deploy_job()).
+
+    Parameters
+    ----------
+    fields : dict
+        fields of the job
+
+    Returns
+    -------
+    bool :
+        True if the job can be deployed
+    """
+    if not is_unfinished(fields) or is_leased(fields):
+        return False
+
+    if __membership is None:
+        return True
+
+    return not is_claimed(fields)
+
+def renew_lease(JOB_ID, remaining_job_time=None):
+    """Renews the lease of an job for __LEASE_TIME seconds. Gets called when the job is deployed and for every message
+    of the WORKING machine (heartbeat). To keep the writes low the lease is only written when the half of it is over,
+    together with the remaining_job_time that the machine reported. So an job with an expired lease keeps its progress.
+
+    Parameters
+    ----------
+    JOB_ID : any
+        ID of the job
+    remaining_job_time : int
+        remaining_job_time that the machine reported (None -> not written)
+
+    Returns
+    -------
+    none
+    
+    """
+    now = time.time()
+
+    # No leases or the lease is long enough
+    if __LEASE_TIME <= 0 or __leases.get(JOB_ID, 0) - now > __LEASE_TIME / 2:
+        return
+
+    __leases[JOB_ID] = int(now + __LEASE_TIME)
+
+    if remaining_job_time is not None:
+        set_job(JOB_ID, "remaining_job_time", int(remaining_job_time))
+    set_job(JOB_ID, LEASE_EXPIRES, __leases[JOB_ID])
+
+def is_claimed(fields):
+    """True if an job is processed by an other alive instance. The job of an instance that left is claimed for __OWNER_GRACE seconds
+    more: its machine is handed over to an other instance, that writes itself as owner when the machine sends its next message.
+    After the grace the job can be deployed again.
+
+    Parameters
+    ----------
+    fields : dict
+        fields of the job
+
+    Returns
+    -------
+    bool :
+        True if an other instance processes the job
+    """
+    owner = fields.get("owner", "")
+
+    if fields.get("status") != "processing" or owner in ("", __EDGE_ID):
+        return False
+
+    return owner in __membership.members() or __membership.departed(owner) < __OWNER_GRACE
+
+def expires_lease(fields):
+    """True if this instance gives the job back when its lease expired. So only one instance writes the job:
+    the instance that processes it or, when this instance left, the owner of the key job/JOB_ID.
+
+    Parameters
+    ----------
+    fields : dict
+        fields of the job
+
+    Returns
+    -------
+    bool :
+        True if this instance expires the lease
+    """
+    if __membership is None:
+        return True
+
+    owner = fields.get("owner", "")
+    if owner in __membership.members():
+        return owner == __EDGE_ID
+
+    return __membership.owns("job/" + str(fields["JOB_ID"]))
+
+def forget_dead_machines():
+    """Forgets the WORKING machines that didnt send an message for __LEASE_TIME seconds (the machine died). Its job is
+    still taken by the machine, so JobStore.expire_leases() would skip it: the job is released and its lease ends now
+    with the remaining_job_time that the machine reported last. When the machine comes back it is added again by its next message.
+
+    Returns
+    -------
+    none
+
+    """
+    global __machines
+
+    now     = time.monotonic()
+    kept    = list()
+
+    for machine in __machines:
+        if machine["status"] != "WORKING" or now - __last_seen.get(machine["MACHINE_ID"], now) <= __LEASE_TIME:
+            kept.append(machine)
+            continue
+
+        JOB_ID = machine["Job"]["JOB_ID"]
+        if JOB_ID != "none":
+            __job_store.release(JOB_ID)
+            __leases.pop(JOB_ID, None)
+            set_job(JOB_ID, "remaining_job_time", int(machine["Job"]["remaining_job_time"]))
+            set_job(JOB_ID, LEASE_EXPIRES, int(time.time()))
+
+        __last_seen.pop(machine["MACHINE_ID"], None)
+        __pending.pop(machine["MACHINE_ID"], None)
+        __ack_machines.discard(machine["MACHINE_ID"])
+        __claims.pop(machine["MACHINE_ID"], None)
+        print("Machine with ID: " + machine["MACHINE_ID"] + " didnt send an message for " + str(__LEASE_TIME) + " seconds and is forgotten")
+
+    __machines = kept
+
+def rebalance():
+    """Gets called by the main loop after an instance joined or left. Forgets the machines that belong to an other
+    instance now, their jobs are handed over to the new owner of the machine. Then the ready queue is built again,
+    because the jobs of an instance that left can be deployed again.
+
+    Parameters
+    ----------
+    Returns
+    -------
+    none
+    
+    """
+    global __machines, __reindex_at
+
+    kept = list()
+
+    for machine in __machines:
+        if __membership.owns(machine["MACHINE_ID"]):
+            kept.append(machine)
+            continue
+
+        # Hand the job over to the new owner of the machine
+        if machine["Job"]["JOB_ID"] != "none" and machine["status"] == "WORKING":
+            __job_store.write_through(machine["Job"]["JOB_ID"], {"owner": __membership.owner(machine["MACHINE_ID"])})
+            __job_store.release(machine["Job"]["JOB_ID"])
+            __leases.pop(machine["Job"]["JOB_ID"], None)
+
+        __pending.pop(machine["MACHINE_ID"], None)
+        __ack_machines.discard(machine["MACHINE_ID"])
+        print("Machine with ID: " + machine["MACHINE_ID"] + " belongs to " + __membership.owner(machine["MACHINE_ID"]) + " now")
+
+    for MACHINE_ID in list(__unpredicted):
+        if not __membership.owns(MACHINE_ID):
+            del __unpredicted[MACHINE_ID]
+
+    __machines      = kept
+    __reindex_at    = time.monotonic() + __OWNER_GRACE
+    __job_store.reindex()
+
 def set_job(JOB_ID, field, value):
-    """Updates an exist Entry in the DB (Airtable).
+    """Updates an exist Entry in the job store. The field gets written to the DB (Airtable)
+    together with the other pending fields of the job at the next flush of the job store.
 
     Parameters
     ----------
@@ -398,21 +917,20 @@ def set_job(JOB_ID, field, value):
     # Field that is goig to be settd in db
     fields      = {str(field): value}
     
-    # Set updated field to the db to update it
-    Airtable(__AIRTABLE_BASE_KEY, __AIRTABLE_TABLE_NAME, __AIRTABLE_API_KEY).update_by_field("JOB_ID", JOB_ID, fields)
+    # Set updated field in the job store, the db gets updated at the next flush
+    __job_store.update(JOB_ID, fields)
 
-def write_machine_info_in_csv_file(machine, path):
+def write_machine_info_in_csv_file(machine):
     """This method just used to generate Trainings csv file.
-    It will write the Machine values in an csv file except when an Machine is at MAINTANCE
-    and except the remain_time of the machine.  
-    This method just called when __record_machine_data == True
+    It will put the Machine values to the telemetry sink that writes them in an csv file except when an Machine is at MAINTANCE
+    and except the remain_time of the machine. The file is written by the background thread of the sink.
+    With __RECORD_LABELED == True the row is given to the labeler, that writes the rows with the remain_time when the machine breaks.
+    This method just called when __record_machine_data == True or the labeler is needed for the online training
 
     Parameters
     ----------
     machine : any
         machine from which the values are to be written into the csv file
-    path : any
-        path to the csv file
 
     Returns
     -------
@@ -420,36 +938,101 @@ def write_machine_info_in_csv_file(machine, path):
     
     """
 
-    # Except when an machine is at MAINTANCE write values in csv file
-    if machine["status"] == "RUNNABLE" or machine["status"] == "BROKEN" or machine["status"] == "WORKING":
-       
-        # Fieldnames
-        fnames = ['MACHINE_ID', 'working_time', 'remain_time', 'wear', 'alignment', 'temperatur','status']
-        
-        # If file already exist. Add entry at the end of the file
-        if os.path.isfile(path) :
-            ml_file = open(path, 'a') 
-            with ml_file: 
-                writer = csv.DictWriter(ml_file, fieldnames=fnames)
-                writer.writerow({   'MACHINE_ID'    : machine["MACHINE_ID"],    
-                                    'working_time'  : machine["working_time"],
-                                    'wear'          : machine["wear"],
-                                    'alignment'     : machine["alignment"],
-                                    'temperatur'    : machine["temperatur"],
-                                    'status'        : machine["status"]})
-        
-        # Else file dont exist. Create an new file
-        else:
-            ml_file = open(path, 'w')
-            with ml_file:
-                writer = csv.DictWriter(ml_file, fieldnames=fnames) 
-                writer.writeheader() 
-                writer.writerow({   'MACHINE_ID'    : machine["MACHINE_ID"],
+    row = {                         'MACHINE_ID'    : machine["MACHINE_ID"],
                                     'working_time'  : machine["working_time"],
                                     'wear'          : machine["wear"],
                                     'alignment'     : machine["alignment"],
                                     'temperatur'    : machine["temperatur"],
-                                    'status'        : machine["status"]})  
+                                    'status'        : machine["status"]}
+
+    # The labeler writes the rows of an machine when it breaks. It needs the MAINTANCE rows to end an segment
+    if __labeler is not None:
+        __labeler.write(row)
+
+    # Except when an machine is at MAINTANCE write values in csv file
+    if __telemetry_sink is not None and not __RECORD_LABELED and (machine["status"] == "RUNNABLE" or machine["status"] == "BROKEN" or machine["status"] == "WORKING"):
+       
+        __telemetry_sink.write(row)
+
+def load_model(path):
+    """Loads the KI-model. An JSON artifact (PATH_TO_ML_FILE ends with .json) is checked and evaluated with NumPy,
+    else the pickled model is loaded with joblib.
+
+    Parameters
+    ----------
+    path : str
+        path to the cached model file
+
+    Returns
+    -------
+    any :
+        model with a predict(X) method
+    """
+    if __path_to_ml_file.endswith(".json"):
+        from model_artifact import load_artifact
+        return load_artifact(path)
+
+    import joblib
+    return joblib.load(path)
+
+def reload_model(path, version):
+    """Loads an new version of the KI-model, validates it and swaps it into the prediction. Gets called by the model watcher
+    in its background thread, so the main loop only waits for the swap (between two predictions).
+    An model that cant be loaded or isnt valid raises an exception and the actual model is kept.
+
+    Parameters
+    ----------
+    path : str
+        path to the cached model file
+    version : str
+        version of the model in the storage
+
+    Returns
+    -------
+    none
+    
+    """
+    model = load_model(path)
+    validate_model(model)
+
+    __predictor.swap(model, version)
+    print("KI-Model " + __path_to_ml_file + " version " + str(version) + " is active")
+
+def train_segment(rows):
+    """Gives an labeled segment to the online training. Gets called by the labeler when an machine breaks.
+
+    Parameters
+    ----------
+    rows : list
+        labeled rows of the segment
+
+    Returns
+    -------
+    none
+    
+    """
+    if __trainer is not None:
+        __trainer.add_segment(rows)
+
+def print_job_table_stats():
+    """Prints the calls, errors, retries, throttled requests and the mean and maximal latency of every method of the
+    job table. Only the Airtable is rate limited and counted (see job_table.RateLimitedTable).
+
+    Parameters
+    ----------
+    Returns
+    -------
+    none
+    
+    """
+    table = open_job_table(__JOB_TABLE_BACKEND)
+    if not hasattr(table, "stats"):
+        return
+
+    for method, stats in sorted(table.stats().items()):
+        print("Job table " + method + ": " + str(stats["calls"]) + " calls, " + str(stats["errors"]) + " errors, " + str(stats["retries"]) + " retries, "
+              + str(stats["throttled"]) + " throttled, waited " + str(round(stats["waited"], 3)) + " s, latency mean "
+              + str(round(stats["latency_total"] / max(stats["calls"] + stats["retries"], 1), 3)) + " s, max " + str(round(stats["latency_max"], 3)) + " s")
 
 def all_jobs_is_done():
     """This method will just check if all Jobs have been done.
@@ -463,37 +1046,17 @@ def all_jobs_is_done():
     
     """
 
-    # Get all Jobs
-    all_jobs = Airtable(__AIRTABLE_BASE_KEY, __AIRTABLE_TABLE_NAME, __AIRTABLE_API_KEY).get_all()
-    
-    # List of unfinished jobs
-    jobs = list()
-    i = 0
-
-    # Go over all jobs and push the unfinished jobs to the list
-    while i < len(all_jobs):
-        k  = 0
-        already_taken = False
-
-        while k < len(__machines):
-            if __machines[k]["Job"]["JOB_ID"] == all_jobs[i]["fields"]["JOB_ID"]:
-                already_taken = True
-            k += 1
-        
-        if not (already_taken or all_jobs[i]["fields"]["status"] == "finished" or all_jobs[i]["fields"]["remaining_job_time"] <= 0):
-            jobs.insert(len(jobs), all_jobs[i])
-
-        i += 1
+    # Amount of unfinished jobs that are not taken by an machine
+    unfinished_jobs = __job_store.ready_count()
 
-    print("Unfinished Jobs: " + str(len(jobs)))
+    print("Unfinished Jobs: " + str(unfinished_jobs))
 
-    return len(jobs) <= 0
+    return unfinished_jobs <= 0
 
 def send_data_to_cloud():
     """This Method will upload the data to the an Container in the cloud.
-    It will be an csv file of the machine data and will be named with the 
-    actual time and date. For this the __CONNECTION_STRING_TO_AZURE_STORAGE
-    and __CONTAINER_NAME need to be setted correct.
+    It completes the actual file of the machine data, so it gets uploaded by upload_telemetry_part()
+    like every other completed part. The upload runs in the background, so this method returns immediately.
 
     Parameters
     ----------
@@ -502,22 +1065,31 @@ def send_data_to_cloud():
     none
     
     """
-    # datetime object containing current date and time
-    now = datetime.now()
+    __telemetry_sink.rotate()
+
+def upload_telemetry_part(path):
+    """Queues an completed part of the machine data for the upload. It will be named with the 
+    actual time and date and the part number. After the upload the local file is renamed to *.uploaded,
+    so it wont be uploaded again after an restart.
 
-    # dd/mm/YY H:M:S as Name
-    dt_string = now.strftime("%d_%m_%Y_%H_%M_%S")
-    file_name = dt_string+".csv"
+    Parameters
+    ----------
+    path : str
+        path to the completed part
 
-    # Create the BlobServiceClient object which will be used to get a container client
-    blob_service_client = BlobServiceClient.from_connection_string(__CONNECTION_STRING_TO_AZURE_STORAGE)
+    Returns
+    -------
+    none
+    
+    """
+    # datetime object containing current date and time
+    now = datetime.now()
 
-    # Create a blob client using the local file name as the name for the blob
-    blob_client = blob_service_client.get_blob_client(container=__CONTAINER_NAME, blob=file_name)
+    # dd/mm/YY H:M:S and part number as Name
+    root, ext   = os.path.splitext(path)
+    file_name   = now.strftime("%d_%m_%Y_%H_%M_%S") + "_" + os.path.splitext(root)[1][1:] + ext
 
-    # Upload to Cloud Storage
-    with open(__path_to_ml_file_without_r_t, "rb") as data:
-        blob_client.upload_blob(data)
+    __uploader.upload(path, file_name, on_done=lambda uploaded: os.replace(uploaded, uploaded + UPLOADED))
 
 def check_if_data_can_uploaded():
     """ This method will check if all Jobs have been done. Then
@@ -548,16 +1120,77 @@ def check_if_data_can_uploaded():
     elif all_jobs_is_done() == False:
         __uploaded = False
 
+def startup_step(name):
+    """Remembers the duration of an startup step (since the last step) and the packages it imported for the startup report.
+
+    Parameters
+    ----------
+    name : str
+        name of the step
+
+    Returns
+    -------
+    none
+    
+    """
+    global __startup_modules, __startup_last
+
+    now         = time.perf_counter()
+    modules     = set(sys.modules)
+    packages    = sorted({module.split(".")[0] for module in modules - __startup_modules})
+
+    __startup_steps.append((name, now - __startup_last, packages))
+    __startup_modules   = modules
+    __startup_last      = now
+
+def print_startup_report():
+    """Prints the duration of the startup and of every startup step, the amount of loaded modules and the
+    maximal memory usage (RSS). When __STARTUP_PROFILE == True the imported packages of every step are printed too.
+
+    Parameters
+    ----------
+    Returns
+    -------
+    none
+    
+    """
+    steps = ", ".join(name + " " + str(round(seconds, 3)) + " s" for name, seconds, packages in __startup_steps)
+
+    print("Startup: " + str(round(time.perf_counter() - __started, 3)) + " s (" + steps + "), " + str(len(sys.modules)) + " modules, max RSS "
+          + str(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss // 1024) + " MB")
+
+    if __STARTUP_PROFILE:
+        for name, seconds, packages in __startup_steps:
+            print("Startup step " + name + " imported: " + ", ".join(packages))
+
 # -------------------------------- Need to be Initialized -------------------------------- #
 
-# Create an client, connect to the Mqtt Broker and subscribe to the topics.
-client              = mqtt.Client()
-client.on_connect   = on_connect
-client.on_message   = on_message
-client.connect("localhost", 1883, 60)
-client.subscribe("machines/#")
-client.subscribe("finished/#")
-client.loop_start()
+startup_step("imports")
+
+# Load the job table once and keep it up to date in the background. The stats are printed after the last flush at exit
+__job_store.load()
+
+# The leases and the scale-out write their own columns. Airtable rejects every update of an job with an unknown column
+__required_fields = dict()
+if __LEASE_TIME > 0:
+    __required_fields[LEASE_EXPIRES] = 0
+if __EDGE_ID is not None:
+    __required_fields["owner"] = ""
+
+__missing_fields = __job_store.missing_fields(__required_fields)
+if len(__missing_fields) > 0:
+    sys.exit("The job table has no column: " + ", ".join(__missing_fields) + ". Add the columns (see README.md) or turn off LEASE_TIME / EDGE_ID")
+
+atexit.register(print_job_table_stats)
+__job_store.start()
+startup_step("job table")
+
+# Exit normally on docker stop, so the pending job updates get flushed
+signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+# Storage of the KI-model and the recorded data
+__storage   = open_storage(__STORAGE_BACKEND)
+__uploader  = StorageUploader(__storage)
 
 # Set the right flags from the Env variables
 if __prediction == "False":
@@ -570,107 +1203,177 @@ if __record_machine_data == "False":
 else:
     __record_machine_data = True
 
+    # With labels at the edge the files contain the remain_time
+    if __RECORD_LABELED:
+        __path_to_ml_file_without_r_t   = __path_to_labeled_file
+        __path_to_archive_file          = __path_to_labeled_archive_file
+
+    # Buffered writer for the columnar archive
+    if __RECORD_FORMAT == "arrow":
+        from telemetry_archive import ArchiveSink
+        __telemetry_sink = ArchiveSink(__path_to_archive_file, __TELEMETRY_BUFFER_SIZE, __TELEMETRY_FLUSH_INTERVAL, __TELEMETRY_MAX_BYTES,
+                                       upload_telemetry_part, compression=__RECORD_COMPRESSION)
+
+    # Buffered writer for the csv file
+    else:
+        __telemetry_sink = TelemetrySink(__path_to_ml_file_without_r_t, ['MACHINE_ID', 'working_time', 'remain_time', 'wear', 'alignment', 'temperatur','status'],
+                                         __TELEMETRY_BUFFER_SIZE, __TELEMETRY_FLUSH_INTERVAL, __TELEMETRY_MAX_BYTES, upload_telemetry_part)
+
+    # Upload the parts that were completed before an crash or restart
+    for part in __telemetry_sink.files():
+        if part != __telemetry_sink.path:
+            upload_telemetry_part(part)
+
+# Labels the rows of every machine when it breaks, for the recorded data and for the online training
+if (__record_machine_data and __RECORD_LABELED) or (__prediction and __ONLINE_TRAINING):
+    __labeler = TelemetryLabeler(__telemetry_sink if __record_machine_data and __RECORD_LABELED else None, __RECORD_UNLABELED, on_segment=train_segment)
+
+startup_step("storage and recording")
+
+# Create an client (after the flags and the telemetry sink are set, because on_message uses them), connect to the Mqtt Broker and subscribe to the topics.
+client              = mqtt.Client()
+client.on_connect   = on_connect
+client.on_message   = on_message
+
+# Scale-out: the other instances notice when this instance stops or its connection breaks
+if __EDGE_ID is not None:
+    __membership = Membership(client, __EDGE_ID, on_change=lambda: __events.put(__MEMBERS_CHANGED))
+    __membership.will()
+    atexit.register(__membership.leave)
+    __job_store.reindex()
+
+client.connect("localhost", 1883, 60)
+client.subscribe("machines/#")
+client.subscribe("finished/#")
+client.loop_start()
+startup_step("mqtt")
+
 # Download an existing ml model from the cloud and initialize __ki with it. __prediction must be true.
 if __prediction:
 
-    # Create the BlobServiceClient object which will be used to get a container client
-    blob_service_client = BlobServiceClient.from_connection_string(__CONNECTION_STRING_TO_AZURE_STORAGE)
+    # Download file to the cache. When the model didnt change since the last start the cached file is used
+    __model_cache           = ModelCache(__storage, __MODEL_CACHE_DIR)
+    path_to_cached_ml_file  = __model_cache.fetch(__path_to_ml_file)
 
-    # Get the existing container
-    container_client = blob_service_client.get_container_client(__CONTAINER_NAME)
+    # Fit KI with an downloaded model
+    from predictor import Predictor, validate_model
 
-    # Get the existing Blob
-    blob_client = blob_service_client.get_blob_client(container=__CONTAINER_NAME, blob=__path_to_ml_file)
+    __ki        = load_model(path_to_cached_ml_file)
+    __predictor = Predictor(__ki, version=__model_cache.cached_version(__path_to_ml_file))
+    print("KI-Model " + __path_to_ml_file + " version " + str(__predictor.version) + " is active")
 
-    # Download file to the __path_to_ml_file
-    with open(__path_to_ml_file, "wb") as download_file:
-        download_file.write(blob_client.download_blob().readall())
+    # Load new versions of the model without an restart
+    if __MODEL_RELOAD_INTERVAL > 0:
+        __model_watcher = ModelWatcher(__storage, __model_cache, __path_to_ml_file, reload_model, __MODEL_RELOAD_INTERVAL)
 
-    # Fit KI with an downloaded model
-    __ki = joblib.load(__path_to_ml_file)
+    # Train an incremental model with the labeled segments, it replaces the KI when its better on the holdout
+    if __ONLINE_TRAINING:
+        from online_training import OnlineTrainer
+        __trainer = OnlineTrainer(__predictor, __ONLINE_HOLDOUT, min_improvement=__ONLINE_MIN_IMPROVEMENT, seed=__SEED)
+
+    startup_step("model")
+
+print_startup_report()
 
 # -------------------------------- Main Loop -------------------------------- #
 
+next_tick = time.monotonic()
+
 while True:
 
-    if len(__machines) > 0:
+    # Wait for the next event or the next tick
+    events = list()
+    try:
+        events.append(__events.get(timeout=max(0, next_tick - time.monotonic())))
 
-        # Check states of the machines
-        i = 0
-        while i < len(__machines):
+        # Take all events that arrived in the meantime to handle them in one cycle
+        while True:
+            events.append(__events.get_nowait())
+    except queue.Empty:
+        pass
 
-            # Print important machine information
-            print(str("ID: " + __machines[i]["MACHINE_ID"]) + ", status: " + str(__machines[i]["status"]) + ", w: " + str(__machines[i]["wear"]) + ", t: " + str(__machines[i]["temperatur"]) +
-            ", a: " + str(__machines[i]["alignment"]) + ", w_t: " + str(__machines[i]["working_time"]) + " r_t: " + str(__machines[i]["remain_time"]) +
-            ", r_r_t: " + str(__machines[i]["remaining_repair_time"]) + ", Job: " + str(__machines[i]["Job"]["JOB_ID"])  + ", remaining_job_time: " + str(__machines[i]["Job"]["remaining_job_time"]))
-                
-            if __machines[i]["status"] == "RUNNABLE":
-                
-                # Find an job for the machine
-                deploy_job(i)
+    # An instance joined or left -> rebalance before the machine indexes are taken
+    if __MEMBERS_CHANGED in events:
+        rebalance()
 
-            elif __machines[i]["status"] == "WORKING":
-                
-                if __prediction:
-                    
-                    # Predict an r_t
-                    remain_time = int(__ki.predict([[__machines[i]["working_time"], __machines[i]["wear"], __machines[i]["alignment"], __machines[i]["temperatur"]]]))
-
-                    # In some cases the ki return an negative r_t but for the programm logic its not allowed. So when its return negative make it 0. 
-                    if remain_time < 0:
-                        remain_time = 0
-
-                    # Publish the r_t to the machine
-                    client.publish("remain_time/" + __machines[i]["MACHINE_ID"] + "/", json.dumps({"remain_time": remain_time})) 
-
-                # If the machine have done the job set the job in db to finished and publish to the machine that it can be again RUNNABLE.
-                # At the end fit the KI with this values.
-                if __machines[i]["Job"]["remaining_job_time"] <= 0:
-                    
-                    # Set Job in DB
-                    set_job(__machines[i]["Job"]["JOB_ID"], "status", "finished")
-                    set_job(__machines[i]["Job"]["JOB_ID"], "remaining_job_time", 0)
-                    
-                    # Publish to the machine
-                    client.publish("finished_job/" + __machines[i]["MACHINE_ID"] + "/", json.dumps(__machines[i]["Job"]))
-
-                    # Only when an riskly job have been taken and its sucessfully have be done then it will be written in the csv file.
-                    # fit_ki_with_machine_data(i ,__path_to_ml_file)
-
-            elif __machines[i]["status"] == "BROKEN":
-                
-                # Fit KI
-                # fit_ki_with_machine_data(i, __path_to_ml_file)
+    # Machines that have to be handled in this cycle and machines that wait for an ack
+    machine_indexes = list()
+    acks            = list()
+
+    for event in events:
+
+        # An machine sent an message -> handle only this machine
+        if isinstance(event, dict):
+
+            # The machine was rebalanced to an other instance after its message arrived
+            if __membership is not None and not __membership.owns(event["MACHINE_ID"]):
+                continue
 
-                # Set Job in Airtable 
-                if __machines[i]["Job"]["remaining_job_time"] > 0:
-                    set_job(__machines[i]["Job"]["JOB_ID"],"status", "unfinished")
+            # Only JSON messages tell the clock of the machine
+            if "telemetry_formats" in event:
+                if event.get("clock") == "ack":
+                    __ack_machines.add(event["MACHINE_ID"])
                 else:
-                    set_job(__machines[i]["Job"]["JOB_ID"],"status", "finished")
-                
-                # Set remaining_job_time
-                set_job(__machines[i]["Job"]["JOB_ID"],"remaining_job_time", int(__machines[i]["Job"]["remaining_job_time"]))
-                
-                # Set an Constant repairtime
-                data = {"remaining_repair_time": __REPAIR_TIME}
-                
-                # Check if Totaldamage is present. If true set an huge repairtime 
-                if random.randint(0,100) < 80:
-                    data = {"remaining_repair_time": __TOTAL_DAMAGE_REPAIR_TIME}    
-                
-                # Publish it to the machine
-                client.publish("remaining_repair_time/"+__machines[i]["MACHINE_ID"] + "/", json.dumps(data))
-                
-                # Set status on MAINTANCE
-                __machines[i]["status"] = "MAINTANCE" 
+                    __ack_machines.discard(event["MACHINE_ID"])
 
-            i += 1
+            if event["MACHINE_ID"] in __ack_machines:
+                acks.append(event["MACHINE_ID"])
 
-        # When all jobs have been done send data to the cloud
-        check_if_data_can_uploaded()
-    
-    else:
-        print("No Machines are registered to the Edge-Device")
-    
+            __last_seen[event["MACHINE_ID"]] = time.monotonic()
 
-    time.sleep(1)
\ No newline at end of file
+            machine_index = update_machine_list(event)
+            if machine_index is not None and machine_index not in machine_indexes:
+                machine_indexes.append(machine_index)
+
+        # The claim of an job is done -> start the job or give it back
+        elif isinstance(event, tuple) and event[0] == __JOB_CLAIMED:
+            claimed_job(*event[1:])
+
+        # The job table changed -> waiting machines can get an job now
+        elif event == __JOBS_CHANGED:
+            i = 0
+            while i < len(__machines):
+                if __machines[i]["status"] == "RUNNABLE" and i not in machine_indexes:
+                    machine_indexes.append(i)
+                i += 1
+
+    # Predict the r_t of the new machines and of the working machines that sent an message with one call of the KI
+    if __prediction:
+        predict_remain_times(list(__unpredicted.values()) + [__machines[i] for i in machine_indexes if __machines[i]["status"] == "WORKING"])
+        __unpredicted.clear()
+
+    for machine_index in machine_indexes:
+        handle_machine(machine_index)
+
+    # The messages are handled -> the machines can start their next cycle
+    for MACHINE_ID in acks:
+        client.publish("ack/" + MACHINE_ID + "/", "")
+
+    # Tick -> give jobs with an expired lease back, retry waiting machines and machines that didnt answer, check if the data can be uploaded
+    if time.monotonic() >= next_tick:
+        next_tick = time.monotonic() + __TICK_INTERVAL
+
+        # The grace of an instance that left is over -> its jobs that no instance took over are ready again
+        if __membership is not None and __reindex_at is not None and time.monotonic() >= __reindex_at:
+            __reindex_at = None
+            __job_store.reindex()
+            __events.put(__JOBS_CHANGED)
+
+        # With scale-out only one instance gives an job back. The jobs of dead machines first, their leases end now
+        if __LEASE_TIME > 0:
+            forget_dead_machines()
+            for JOB_ID in __job_store.expire_leases(select=expires_lease):
+                print("Lease of job: " + str(JOB_ID) + " expired. The job is unfinished again")
+
+        if len(__machines) > 0:
+            i = 0
+            while i < len(__machines):
+                if __machines[i]["status"] == "RUNNABLE" or __machines[i]["MACHINE_ID"] in __pending:
+                    handle_machine(i)
+                i += 1
+
+            # When all jobs have been done send data to the cloud
+            check_if_data_can_uploaded()
+
+        else:
+            print("No Machines are registered to the Edge-Device")
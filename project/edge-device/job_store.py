@@ -0,0 +1,753 @@
+"""Job Store
+
+In-process copy of the job table (Airtable) for the edge device.
+The table is loaded once at startup and then kept up to date by polling only the records
+that have been modified since the last poll (LAST_MODIFIED_TIME() formula). Writes of the
+edge device itself are applied to the local copy immediately, so the dispatching never has
+to wait for the next poll to see its own changes. The writes to the db are done write-behind:
+pending fields are merged per job into one record and flushed with batch updates
+after every flush_interval seconds and at shutdown. The fields that are being written and the
+written fields are applied on top of every poll until a poll that started after the write,
+so an poll that read the table before the write landed can not undo it. An record that the db rejects is dropped
+(and printed), so it cant block the writes of the other jobs.
+Because the incremental poll can not see deleted records, the whole table is reloaded
+after every full_reload_interval seconds.
+The unfinished jobs are indexed in a ReadyQueue (see ready_queue.py), so a job for a machine
+is found without going over the whole table.
+
+Required imports:
+    - airtable-python-wrapper
+
+Classes:
+    * JobStore(table, sync_interval, full_reload_interval, flush_interval, on_change, is_ready, is_claimed, claim_settle)
+                                                            - Local job table that is read by deploy_job() and all_jobs_is_done().
+
+        * load(): none                                      - Loads the whole table into memory.
+
+        * sync(): none                                      - Fetches only the records that have been modified since the last sync.
+
+        * flush(): none                                     - Writes all pending fields to the db with batch updates.
+
+        * start(): none                                     - Starts the background threads that call sync(), flush() and claim().
+
+        * reindex(): none                                   - Builds the ready queue again (when is_ready changed its decisions).
+
+        * claim(claims): dict                               - Claims jobs directly in the db and verifies the claims (scale-out).
+
+        * claim_async(JOB_ID, fields, on_done): none        - Claims a job in the background and calls on_done with the result.
+
+        * write_through(JOB_ID, fields): none               - Updates a job and writes it directly to the db in the background.
+
+        * expire_leases(now, select): list                  - Gives the processing jobs with an expired lease back to the ready queue.
+
+        * missing_fields(defaults): list                    - Names of the fields that have no column in the db.
+
+        * jobs(): list                                      - Returns a snapshot of the fields of all jobs.
+
+        * get(JOB_ID): dict                                 - Returns a copy of the fields of a job.
+
+        * shortest_job(): dict                              - Returns the shortest unfinished job that is not taken.
+
+        * largest_job_under(limit): dict                    - Returns the largest unfinished job with remaining_job_time < limit that is not taken.
+
+        * take(JOB_ID), release(JOB_ID): none               - Marks a job as taken by a machine / not taken anymore.
+
+        * ready_count(): int                                - Amount of unfinished jobs that are not taken.
+
+        * update(JOB_ID, fields): none                      - Updates the local copy and queues the fields for the next flush().
+"""
+
+# -------------------------------- Imports -------------------------------- #
+
+import atexit
+import queue
+import threading
+import time
+from datetime import datetime, timedelta
+from job_table import BATCH_RECORDS, is_transient
+from ready_queue import LEASE_EXPIRES, ReadyQueue, is_unfinished
+
+# -------------------------------- Variables -------------------------------- #
+
+# Records modified shortly before the last sync are fetched again, because LAST_MODIFIED_TIME()
+# only has a resolution of seconds and the clock of the edge device can differ from Airtable.
+SYNC_OVERLAP = timedelta(seconds=10)
+
+# -------------------------------- Classes -------------------------------- #
+
+class JobStore:
+    """Local job table that is loaded once and kept up to date by incremental polling.
+
+    Parameters
+    ----------
+    table : Airtable
+        client of the job table
+    sync_interval : float
+        seconds between two incremental polls
+    full_reload_interval : float
+        seconds between two full reloads (to notice deleted records)
+    flush_interval : float
+        seconds between two flushes of the pending writes
+    on_change : callable
+        gets called (from the sync thread) when a poll changed the local copy
+    is_ready : callable
+        gets the fields of a job and returns True if it can be deployed (default: ready_queue.is_unfinished)
+    is_claimed : callable
+        gets the fields of a record and returns True when the job is claimed by someone else (see claim())
+    claim_settle : float
+        seconds between the write of the claims and their verification
+    """
+
+    def __init__(self, table, sync_interval=5, full_reload_interval=300, flush_interval=2, on_change=None, is_ready=is_unfinished,
+                 is_claimed=None, claim_settle=0.5):
+        self._table                 = table
+        self._sync_interval         = sync_interval
+        self._full_reload_interval  = full_reload_interval
+        self._flush_interval        = flush_interval
+        self._on_change             = on_change
+        self._records               = dict()            # JOB_ID -> {"id": record id, "fields": fields}
+        self._queue                 = ReadyQueue(is_ready)  # Index of the unfinished jobs
+        self._lock                  = threading.Lock()
+        self._last_sync             = None              # UTC time of the last (incremental) poll
+        self._last_full_reload      = 0.0               # time.monotonic() of the last full reload
+        self._pending               = dict()            # JOB_ID -> fields that are not written to the db yet
+        self._inflight              = dict()            # JOB_ID -> fields that are being written by flush()
+        self._written               = dict()            # JOB_ID -> (write number, fields) until an poll started after the write
+        self._writes                = 0                 # Number of the last successful write
+        self._record_ids            = dict()            # JOB_ID -> record id of jobs that are not in the local copy
+        self._flush_lock            = threading.Lock()  # Only one flush at a time
+        self._is_claimed            = is_claimed
+        self._claim_settle          = claim_settle
+        self._claims                = queue.Queue()     # (JOB_ID, fields, on_done) of the claims (on_done None -> write_through()) for the claim thread
+
+    def load(self):
+        """Loads the whole table into memory. Records that are not in the table anymore get removed.
+
+        Returns
+        -------
+        none
+
+        """
+        started     = datetime.utcnow()
+        writes      = self._writes
+        records     = self._table.get_all()
+
+        with self._lock:
+            self._forget_written(writes)
+            self._records = dict()
+            self._queue.clear()
+            for record in records:
+                self._merge(record)
+            self._last_sync         = started
+            self._last_full_reload  = time.monotonic()
+
+        if self._on_change is not None:
+            self._on_change()
+
+    def sync(self):
+        """Fetches only the records that have been modified since the last sync and merges them into the local copy.
+        Calls load() instead when the store was never loaded or the full_reload_interval is over.
+
+        Returns
+        -------
+        none
+
+        """
+        if self._last_sync is None or time.monotonic() - self._last_full_reload >= self._full_reload_interval:
+            self.load()
+            return
+
+        started     = datetime.utcnow()
+        writes      = self._writes
+        since       = (self._last_sync - SYNC_OVERLAP).strftime("%Y-%m-%dT%H:%M:%S.000Z")
+        records     = self._table.get_all(formula="IS_AFTER(LAST_MODIFIED_TIME(), '" + since + "')")
+
+        changed = False
+
+        with self._lock:
+            self._forget_written(writes)
+            for record in records:
+                changed = self._merge(record) or changed
+            self._last_sync = started
+
+        if changed and self._on_change is not None:
+            self._on_change()
+
+    def _forget_written(self, writes):
+        """Forgets the written fields of the writes up to the number writes. A poll that started after
+        these writes contains them. The caller has to hold the lock."""
+        self._written = {JOB_ID: written for JOB_ID, written in self._written.items() if written[0] > writes}
+
+    def _merge(self, record):
+        """Puts a record from the db into the local copy. The written fields that the poll may not contain yet,
+        the fields that are being written and the pending fields are applied on top, so a poll can not undo a local update.
+        The caller has to hold the lock.
+
+        Parameters
+        ----------
+        record : dict
+            record from the db
+
+        Returns
+        -------
+        bool :
+            True if the fields of the job changed
+        """
+        if "JOB_ID" not in record["fields"]:
+            return False
+
+        JOB_ID = record["fields"]["JOB_ID"]
+
+        if JOB_ID in self._written:
+            record["fields"].update(self._written[JOB_ID][1])
+        if JOB_ID in self._inflight:
+            record["fields"].update(self._inflight[JOB_ID])
+        if JOB_ID in self._pending:
+            record["fields"].update(self._pending[JOB_ID])
+
+        old = self._records.get(JOB_ID)
+
+        self._records[JOB_ID] = record
+        self._queue.put(record["fields"])
+
+        return old is None or old["fields"] != record["fields"]
+
+    def flush(self):
+        """Writes all pending fields to the db. The fields of one job are written as one record
+        and the records are sent with batch updates of BATCH_RECORDS (10) records.
+        The record ids are resolved first, the updates of jobs that are not in the table are dropped.
+        When an batch fails transient (throttled, HTTP 5xx, connection error) only its fields stay pending,
+        unless they have been updated in the meantime. When an batch is rejected (e.g. HTTP 422) its records
+        are sent one by one and only the rejected records are dropped, so one bad record doesnt block the other jobs.
+        Dropped updates are printed. Raises the last transient error after all batches have been sent.
+
+        Returns
+        -------
+        none
+
+        """
+        with self._flush_lock:
+            with self._lock:
+                pending         = self._pending
+                self._pending   = dict()
+                for JOB_ID, fields in pending.items():
+                    self._inflight.setdefault(JOB_ID, dict()).update(fields)
+
+            if len(pending) <= 0:
+                return
+
+            failed = self._send(pending)
+            if failed is not None:
+                raise failed
+
+    def _send(self, updates):
+        """Resolves the record ids and sends the updates with batch updates (see flush()). The fields must be in the in-flight fields.
+
+        Parameters
+        ----------
+        updates : dict
+            JOB_ID -> fields
+
+        Returns
+        -------
+        Exception :
+            the last transient error when fields stay pending, else None
+        """
+        failed  = None
+        records = list()    # (JOB_ID, record) with an resolved record id
+
+        for JOB_ID, fields in updates.items():
+            try:
+                record_id = self._record_id(JOB_ID)
+            except Exception as error:
+                self._requeue([(JOB_ID, {"fields": fields})])
+                failed = error
+                continue
+
+            if record_id is None:
+                print("Job: " + str(JOB_ID) + " is not in the job table. Dropped the update: " + str(fields))
+                with self._lock:
+                    self._inflight.pop(JOB_ID, None)
+                continue
+
+            records.append((JOB_ID, {"id": record_id, "fields": fields}))
+
+        for start in range(0, len(records), BATCH_RECORDS):
+            failed = self._write(records[start:start + BATCH_RECORDS]) or failed
+
+        return failed
+
+    def _write(self, records):
+        """Sends one batch update. An rejected batch is sent again record by record and the rejected records are dropped.
+
+        Parameters
+        ----------
+        records : list
+            (JOB_ID, record) of the batch
+
+        Returns
+        -------
+        Exception :
+            the transient error when records stay pending, else None
+        """
+        try:
+            self._table.batch_update([record for JOB_ID, record in records])
+
+            # Written -> applied on top of the polls until an poll started after this write
+            with self._lock:
+                self._writes += 1
+                for JOB_ID, record in records:
+                    self._inflight.pop(JOB_ID, None)
+                    fields = dict(self._written[JOB_ID][1]) if JOB_ID in self._written else dict()
+                    fields.update(record["fields"])
+                    self._written[JOB_ID] = (self._writes, fields)
+            return None
+
+        except Exception as error:
+            if is_transient(error):
+                self._requeue(records)
+                return error
+
+            if len(records) > 1:
+                failed = None
+                for record in records:
+                    failed = self._write([record]) or failed
+                return failed
+
+            JOB_ID, record = records[0]
+            print("Job: " + str(JOB_ID) + " update was rejected and dropped: " + str(record["fields"]) + " (" + repr(error) + ")")
+
+            with self._lock:
+                self._record_ids.pop(JOB_ID, None)
+                self._inflight.pop(JOB_ID, None)
+            return None
+
+    def _requeue(self, records):
+        """Puts the fields of records back to the pending fields. Fields that have been updated in the meantime are kept.
+
+        Parameters
+        ----------
+        records : list
+            (JOB_ID, record) with the fields that were not written
+
+        Returns
+        -------
+        none
+
+        """
+        with self._lock:
+            for JOB_ID, record in records:
+                self._inflight.pop(JOB_ID, None)
+                fields = record["fields"]
+                fields.update(self._pending.get(JOB_ID, dict()))
+                self._pending[JOB_ID] = fields
+
+    def _record_id(self, JOB_ID):
+        """Returns the record id of a job. Only jobs that are not in the local copy are searched
+        in the db and the found record id is remembered.
+
+        Parameters
+        ----------
+        JOB_ID : any
+            ID of the job
+
+        Returns
+        -------
+        str :
+            record id of the job or None if the job is not in the table
+        """
+        with self._lock:
+            record = self._records.get(JOB_ID)
+            if record is not None:
+                return record["id"]
+            if JOB_ID in self._record_ids:
+                return self._record_ids[JOB_ID]
+
+        record = self._table.match("JOB_ID", JOB_ID)
+        if len(record) <= 0:
+            return None
+
+        with self._lock:
+            self._record_ids[JOB_ID] = record["id"]
+
+        return record["id"]
+
+    def start(self):
+        """Starts a daemon thread that calls sync() every sync_interval seconds, one that
+        calls flush() every flush_interval seconds and one that claims the jobs of claim_async().
+        The pending fields are flushed at exit as well.
+        Errors are printed and tried again at the next interval.
+
+        Returns
+        -------
+        none
+
+        """
+        def repeat(function, interval, name):
+            def run():
+                while True:
+                    time.sleep(interval)
+                    try:
+                        function()
+                    except Exception as error:
+                        print("Job " + name + " failed: " + str(error))
+
+            threading.Thread(target=run, name="job-store-" + name, daemon=True).start()
+
+        repeat(self.sync, self._sync_interval, "sync")
+        repeat(self.flush, self._flush_interval, "flush")
+
+        threading.Thread(target=self._claim_loop, name="job-store-claim", daemon=True).start()
+
+        atexit.register(self.flush)
+
+    def reindex(self):
+        """Builds the ready queue again from the local copy, e.g. when is_ready decides different now.
+
+        Returns
+        -------
+        none
+
+        """
+        with self._lock:
+            self._queue.clear()
+            for record in self._records.values():
+                self._queue.put(record["fields"])
+
+    def claim(self, claims):
+        """Claims jobs directly in the db (not write-behind), for several edge devices on the same table.
+        Every record is read first and is not claimed when is_claimed(fields of the record) is True.
+        Else the fields are written (with batch updates), and after claim_settle seconds the records are read again:
+        the db keeps the last write, so a claim is won when its fields are still there.
+        This is no compare-and-swap. When the read and the write of an other edge device are more than claim_settle
+        seconds apart (e.g. by the rate limit or retries), both can win the same job. A double deployment is unlikely, not impossible.
+        Blocks for at least claim_settle seconds, claim_async() runs it in the background.
+
+        Parameters
+        ----------
+        claims : dict
+            JOB_ID -> fields of the claim (e.g. status and owner)
+
+        Returns
+        -------
+        dict :
+            JOB_ID -> True if the claim is won
+        """
+        won     = {JOB_ID: False for JOB_ID in claims}
+        records = dict()    # JOB_ID -> record that is not claimed by someone else
+
+        for JOB_ID in claims:
+            record = self._table.match("JOB_ID", JOB_ID)
+            if len(record) <= 0:
+                continue
+
+            if self._is_claimed is not None and self._is_claimed(dict(record["fields"])):
+                with self._lock:
+                    self._merge(record)
+                continue
+
+            records[JOB_ID] = record
+
+        if len(records) <= 0:
+            return won
+
+        updates = [{"id": record["id"], "fields": claims[JOB_ID]} for JOB_ID, record in records.items()]
+        for start in range(0, len(updates), BATCH_RECORDS):
+            self._table.batch_update(updates[start:start + BATCH_RECORDS])
+
+        time.sleep(self._claim_settle)
+
+        for JOB_ID in records:
+            record = self._table.match("JOB_ID", JOB_ID)
+            if len(record) <= 0:
+                continue
+
+            won[JOB_ID] = all(record["fields"].get(name) == value for name, value in claims[JOB_ID].items())
+
+            with self._lock:
+                self._merge(record)
+
+        return won
+
+    def claim_async(self, JOB_ID, fields, on_done):
+        """Queues the claim of a job for the claim thread (see start()). Returns immediately.
+        The claims that are queued at the same time are claimed together with one settle.
+
+        Parameters
+        ----------
+        JOB_ID : any
+            ID of the job
+        fields : dict
+            fields of the claim (e.g. status and owner)
+        on_done : callable
+            gets called (from the claim thread) with the JOB_ID and True if the claim is won. A failed claim is lost
+
+        Returns
+        -------
+        none
+
+        """
+        self._claims.put((JOB_ID, fields, on_done))
+
+    def write_through(self, JOB_ID, fields):
+        """Updates the local copy and writes the fields directly to the db (not write-behind) in the claim thread,
+        e.g. the owner of an job that this edge device took over. Returns immediately. When the write fails
+        the fields are written at the next flush().
+
+        Parameters
+        ----------
+        JOB_ID : any
+            ID of the job
+        fields : dict
+            cells that are going to be updated
+
+        Returns
+        -------
+        none
+
+        """
+        with self._lock:
+            record = self._records.get(JOB_ID)
+            if record is not None:
+                record["fields"].update(fields)
+                self._queue.put(record["fields"])
+
+            self._inflight.setdefault(JOB_ID, dict()).update(fields)
+
+        self._claims.put((JOB_ID, dict(fields), None))
+
+    def _claim_loop(self):
+        """Writes the fields of write_through() and claims the queued jobs. Runs in the claim thread."""
+        while True:
+            queued = [self._claims.get()]
+
+            # Take all claims that arrived in the meantime and claim them together
+            try:
+                while True:
+                    queued.append(self._claims.get_nowait())
+            except queue.Empty:
+                pass
+
+            # Direct writes first, so an claim reads them
+            writes = dict()
+            for JOB_ID, fields, on_done in queued:
+                if on_done is None:
+                    writes.setdefault(JOB_ID, dict()).update(fields)
+
+            if len(writes) > 0:
+                try:
+                    failed = self._send(writes)
+                    if failed is not None:
+                        print("Job write failed, it is written at the next flush: " + str(failed))
+                except Exception as error:
+                    print("Job write failed: " + str(error))
+
+            queued = [(JOB_ID, fields, on_done) for JOB_ID, fields, on_done in queued if on_done is not None]
+            if len(queued) <= 0:
+                continue
+
+            claims = {JOB_ID: fields for JOB_ID, fields, on_done in queued}
+
+            try:
+                won = self.claim(claims)
+            except Exception as error:
+                print("Job claim failed: " + str(error))
+                won = dict()
+
+            for JOB_ID, fields, on_done in queued:
+                on_done(JOB_ID, won.get(JOB_ID, False))
+
+    def expire_leases(self, now=None, select=None):
+        """Gives the processing jobs with an expired lease (no machine reported the job for too long) back to the ready queue.
+        The status gets unfinished, the remaining_job_time that was written by the last renewal of the lease is kept.
+        Jobs that are taken by a machine of this edge device and jobs without a lease are not changed.
+
+        Parameters
+        ----------
+        now : float
+            actual unix time (default: time.time())
+        select : callable
+            gets the fields of a job and returns False if this edge device must not expire it (default: all jobs)
+
+        Returns
+        -------
+        list :
+            JOB_IDs of the expired jobs
+        """
+        if now is None:
+            now = time.time()
+
+        with self._lock:
+            expired = [JOB_ID for JOB_ID, record in self._records.items()
+                       if record["fields"].get("status") == "processing" and 0 < (record["fields"].get(LEASE_EXPIRES) or 0) <= now
+                       and not self._queue.is_taken(JOB_ID) and (select is None or select(record["fields"]))]
+
+        for JOB_ID in expired:
+            self.update(JOB_ID, {"status": "unfinished", LEASE_EXPIRES: 0})
+
+        return expired
+
+    def missing_fields(self, defaults):
+        """Names of the fields that have no column in the db (Airtable rejects an update with an unknown field).
+        A field that a record of the local copy has exists. Else its default value is written to a record that is
+        not processing, the column is missing when the db rejects the write. Without records nothing can be checked.
+        Should be called after load() and before start().
+
+        Parameters
+        ----------
+        defaults : dict
+            name -> value of the field that doesnt change a job (e.g. 0 for lease_expires)
+
+        Returns
+        -------
+        list :
+            names of the missing fields
+        """
+        with self._lock:
+            records = [{"id": record["id"], "fields": dict(record["fields"])} for record in self._records.values()]
+
+        probe   = next((record for record in records if record["fields"].get("status") != "processing"), None)
+        missing = list()
+
+        for name, value in defaults.items():
+            if probe is None or any(name in record["fields"] for record in records):
+                continue
+
+            try:
+                self._table.batch_update([{"id": probe["id"], "fields": {name: value}}])
+            except Exception as error:
+                if is_transient(error):
+                    raise
+                missing.append(name)
+
+        return missing
+
+    def jobs(self):
+        """Returns a snapshot of the fields of all jobs.
+
+        Returns
+        -------
+        list :
+            copies of the fields of every job in the table
+        """
+        with self._lock:
+            return [dict(record["fields"]) for record in self._records.values()]
+
+    def get(self, JOB_ID):
+        """Returns a copy of the fields of a job.
+
+        Parameters
+        ----------
+        JOB_ID : any
+            ID of the job
+
+        Returns
+        -------
+        dict :
+            fields of the job or None if the job is not in the table
+        """
+        with self._lock:
+            record = self._records.get(JOB_ID)
+            if record is not None:
+                return dict(record["fields"])
+            return None
+
+    def shortest_job(self):
+        """Returns the shortest unfinished job that is not taken.
+
+        Returns
+        -------
+        dict :
+            fields of the job or None if there is no job
+        """
+        with self._lock:
+            JOB_ID = self._queue.shortest()
+            if JOB_ID is not None:
+                return dict(self._records[JOB_ID]["fields"])
+            return None
+
+    def largest_job_under(self, limit):
+        """Returns the largest unfinished job with remaining_job_time < limit that is not taken.
+
+        Parameters
+        ----------
+        limit : any
+            exclusive upper limit of the remaining_job_time (remain_time of the machine)
+
+        Returns
+        -------
+        dict :
+            fields of the job or None if no job fits
+        """
+        with self._lock:
+            JOB_ID = self._queue.largest_under(limit)
+            if JOB_ID is not None:
+                return dict(self._records[JOB_ID]["fields"])
+            return None
+
+    def take(self, JOB_ID):
+        """Marks a job as taken by a machine, so it will not be deployed again until it gets released.
+
+        Parameters
+        ----------
+        JOB_ID : any
+            ID of the job
+
+        Returns
+        -------
+        none
+
+        """
+        with self._lock:
+            self._queue.take(JOB_ID)
+
+    def release(self, JOB_ID):
+        """Marks a job as not taken anymore.
+
+        Parameters
+        ----------
+        JOB_ID : any
+            ID of the job
+
+        Returns
+        -------
+        none
+
+        """
+        with self._lock:
+            self._queue.release(JOB_ID)
+
+    def ready_count(self):
+        """Amount of unfinished jobs that are not taken.
+
+        Returns
+        -------
+        int :
+            amount of jobs
+        """
+        with self._lock:
+            return len(self._queue)
+
+    def update(self, JOB_ID, fields):
+        """Updates the local copy and queues the fields for the next flush().
+        Fields of the same job are merged, so several updates of a job are written as one record.
+
+        Parameters
+        ----------
+        JOB_ID : any
+            ID of the exist job in db
+        fields : dict
+            cells that are going to be updated
+
+        Returns
+        -------
+        none
+
+        """
+        with self._lock:
+            record = self._records.get(JOB_ID)
+            if record is not None:
+                record["fields"].update(fields)
+                self._queue.put(record["fields"])
+
+            self._pending.setdefault(JOB_ID, dict()).update(fields)
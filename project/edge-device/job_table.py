@@ -0,0 +1,416 @@
+"""Job Table
+
+Backends of the job table that the JobStore (job_store.py) reads and writes:
+    * Airtable                                              - The Airtable of the factory (AIRTABLE_BASE_KEY, AIRTABLE_TABLE_NAME, AIRTABLE_API_KEY).
+    * LocalTable                                            - JSON file on the local disk with the same methods, for offline runs and benchmarks.
+
+The Airtable is created once per process and wrapped in an RateLimitedTable: all requests share one client
+(one HTTP session, so the connections are reused) and an token bucket that keeps the requests under the quota of
+the base (5 requests per second). Throttled (HTTP 429) and failed requests are retried with an jittered,
+exponential backoff. The latency, the retries and the throttled requests of every method are counted.
+
+Required imports:
+    - airtable-python-wrapper (only for the Airtable)
+
+Classes:
+    * LocalTable(path)                                      - Job table in an JSON file with the methods of the Airtable that the JobStore uses.
+
+        * get_all(formula): list                            - All records, or with IS_AFTER(LAST_MODIFIED_TIME(), ...) only the modified ones.
+
+        * match(field, value): dict                         - First record with the value in the field or an empty dict.
+
+        * insert(fields): dict                              - Adds an record.
+
+        * batch_insert(records): list                       - Adds records.
+
+        * batch_update(records): list                       - Updates the fields of records ({"id", "fields"}).
+
+    * TokenBucket(rate, burst)                              - Thread safe token bucket.
+
+        * acquire(tokens): float                            - Waits until the tokens are available and returns the waited seconds.
+
+    * RateLimitedTable(table, rate, burst, retries, retry_delay, max_delay)
+                                                            - Job table with an shared token bucket, retries and counters.
+
+        * get_all, match, insert, batch_insert, batch_update- Same methods as the table.
+
+        * stats(): dict                                     - Calls, errors, retries, throttled requests and latency of every method.
+
+Functions:
+    * is_transient(error): bool                             - True if an failed request can succeed when its sent again.
+
+    * open_job_table(backend): any                          - Returns the shared job table backend from the Env variables.
+"""
+
+# -------------------------------- Imports -------------------------------- #
+
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+from datetime import datetime
+
+# -------------------------------- Variables -------------------------------- #
+
+MODIFIED_SINCE = re.compile(r"IS_AFTER\(LAST_MODIFIED_TIME\(\), '([^']+)'\)")     # Formula of JobStore.sync()
+RETRY_STATUS   = (429, 500, 502, 503, 504)      # HTTP status codes of requests that are retried
+BATCH_RECORDS  = 10                             # Records per request of an batch method (limit of the Airtable)
+PAGE_RECORDS   = 100                            # Records per page of get_all() (limit of the Airtable)
+
+__tables       = dict()                         # backend -> job table of open_job_table(), one per process
+__tables_lock  = threading.Lock()
+
+# -------------------------------- Classes -------------------------------- #
+
+class LocalTable:
+    """Job table in an JSON file with the methods of the Airtable that the JobStore uses.
+    Every write replaces the file (atomic by an rename), so an other process can read it at any time.
+
+    Parameters
+    ----------
+    path : str
+        path to the JSON file (an list of records {"id", "fields", "modified"})
+    """
+
+    def __init__(self, path):
+        self.path       = path
+        self._lock      = threading.Lock()
+        self._records   = list()
+
+        if os.path.isfile(path):
+            with open(path) as table_file:
+                self._records = json.load(table_file)
+
+    def get_all(self, formula=None):
+        """All records of the table. With the formula IS_AFTER(LAST_MODIFIED_TIME(), 'since') only
+        the records that have been modified after since. Other formulas are not supported.
+
+        Parameters
+        ----------
+        formula : str
+            filter of the records
+
+        Returns
+        -------
+        list :
+            records {"id", "fields"}
+        """
+        since = None
+        if formula is not None:
+            match = MODIFIED_SINCE.fullmatch(formula)
+            if match is None:
+                raise ValueError("Unsupported formula: " + formula)
+            since = match.group(1)
+
+        with self._lock:
+            return [{"id": record["id"], "fields": dict(record["fields"])} for record in self._records
+                    if since is None or record["modified"] > since]
+
+    def match(self, field, value):
+        """First record with the value in the field.
+
+        Parameters
+        ----------
+        field : str
+            name of the field
+        value : any
+            value of the field
+
+        Returns
+        -------
+        dict :
+            record {"id", "fields"} or an empty dict
+        """
+        with self._lock:
+            for record in self._records:
+                if record["fields"].get(field) == value:
+                    return {"id": record["id"], "fields": dict(record["fields"])}
+        return dict()
+
+    def insert(self, fields):
+        """Adds an record.
+
+        Parameters
+        ----------
+        fields : dict
+            fields of the record
+
+        Returns
+        -------
+        dict :
+            the new record
+        """
+        return self.batch_insert([fields])[0]
+
+    def batch_insert(self, records):
+        """Adds records.
+
+        Parameters
+        ----------
+        records : list
+            fields of the records
+
+        Returns
+        -------
+        list :
+            the new records
+        """
+        with self._lock:
+            inserted = list()
+            for fields in records:
+                record = {"id": "rec" + str(len(self._records) + 1), "fields": dict(fields), "modified": self._now()}
+                self._records.append(record)
+                inserted.append({"id": record["id"], "fields": dict(fields)})
+            self._write()
+        return inserted
+
+    def batch_update(self, records):
+        """Updates the fields of records. Fields that are not given are kept.
+
+        Parameters
+        ----------
+        records : list
+            records {"id", "fields"}
+
+        Returns
+        -------
+        list :
+            the updated records
+        """
+        with self._lock:
+            by_id   = {record["id"]: record for record in self._records}
+            updated = list()
+
+            # Like the Airtable the whole request fails when an record doesnt exist
+            for update in records:
+                if update["id"] not in by_id:
+                    raise KeyError("Record not found: " + str(update["id"]))
+
+            for update in records:
+                record = by_id[update["id"]]
+                record["fields"].update(update["fields"])
+                record["modified"] = self._now()
+                updated.append({"id": record["id"], "fields": dict(record["fields"])})
+
+            self._write()
+        return updated
+
+    def _now(self):
+        """Modification time in the format of the formula."""
+        return datetime.utcnow().strftime("%Y-%m-%dT%H:%M:%S.%f")[:-3] + "Z"
+
+    def _write(self):
+        """Writes the table to the file (atomic by an rename). The caller has to hold the lock."""
+        with open(self.path + ".tmp", "w") as table_file:
+            json.dump(self._records, table_file)
+        os.replace(self.path + ".tmp", self.path)
+
+class TokenBucket:
+    """Thread safe token bucket. Tokens are added with rate per second up to burst.
+
+    Parameters
+    ----------
+    rate : float
+        tokens per second
+    burst : float
+        maximal amount of tokens
+    """
+
+    def __init__(self, rate, burst):
+        self._rate      = rate
+        self._burst     = burst
+        self._tokens    = burst
+        self._updated   = time.monotonic()
+        self._lock      = threading.Lock()
+
+    def acquire(self, tokens=1):
+        """Waits until the tokens are available and takes them. More tokens than burst are taken one burst after the other.
+
+        Parameters
+        ----------
+        tokens : float
+            amount of tokens (e.g. requests)
+
+        Returns
+        -------
+        float :
+            seconds that were waited
+        """
+        waited = 0.0
+
+        while tokens > 0:
+            take = min(tokens, self._burst)
+
+            with self._lock:
+                now             = time.monotonic()
+                self._tokens    = min(self._burst, self._tokens + (now - self._updated) * self._rate)
+                self._updated   = now
+
+                # Take the tokens now, the bucket goes negative and the next caller waits for it
+                delay           = max(0.0, (take - self._tokens) / self._rate)
+                self._tokens   -= take
+
+            if delay > 0:
+                time.sleep(delay)
+                waited += delay
+
+            tokens -= take
+
+        return waited
+
+class RateLimitedTable:
+    """Job table with an shared token bucket, retries and counters. Every method takes one token per request
+    that the table sends (batch methods send BATCH_RECORDS records per request).
+    Throttled requests (HTTP 429) are always retried, failed requests (HTTP 5xx, connection errors) only when the
+    method can be repeated without side effects (not for inserts, they could be inserted twice).
+
+    Parameters
+    ----------
+    table : any
+        job table (e.g. Airtable)
+    rate : float
+        requests per second
+    burst : float
+        requests that can be sent at once
+    retries : int
+        amount of retries of an request
+    retry_delay : float
+        seconds before the first retry, doubled with every retry
+    max_delay : float
+        maximal seconds before an retry
+    """
+
+    def __init__(self, table, rate=5, burst=5, retries=5, retry_delay=0.5, max_delay=30):
+        self.table          = table
+        self._bucket        = TokenBucket(rate, burst)
+        self._retries       = retries
+        self._retry_delay   = retry_delay
+        self._max_delay     = max_delay
+        self._lock          = threading.Lock()
+        self._stats         = dict()    # method -> counters
+
+    def get_all(self, formula=None):
+        """See LocalTable.get_all(). Takes one token, the pages after the first are taken afterwards."""
+        records = self._call("get_all", True, 1, lambda: self.table.get_all(formula=formula) if formula is not None else self.table.get_all())
+        self._bucket.acquire(max(0, math.ceil(len(records) / PAGE_RECORDS) - 1))
+        return records
+
+    def match(self, field, value):
+        """See LocalTable.match()."""
+        return self._call("match", True, 1, lambda: self.table.match(field, value))
+
+    def insert(self, fields):
+        """See LocalTable.insert()."""
+        return self._call("insert", False, 1, lambda: self.table.insert(fields))
+
+    def batch_insert(self, records):
+        """See LocalTable.batch_insert()."""
+        return self._call("batch_insert", False, math.ceil(len(records) / BATCH_RECORDS), lambda: self.table.batch_insert(records))
+
+    def batch_update(self, records):
+        """See LocalTable.batch_update()."""
+        return self._call("batch_update", True, math.ceil(len(records) / BATCH_RECORDS), lambda: self.table.batch_update(records))
+
+    def stats(self):
+        """Calls, errors, retries, throttled requests, seconds waited for the token bucket and latency of every method.
+
+        Returns
+        -------
+        dict :
+            method -> {calls, errors, retries, throttled, waited, latency_total, latency_max}
+        """
+        with self._lock:
+            return {method: dict(counters) for method, counters in self._stats.items()}
+
+    def _count(self, method, **counters):
+        """Adds to the counters of an method (latency is added to latency_total and kept as maximum in latency_max)."""
+        with self._lock:
+            stats = self._stats.setdefault(method, {"calls": 0, "errors": 0, "retries": 0, "throttled": 0, "waited": 0.0,
+                                                    "latency_total": 0.0, "latency_max": 0.0})
+            for name, value in counters.items():
+                if name == "latency":
+                    stats["latency_total"]  += value
+                    stats["latency_max"]     = max(stats["latency_max"], value)
+                else:
+                    stats[name] += value
+
+    def _call(self, method, repeatable, requests, call):
+        """Calls the table with the token bucket and the retries. Raises the last error when all retries failed."""
+        tries = 0
+
+        while True:
+            waited  = self._bucket.acquire(requests)
+            started = time.monotonic()
+
+            try:
+                result = call()
+                self._count(method, calls=1, waited=waited, latency=time.monotonic() - started)
+                return result
+
+            except Exception as error:
+                throttled   = getattr(getattr(error, "response", None), "status_code", None) == 429
+                retry       = throttled or (repeatable and is_transient(error))
+
+                self._count(method, waited=waited, throttled=int(throttled), latency=time.monotonic() - started)
+
+                if not retry or tries >= self._retries:
+                    self._count(method, calls=1, errors=1)
+                    raise
+
+                # Exponential backoff with full jitter, so several threads and devices dont retry at the same time
+                time.sleep(random.uniform(0, min(self._max_delay, self._retry_delay * 2 ** tries)))
+                self._count(method, retries=1)
+                tries += 1
+
+# -------------------------------- Functions -------------------------------- #
+
+def is_transient(error):
+    """True if an failed request can succeed when its sent again: throttled (HTTP 429), an HTTP status of RETRY_STATUS
+    or an connection error. Other errors (e.g. HTTP 422 for an unknown field or record) fail again.
+
+    Parameters
+    ----------
+    error : Exception
+        error of the request
+
+    Returns
+    -------
+    bool :
+        True if the request can be repeated
+    """
+    status = getattr(getattr(error, "response", None), "status_code", None)
+
+    return status in RETRY_STATUS or (status is None and isinstance(error, OSError))
+
+def open_job_table(backend):
+    """Returns the job table backend from the Env variables. The table is created once per process and shared.
+        airtable -> Airtable with AIRTABLE_BASE_KEY, AIRTABLE_TABLE_NAME and AIRTABLE_API_KEY in an RateLimitedTable
+                    with AIRTABLE_REQUESTS_PER_SECOND (default: 5) and AIRTABLE_RETRIES (default: 5)
+        local    -> LocalTable with LOCAL_JOB_TABLE (default: ./jobs.json)
+
+    Parameters
+    ----------
+    backend : str
+        airtable or local
+
+    Returns
+    -------
+    any :
+        the job table
+    """
+    with __tables_lock:
+        if backend not in __tables:
+            if backend == "local":
+                __tables[backend] = LocalTable(os.environ.get("LOCAL_JOB_TABLE", "jobs.json"))
+
+            else:
+                from airtable import Airtable
+
+                rate                = float(os.environ.get("AIRTABLE_REQUESTS_PER_SECOND", 5))
+                __tables[backend]   = RateLimitedTable(Airtable(os.environ["AIRTABLE_BASE_KEY"], os.environ["AIRTABLE_TABLE_NAME"], os.environ["AIRTABLE_API_KEY"]),
+                                                       rate, rate, int(os.environ.get("AIRTABLE_RETRIES", 5)))
+
+        return __tables[backend]
@@ -0,0 +1,198 @@
+"""Membership
+
+Scale-out of the edge device: several edge device instances share the machines.
+Every instance announces itself with an retained message on edge_devices/EDGE_ID/. When an instance
+stops (or its connection breaks, by the last will of its Mqtt client) the retained message is
+deleted, so all instances always know the instances that are alive.
+Every MACHINE_ID (and every other key) belongs to exactly one alive instance. The owner is chosen by
+rendezvous hashing (the instance with the highest hash of instance and key), so all instances
+compute the same owner without any coordination and an joining or leaving instance only moves
+the keys that it gets or had.
+The jobs are not partitioned: every instance can deploy every job that is not claimed by an other
+alive instance (see JobStore.claim()).
+
+Classes:
+    * Membership(client, EDGE_ID, on_change)                - Alive edge device instances and the owner of an key.
+
+        * will(): none                                      - Sets the last will of the client (before connect()).
+
+        * announce(): none                                  - Announces the instance and subscribes to the other instances (in on_connect()).
+
+        * leave(): none                                     - Deletes the announcement of the instance.
+
+        * handle(msg): bool                                 - Updates the instances from an message on edge_devices/. False for other messages.
+
+        * members(): set                                    - EDGE_IDs of the alive instances.
+
+        * departed(EDGE_ID): float                          - Seconds since an instance left (or since the start of this instance).
+
+        * owner(key): str                                   - EDGE_ID of the instance that owns the key.
+
+        * owns(key): bool                                   - True if this instance owns the key.
+"""
+
+# -------------------------------- Imports -------------------------------- #
+
+import hashlib
+import json
+import threading
+import time
+
+# -------------------------------- Variables -------------------------------- #
+
+TOPIC = "edge_devices/"
+
+# -------------------------------- Classes -------------------------------- #
+
+class Membership:
+    """Alive edge device instances and the owner of an key.
+
+    Parameters
+    ----------
+    client : paho.mqtt.client.Client
+        Mqtt client of the edge device
+    EDGE_ID : str
+        unique ID of this instance
+    on_change : callable
+        gets called (from the Mqtt thread) when an instance joined or left
+    """
+
+    def __init__(self, client, EDGE_ID, on_change=None):
+        self.EDGE_ID    = EDGE_ID
+        self._client    = client
+        self._on_change = on_change
+        self._lock      = threading.Lock()
+        self._members   = {EDGE_ID}
+        self._left      = dict()                # EDGE_ID -> time.monotonic() when the instance left
+        self._started   = time.monotonic()
+
+    def will(self):
+        """Sets the last will of the client: the broker deletes the announcement when the connection breaks.
+        Has to be called before client.connect().
+
+        Returns
+        -------
+        none
+
+        """
+        self._client.will_set(TOPIC + self.EDGE_ID + "/", "", retain=True)
+
+    def announce(self):
+        """Announces the instance with an retained message and subscribes to the other instances.
+
+        Returns
+        -------
+        none
+
+        """
+        self._client.subscribe(TOPIC + "+/")
+        self._client.publish(TOPIC + self.EDGE_ID + "/", json.dumps({"EDGE_ID": self.EDGE_ID}), retain=True)
+
+    def leave(self):
+        """Deletes the announcement of the instance, the other instances take over its machines and jobs.
+
+        Returns
+        -------
+        none
+
+        """
+        self._client.publish(TOPIC + self.EDGE_ID + "/", "", retain=True)
+
+    def handle(self, msg):
+        """Updates the instances from an message on edge_devices/EDGE_ID/ (empty -> the instance left).
+
+        Parameters
+        ----------
+        msg : paho.mqtt.client.MQTTMessage
+            received message
+
+        Returns
+        -------
+        bool :
+            False if the message isnt an message of the membership
+        """
+        if not msg.topic.startswith(TOPIC):
+            return False
+
+        EDGE_ID = msg.topic[len(TOPIC):].strip("/")
+
+        with self._lock:
+            members = set(self._members)
+
+            if len(msg.payload) > 0:
+                self._members.add(EDGE_ID)
+                self._left.pop(EDGE_ID, None)
+            elif EDGE_ID != self.EDGE_ID and EDGE_ID in self._members:
+                self._members.discard(EDGE_ID)
+                self._left[EDGE_ID] = time.monotonic()
+
+            changed = members != self._members
+
+        if changed:
+            print("Edge devices: " + ", ".join(sorted(self.members())))
+            if self._on_change is not None:
+                self._on_change()
+
+        return True
+
+    def members(self):
+        """EDGE_IDs of the alive instances.
+
+        Returns
+        -------
+        set :
+            EDGE_IDs
+        """
+        with self._lock:
+            return set(self._members)
+
+    def departed(self, EDGE_ID):
+        """Seconds since an instance left. An instance that this instance never saw left at the latest when this instance started.
+
+        Parameters
+        ----------
+        EDGE_ID : str
+            ID of the instance
+
+        Returns
+        -------
+        float :
+            seconds since the instance left, 0 if it is alive
+        """
+        with self._lock:
+            if EDGE_ID in self._members:
+                return 0.0
+            return time.monotonic() - self._left.get(EDGE_ID, self._started)
+
+    def owner(self, key):
+        """EDGE_ID of the instance that owns the key (rendezvous hashing).
+
+        Parameters
+        ----------
+        key : str
+            e.g. the MACHINE_ID
+
+        Returns
+        -------
+        str :
+            EDGE_ID of the owner
+        """
+        with self._lock:
+            members = list(self._members)
+
+        return max(members, key=lambda EDGE_ID: (hashlib.sha1((EDGE_ID + "/" + key).encode("utf-8")).digest(), EDGE_ID))
+
+    def owns(self, key):
+        """True if this instance owns the key.
+
+        Parameters
+        ----------
+        key : str
+            e.g. the MACHINE_ID
+
+        Returns
+        -------
+        bool :
+            True if this instance is the owner
+        """
+        return self.owner(key) == self.EDGE_ID
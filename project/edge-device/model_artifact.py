@@ -0,0 +1,291 @@
+"""Model Artifact
+
+Compiles an trained KI-model into an compact JSON artifact that the edge device evaluates with NumPy only,
+so sklearn and joblib are not imported at runtime and an prediction doesnt go through the validation of sklearn.
+Supported models:
+    * linear                                                - LinearRegression, Ridge, Lasso, SGDRegressor, ... (coef_, intercept_) and the
+                                                              OnlineModel of the online training (the scaler is folded into the coefficients).
+    * trees                                                 - DecisionTreeRegressor, RandomForestRegressor, ExtraTreesRegressor and
+                                                              GradientBoostingRegressor (least squares with an constant init). Every tree is
+                                                              flattened into the arrays feature, threshold, left, right and value.
+
+The artifact has an format version and contains check vectors with the outputs of the original model.
+export_model() only returns an artifact whose outputs match the original model, load_artifact() checks
+the outputs again before the model is used.
+
+Export (needs the libraries of the original model):
+    MODEL=linear_regression.pkl ARTIFACT=linear_regression.json python model_artifact.py
+    With CHECK_DATA=training.csv the check vectors are taken from an training file (columns working_time, wear, alignment, temperatur).
+
+Required imports:
+    - numpy
+    - joblib (only for the export)
+
+Classes:
+    * CompiledModel(artifact)                               - Evaluates an artifact with NumPy.
+
+        * predict(X): numpy.ndarray                         - Predicts the remain_time for every feature vector.
+
+Functions:
+    * export_model(model, X_check): dict                    - Compiles an model into an artifact and checks it against the model.
+
+    * save_artifact(artifact, path): none                   - Writes an artifact as JSON (atomic by an rename).
+
+    * load_artifact(path): CompiledModel                    - Reads an artifact and checks it with its check vectors.
+
+    * check_vectors(amount, seed): numpy.ndarray            - Random feature vectors in the range of the machine values.
+"""
+
+# -------------------------------- Imports -------------------------------- #
+
+import json
+import os
+import numpy as np
+
+# -------------------------------- Variables -------------------------------- #
+
+FORMAT          = "edge-model"      # Name of the artifact format
+FORMAT_VERSION  = 1                 # Version of the artifact format, an edge device reads only its own version
+TOLERANCE       = 1e-6              # Allowed difference to the outputs of the original model (relative and absolute)
+
+# -------------------------------- Classes -------------------------------- #
+
+class CompiledModel:
+    """Evaluates an artifact with NumPy.
+
+    Parameters
+    ----------
+    artifact : dict
+        artifact of export_model()
+    """
+
+    def __init__(self, artifact):
+        self.kind       = artifact["kind"]
+        self.source     = artifact.get("source")
+
+        if self.kind == "linear":
+            self._coef      = np.asarray(artifact["coef"], dtype=float)
+            self._intercept = float(artifact["intercept"])
+
+        elif self.kind == "trees":
+            self._base      = float(artifact["base"])
+            self._scale     = float(artifact["scale"])
+            self._trees     = [{name: np.asarray(tree[name]) for name in ("feature", "threshold", "left", "right", "value")}
+                               for tree in artifact["trees"]]
+        else:
+            raise ValueError("Unsupported model kind: " + str(self.kind))
+
+    def predict(self, X):
+        """Predicts the remain_time for every feature vector.
+
+        Parameters
+        ----------
+        X : array
+            feature vectors [working_time, wear, alignment, temperatur]
+
+        Returns
+        -------
+        numpy.ndarray :
+            predicted remain_time
+        """
+        X = np.asarray(X, dtype=float)
+
+        if self.kind == "linear":
+            return X @ self._coef + self._intercept
+
+        total = np.zeros(len(X))
+        for tree in self._trees:
+            total += tree["value"][self._leaves(tree, X)]
+
+        return self._base + self._scale * total
+
+    def _leaves(self, tree, X):
+        """Leaf of every feature vector. All vectors go down the tree together, one level per step.
+        Like sklearn the features are compared as float32 (a value next to an threshold can go an other way as float64)."""
+        X       = X.astype(np.float32)
+        rows    = np.arange(len(X))
+        node    = np.zeros(len(X), dtype=np.int64)
+        inner   = tree["left"][node] >= 0
+
+        while inner.any():
+            at          = node[inner]
+            go_left     = X[rows[inner], tree["feature"][at]] <= tree["threshold"][at]
+            node[inner] = np.where(go_left, tree["left"][at], tree["right"][at])
+            inner       = tree["left"][node] >= 0
+
+        return node
+
+# -------------------------------- Functions -------------------------------- #
+
+def _flatten_tree(tree):
+    """Arrays of an fitted sklearn tree (tree_). Leaves have left = right = -1."""
+    return {
+        "feature"   : tree.feature.tolist(),
+        "threshold" : tree.threshold.tolist(),
+        "left"      : tree.children_left.tolist(),
+        "right"     : tree.children_right.tolist(),
+        "value"     : tree.value.reshape(len(tree.value), -1)[:, 0].tolist(),
+    }
+
+def _compile(model):
+    """Artifact without the check vectors. Raises an ValueError for an unsupported model."""
+    source = type(model).__module__ + "." + type(model).__name__
+
+    # OnlineModel of the online training: (X - mean) / scale @ coef + intercept
+    if hasattr(model, "scaler") and hasattr(model, "regressor"):
+        linear  = _compile(model.regressor)
+        coef    = np.asarray(linear["coef"]) / model.scaler.scale_
+        return {"kind": "linear", "source": source, "coef": coef.tolist(),
+                "intercept": linear["intercept"] - float(np.dot(coef, model.scaler.mean_))}
+
+    # Linear models
+    if hasattr(model, "coef_") and hasattr(model, "intercept_"):
+        return {"kind": "linear", "source": source, "coef": np.asarray(model.coef_, dtype=float).reshape(-1).tolist(),
+                "intercept": float(np.asarray(model.intercept_, dtype=float).reshape(-1)[0])}
+
+    # Single tree
+    if hasattr(model, "tree_"):
+        return {"kind": "trees", "source": source, "base": 0.0, "scale": 1.0, "trees": [_flatten_tree(model.tree_)]}
+
+    # Gradient boosting: init + learning_rate * sum of the trees
+    if hasattr(model, "estimators_") and hasattr(model, "learning_rate"):
+        init = getattr(model, "init_", None)
+        if not hasattr(init, "constant_"):
+            raise ValueError("Unsupported init of " + source + ": only an constant init can be compiled")
+        return {"kind": "trees", "source": source, "base": float(np.asarray(init.constant_).reshape(-1)[0]), "scale": float(model.learning_rate),
+                "trees": [_flatten_tree(estimator.tree_) for estimator in np.asarray(model.estimators_).reshape(-1)]}
+
+    # Random forest and extra trees: mean of the trees
+    if hasattr(model, "estimators_"):
+        return {"kind": "trees", "source": source, "base": 0.0, "scale": 1.0 / len(model.estimators_),
+                "trees": [_flatten_tree(estimator.tree_) for estimator in model.estimators_]}
+
+    raise ValueError("Unsupported model: " + source)
+
+def _boundary_vectors(artifact, X, amount=64):
+    """Check vectors that sit on the thresholds of the trees: rows of X with one feature set to the threshold of an inner node.
+    The nodes are spread over all trees. No vectors for an linear model."""
+    if artifact["kind"] != "trees" or len(X) <= 0:
+        return np.empty((0, X.shape[1]))
+
+    splits = [(feature, threshold) for tree in artifact["trees"]
+              for feature, threshold, left in zip(tree["feature"], tree["threshold"], tree["left"]) if left >= 0]
+    if len(splits) <= 0:
+        return np.empty((0, X.shape[1]))
+
+    chosen  = np.unique(np.linspace(0, len(splits) - 1, min(amount, len(splits))).astype(int))
+    vectors = X[np.arange(len(chosen)) % len(X)].copy()
+    for i, split in enumerate(chosen):
+        feature, threshold  = splits[split]
+        vectors[i, feature] = threshold
+
+    return vectors
+
+def check_vectors(amount=256, seed=0):
+    """Random feature vectors in the range of the machine values (working_time 0 - 100, wear, alignment and temperatur 0 - 20).
+
+    Parameters
+    ----------
+    amount : int
+        amount of vectors
+    seed : int
+        seed of the vectors
+
+    Returns
+    -------
+    numpy.ndarray :
+        feature vectors [working_time, wear, alignment, temperatur]
+    """
+    rng = np.random.default_rng(seed)
+    return np.column_stack([rng.integers(0, 100, amount), rng.uniform(0, 20, (amount, 3))]).astype(float)
+
+def export_model(model, X_check=None):
+    """Compiles an model into an artifact and checks it against the model. The check vectors and the outputs
+    of the original model are stored in the artifact. For tree models vectors on the thresholds are added to the check.
+
+    Parameters
+    ----------
+    model : any
+        fitted model (see the supported models)
+    X_check : array
+        feature vectors for the check (default: check_vectors())
+
+    Returns
+    -------
+    dict :
+        the artifact
+    """
+    X_check             = check_vectors() if X_check is None else np.asarray(X_check, dtype=float)
+    artifact            = _compile(model)
+    X_check             = np.vstack([X_check, _boundary_vectors(artifact, X_check)])
+    expected            = np.asarray(model.predict(X_check), dtype=float).reshape(-1)
+    predicted           = CompiledModel(artifact).predict(X_check)
+
+    if not np.allclose(predicted, expected, rtol=TOLERANCE, atol=TOLERANCE):
+        raise ValueError("Compiled model differs from " + artifact["source"] + " by up to " + str(float(np.max(np.abs(predicted - expected)))))
+
+    artifact.update(format=FORMAT, format_version=FORMAT_VERSION, check={"X": X_check.tolist(), "y": expected.tolist()})
+    return artifact
+
+def save_artifact(artifact, path):
+    """Writes an artifact as JSON (atomic by an rename).
+
+    Parameters
+    ----------
+    artifact : dict
+        artifact of export_model()
+    path : str
+        path of the JSON file
+
+    Returns
+    -------
+    none
+
+    """
+    with open(path + ".tmp", "w") as artifact_file:
+        json.dump(artifact, artifact_file)
+    os.replace(path + ".tmp", path)
+
+def load_artifact(path):
+    """Reads an artifact and checks that it predicts the outputs of the original model for its check vectors.
+
+    Parameters
+    ----------
+    path : str
+        path of the JSON file
+
+    Returns
+    -------
+    CompiledModel :
+        the model
+    """
+    with open(path) as artifact_file:
+        artifact = json.load(artifact_file)
+
+    if artifact.get("format") != FORMAT or artifact.get("format_version") != FORMAT_VERSION:
+        raise ValueError("Unsupported artifact format: " + str(artifact.get("format")) + " " + str(artifact.get("format_version")))
+
+    model       = CompiledModel(artifact)
+    predicted   = model.predict(artifact["check"]["X"])
+
+    if not np.allclose(predicted, artifact["check"]["y"], rtol=TOLERANCE, atol=TOLERANCE):
+        raise ValueError("Artifact " + path + " doesnt predict its check outputs")
+
+    return model
+
+# -------------------------------- Main -------------------------------- #
+
+if __name__ == "__main__":
+    import joblib
+
+    X_check = None
+    if "CHECK_DATA" in os.environ:
+        import csv
+
+        with open(os.environ["CHECK_DATA"], newline="") as check_file:
+            X_check = [[float(row[name]) for name in ("working_time", "wear", "alignment", "temperatur")] for row in csv.DictReader(check_file)][:1000]
+
+    artifact = export_model(joblib.load(os.environ["MODEL"]), X_check)
+    save_artifact(artifact, os.environ["ARTIFACT"])
+
+    print("Exported " + artifact["source"] + " (" + artifact["kind"] + ") to " + os.environ["ARTIFACT"])
@@ -0,0 +1,212 @@
+"""Online Training
+
+Incremental training of the remain_time model while the edge device runs.
+The labeled segments of the machines (see telemetry_labeler.py) are put into a queue. A background
+thread trains an incremental learner (StandardScaler + SGDRegressor with partial_fit) with them.
+Every segment goes as a whole either to the training or to the holdout, so the holdout contains
+only runs that the learner never saw. After every update the learner is compared with the model of the
+predictor on the holdout (mean absolute error of the remain_time). When it is better by at least
+min_improvement a copy of it is swapped into the predictor (see Predictor.swap()), so the dispatching
+never waits for the training.
+
+Required imports:
+    - numpy
+    - sklearn
+
+Classes:
+    * OnlineModel(scaler, regressor)                        - Scaled incremental regression model with a predict(X) method.
+
+    * OnlineTrainer(predictor, holdout_fraction, holdout_size, min_holdout, min_improvement, seed)
+                                                            - Trains the OnlineModel in the background and swaps it into the predictor.
+
+        * add_segment(rows): none                           - Queues an labeled segment for the training.
+
+        * stats(): dict                                     - Amount of trained rows and segments, errors of the holdout and amount of swaps.
+
+Functions:
+    * mean_absolute_error(model, X, y): float               - Mean absolute error of the remain_time (negative predictions count as 0).
+"""
+
+# -------------------------------- Imports -------------------------------- #
+
+import copy
+import queue
+import random
+import threading
+from collections import deque
+import numpy as np
+from sklearn.linear_model import SGDRegressor
+from sklearn.preprocessing import StandardScaler
+
+# -------------------------------- Variables -------------------------------- #
+
+FEATURES = ["working_time", "wear", "alignment", "temperatur"]     # Columns of an feature vector, same order as in predict_remain_times()
+
+# -------------------------------- Functions -------------------------------- #
+
+def mean_absolute_error(model, X, y):
+    """Mean absolute error of the remain_time. Negative predictions count as 0, like in the Predictor.
+
+    Parameters
+    ----------
+    model : any
+        model with a predict(X) method
+    X : numpy.ndarray
+        feature vectors
+    y : numpy.ndarray
+        remain_time
+
+    Returns
+    -------
+    float :
+        mean absolute error
+    """
+    return float(np.mean(np.abs(np.maximum(np.asarray(model.predict(X)).reshape(len(y)), 0) - y)))
+
+# -------------------------------- Classes -------------------------------- #
+
+class OnlineModel:
+    """Scaled incremental regression model with a predict(X) method.
+
+    Parameters
+    ----------
+    scaler : sklearn.preprocessing.StandardScaler
+        scaler of the feature vectors
+    regressor : sklearn.linear_model.SGDRegressor
+        regression of the remain_time
+    """
+
+    def __init__(self, scaler, regressor):
+        self.scaler     = scaler
+        self.regressor  = regressor
+
+    def partial_fit(self, X, y):
+        """Updates the scaler and the regression with an batch of rows."""
+        self.scaler.partial_fit(X)
+        self.regressor.partial_fit(self.scaler.transform(X), y)
+
+    def predict(self, X):
+        """Predicts the remain_time for every feature vector."""
+        return self.regressor.predict(self.scaler.transform(X))
+
+class OnlineTrainer:
+    """Trains the OnlineModel in the background and swaps it into the predictor when it beats the actual model.
+
+    Parameters
+    ----------
+    predictor : Predictor
+        prediction of the edge device
+    holdout_fraction : float
+        part of the segments that go to the holdout
+    holdout_size : int
+        maximal amount of rows in the holdout (the oldest rows are dropped)
+    min_holdout : int
+        amount of rows in the holdout before models are compared
+    min_improvement : float
+        part by that the error of the learner must be lower than the error of the actual model (0.05 -> 5 %)
+    seed : any
+        seed of the split into training and holdout
+    """
+
+    def __init__(self, predictor, holdout_fraction=0.2, holdout_size=20000, min_holdout=200, min_improvement=0.05, seed=None):
+        self._predictor         = predictor
+        self._holdout_fraction  = holdout_fraction
+        self._min_holdout       = min_holdout
+        self._min_improvement   = min_improvement
+        self._random            = random.Random(seed)
+        self._queue             = queue.Queue()
+        self._learner           = OnlineModel(StandardScaler(), SGDRegressor(random_state=0))
+        self._holdout           = deque(maxlen=holdout_size)    # (feature vector, remain_time) of the holdout segments
+        self._lock              = threading.Lock()
+        self._stats             = {"trained_rows": 0, "trained_segments": 0, "holdout_rows": 0, "model_error": None, "learner_error": None, "swaps": 0}
+
+        threading.Thread(target=self._run, name="online-training", daemon=True).start()
+
+    def add_segment(self, rows):
+        """Queues an labeled segment for the training. Returns immediately.
+
+        Parameters
+        ----------
+        rows : list
+            rows (dict) of the segment with the FEATURES and the remain_time
+
+        Returns
+        -------
+        none
+
+        """
+        self._queue.put(rows)
+
+    def stats(self):
+        """Amount of trained rows and segments, errors of the holdout and amount of swaps.
+
+        Returns
+        -------
+        dict :
+            statistics of the training
+        """
+        with self._lock:
+            return dict(self._stats)
+
+    def _train(self, rows):
+        """Puts an segment into the holdout or trains the learner with it. Returns True if the learner changed."""
+        X = np.array([[row[name] for name in FEATURES] for row in rows], dtype=float)
+        y = np.array([row["remain_time"] for row in rows], dtype=float)
+
+        if self._random.random() < self._holdout_fraction:
+            self._holdout.extend(zip(map(tuple, X), y))
+            return False
+
+        self._learner.partial_fit(X, y)
+
+        with self._lock:
+            self._stats["trained_rows"]     += len(rows)
+            self._stats["trained_segments"] += 1
+        return True
+
+    def _evaluate(self):
+        """Compares the learner with the model of the predictor on the holdout and swaps a copy of the learner in when its better."""
+        if len(self._holdout) < self._min_holdout:
+            return
+
+        X               = np.array([vector for vector, remain_time in self._holdout])
+        y               = np.array([remain_time for vector, remain_time in self._holdout])
+        model_error     = mean_absolute_error(self._predictor.model, X, y)
+        learner_error   = mean_absolute_error(self._learner, X, y)
+
+        with self._lock:
+            self._stats.update(holdout_rows=len(y), model_error=model_error, learner_error=learner_error)
+
+        if learner_error < model_error * (1 - self._min_improvement):
+
+            with self._lock:
+                self._stats["swaps"] += 1
+                version = "online-" + str(self._stats["swaps"])
+
+            # The learner is trained further, the predictor gets an copy that doesnt change anymore
+            self._predictor.swap(copy.deepcopy(self._learner), version)
+
+            print("Online training: model version " + version + " swapped in. Holdout error " + str(round(learner_error, 2)) + " (before " + str(round(model_error, 2)) + ")")
+
+    def _run(self):
+        """Trains the learner with the queued segments. Runs in the background thread."""
+        while True:
+            segments = [self._queue.get()]
+
+            # Take all segments that arrived in the meantime and evaluate once
+            try:
+                while True:
+                    segments.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+
+            try:
+                changed = False
+                for rows in segments:
+                    changed = self._train(rows) or changed
+
+                if changed:
+                    self._evaluate()
+
+            except Exception as error:
+                print("Online training failed: " + str(error))
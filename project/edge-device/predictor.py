@@ -0,0 +1,138 @@
+"""Predictor
+
+Prediction stage for the remain_time of the machines. The feature vectors
+(working_time, wear, alignment, temperatur) of all machines that need a prediction in one
+cycle of the main loop are stacked into one NumPy array and predicted with one call of the model.
+Because idle machines and repeated states send the same values again and again, the results
+are memoized in a small LRU cache keyed on the feature tuple.
+The model can be swapped while the edge device runs (e.g. by the online training, see online_training.py).
+The swap is atomic: an prediction uses either the old or the new model and the cache of the old model is dropped.
+The version of the active model is kept in Predictor.version for the logs.
+
+Required imports:
+    - numpy
+
+Classes:
+    * Predictor(model, cache_size, version)                 - Batched and memoized remain_time prediction.
+
+        * predict(features): list                           - Predicts the remain_time for every feature vector.
+
+        * swap(model, version): none                        - Replaces the model and clears the cache.
+
+Functions:
+    * validate_model(model): none                           - Raises an ValueError when the model cant predict an remain_time.
+"""
+
+# -------------------------------- Imports -------------------------------- #
+
+import threading
+from collections import OrderedDict
+import numpy as np
+
+# -------------------------------- Functions -------------------------------- #
+
+def validate_model(model):
+    """Raises an ValueError when the model cant predict an remain_time, e.g. before an new model gets swapped in.
+    The model has to predict one finite value for one feature vector.
+
+    Parameters
+    ----------
+    model : any
+        model with a predict(X) method
+
+    Returns
+    -------
+    none
+
+    """
+    if not hasattr(model, "predict"):
+        raise ValueError("Model has no predict() method: " + type(model).__name__)
+
+    predicted = np.asarray(model.predict(np.array([[0, 0.0, 0.0, 0.0], [100, 0.5, 0.5, 50.0]], dtype=float)), dtype=float).reshape(-1)
+
+    if len(predicted) != 2 or not np.all(np.isfinite(predicted)):
+        raise ValueError("Model predicted no valid remain_time: " + str(predicted))
+
+# -------------------------------- Classes -------------------------------- #
+
+class Predictor:
+    """Batched and memoized remain_time prediction.
+
+    Parameters
+    ----------
+    model : any
+        model with a predict(X) method (e.g. sklearn LinearRegression)
+    cache_size : int
+        amount of feature vectors that are memoized
+    version : str
+        version of the model (e.g. the ETag of the file)
+    """
+
+    def __init__(self, model, cache_size=4096, version=None):
+        self.model          = model
+        self.version        = version
+        self._cache_size    = cache_size
+        self._cache         = OrderedDict()     # (working_time, wear, alignment, temperatur) -> remain_time
+        self._lock          = threading.Lock()  # Makes predict() and swap() atomic
+
+    def predict(self, features):
+        """Predicts the remain_time for every feature vector. Only the vectors that are not in the
+        cache are predicted, all of them with one call of the model.
+        In some cases the model returns an negative remain_time but for the programm logic its not allowed,
+        so negative values are returned as 0.
+
+        Parameters
+        ----------
+        features : list
+            feature vectors [working_time, wear, alignment, temperatur]
+
+        Returns
+        -------
+        list :
+            predicted remain_time (int) for every feature vector
+        """
+        with self._lock:
+            return self._predict(features)
+
+    def swap(self, model, version=None):
+        """Replaces the model. The cached results of the old model are dropped.
+        Waits until an running prediction is done, so every prediction uses only one model.
+
+        Parameters
+        ----------
+        model : any
+            model with a predict(X) method
+        version : str
+            version of the model
+
+        Returns
+        -------
+        none
+
+        """
+        with self._lock:
+            self.model      = model
+            self.version    = version
+            self._cache     = OrderedDict()
+
+    def _predict(self, features):
+        """Predicts the remain_time for every feature vector. The caller has to hold the lock."""
+        keys    = [tuple(vector) for vector in features]
+        missing = list(OrderedDict.fromkeys(key for key in keys if key not in self._cache))
+
+        if len(missing) > 0:
+            predicted = np.asarray(self.model.predict(np.array(missing, dtype=float))).reshape(len(missing))
+
+            for key, remain_time in zip(missing, predicted):
+                self._cache[key] = max(int(remain_time), 0)
+
+        remain_times = list()
+        for key in keys:
+            self._cache.move_to_end(key)
+            remain_times.append(self._cache[key])
+
+        # Remove the least recently used vectors
+        while len(self._cache) > self._cache_size:
+            self._cache.popitem(last=False)
+
+        return remain_times
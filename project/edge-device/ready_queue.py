@@ -0,0 +1,243 @@
+"""Ready Queue
+
+Index of the unfinished jobs that can be deployed to a machine. The jobs are kept sorted by
+their remaining_job_time, so the shortest job and the largest job that fits under a remain_time
+are found by a binary search instead of a scan or a sort of the whole job list.
+Jobs that are taken by a machine are kept in a hash set and removed from the sorted index
+until they get released again.
+
+Classes:
+    * ReadyQueue(is_ready)                                  - Sorted index of the unfinished jobs plus a set of taken JOB_IDs.
+
+        * put(fields): none                                 - Adds, updates or removes a job depending on its status and remaining_job_time.
+
+        * remove(JOB_ID): none                              - Removes a job from the index.
+
+        * clear(): none                                     - Removes all jobs from the index. Taken JOB_IDs are kept.
+
+        * take(JOB_ID): none                                - Marks a job as taken by a machine.
+
+        * is_taken(JOB_ID): bool                            - True if a job is taken by a machine.
+
+        * release(JOB_ID): none                             - Marks a job as not taken anymore.
+
+        * shortest(): any                                   - JOB_ID of the shortest job that is not taken.
+
+        * largest_under(limit): any                         - JOB_ID of the largest job with remaining_job_time < limit that is not taken.
+
+Functions:
+    * is_unfinished(fields): bool                           - Default readiness of a job: status != finished and remaining_job_time > 0.
+
+    * is_leased(fields, now): bool                          - True if a job is processing and its lease (lease_expires) is not expired.
+"""
+
+# -------------------------------- Imports -------------------------------- #
+
+import time
+from bisect import bisect_left, insort
+
+# -------------------------------- Variables -------------------------------- #
+
+LEASE_EXPIRES = "lease_expires"     # Field with the end of the lease of a processing job (unix time in seconds)
+
+# -------------------------------- Functions -------------------------------- #
+
+def is_unfinished(fields):
+    """Default readiness of a job: status != finished and remaining_job_time > 0.
+
+    Parameters
+    ----------
+    fields : dict
+        fields of the job
+
+    Returns
+    -------
+    bool :
+        True if the job can be deployed
+    """
+    return fields.get("status") != "finished" and fields.get("remaining_job_time", 0) > 0
+
+def is_leased(fields, now=None):
+    """True if a job is processing and its lease is not expired. Jobs without a lease are not leased.
+
+    Parameters
+    ----------
+    fields : dict
+        fields of the job
+    now : float
+        actual unix time (default: time.time())
+
+    Returns
+    -------
+    bool :
+        True if a machine is still working on the job
+    """
+    if now is None:
+        now = time.time()
+    return fields.get("status") == "processing" and (fields.get(LEASE_EXPIRES) or 0) > now
+
+# -------------------------------- Classes -------------------------------- #
+
+class ReadyQueue:
+    """Sorted index of the unfinished jobs plus a set of taken JOB_IDs.
+
+    By default only jobs with status != finished and remaining_job_time > 0 are ready.
+    The index is not thread safe, the owner has to lock it.
+
+    Parameters
+    ----------
+    is_ready : callable
+        gets the fields of a job and returns True if the job is ready (default: is_unfinished)
+    """
+
+    def __init__(self, is_ready=is_unfinished):
+        self._is_ready  = is_ready
+        self._keys      = list()    # Sorted (remaining_job_time, JOB_ID) of the ready jobs that are not taken
+        self._ready     = dict()    # JOB_ID -> (remaining_job_time, JOB_ID) of all ready jobs
+        self._taken     = set()     # JOB_IDs that are taken by a machine
+
+    def __len__(self):
+        """Amount of ready jobs that are not taken."""
+        return len(self._keys)
+
+    def put(self, fields):
+        """Adds, updates or removes a job depending on its status and remaining_job_time.
+
+        Parameters
+        ----------
+        fields : dict
+            fields of the job (JOB_ID, status, remaining_job_time)
+
+        Returns
+        -------
+        none
+
+        """
+        JOB_ID = fields["JOB_ID"]
+
+        self.remove(JOB_ID)
+
+        if self._is_ready(fields):
+            key                 = (fields["remaining_job_time"], JOB_ID)
+            self._ready[JOB_ID] = key
+
+            if JOB_ID not in self._taken:
+                insort(self._keys, key)
+
+    def remove(self, JOB_ID):
+        """Removes a job from the index.
+
+        Parameters
+        ----------
+        JOB_ID : any
+            ID of the job
+
+        Returns
+        -------
+        none
+
+        """
+        key = self._ready.pop(JOB_ID, None)
+
+        if key is not None and JOB_ID not in self._taken:
+            del self._keys[bisect_left(self._keys, key)]
+
+    def clear(self):
+        """Removes all jobs from the index. Taken JOB_IDs are kept.
+
+        Returns
+        -------
+        none
+
+        """
+        self._keys  = list()
+        self._ready = dict()
+
+    def take(self, JOB_ID):
+        """Marks a job as taken by a machine. A taken job will not be returned until it gets released.
+
+        Parameters
+        ----------
+        JOB_ID : any
+            ID of the job
+
+        Returns
+        -------
+        none
+
+        """
+        if JOB_ID in self._taken:
+            return
+
+        self._taken.add(JOB_ID)
+
+        key = self._ready.get(JOB_ID)
+        if key is not None:
+            del self._keys[bisect_left(self._keys, key)]
+
+    def is_taken(self, JOB_ID):
+        """True if a job is taken by a machine.
+
+        Parameters
+        ----------
+        JOB_ID : any
+            ID of the job
+
+        Returns
+        -------
+        bool :
+            True if the job is taken
+        """
+        return JOB_ID in self._taken
+
+    def release(self, JOB_ID):
+        """Marks a job as not taken anymore. If the job is still ready it can be deployed again.
+
+        Parameters
+        ----------
+        JOB_ID : any
+            ID of the job
+
+        Returns
+        -------
+        none
+
+        """
+        if JOB_ID not in self._taken:
+            return
+
+        self._taken.discard(JOB_ID)
+
+        key = self._ready.get(JOB_ID)
+        if key is not None:
+            insort(self._keys, key)
+
+    def shortest(self):
+        """Returns the shortest job that is not taken.
+
+        Returns
+        -------
+        any :
+            JOB_ID of the job or None if there is no job
+        """
+        if len(self._keys) > 0:
+            return self._keys[0][1]
+        return None
+
+    def largest_under(self, limit):
+        """Returns the largest job with remaining_job_time < limit that is not taken.
+
+        Parameters
+        ----------
+        limit : any
+            exclusive upper limit of the remaining_job_time
+
+        Returns
+        -------
+        any :
+            JOB_ID of the job or None if no job fits
+        """
+        i = bisect_left(self._keys, (limit,))
+        if i > 0:
+            return self._keys[i - 1][1]
+        return None
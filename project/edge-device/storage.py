@@ -0,0 +1,470 @@
+"""Storage
+
+Storage abstraction for the files that the edge device exchanges with the cloud (the KI-model and the
+recorded machine data). Two backends are supported:
+    * BlobStorage                                           - Azure Blob Storage container (CONNECTION_STRING_TO_AZURE_STORAGE, CONTAINER_NAME).
+    * LocalStorage                                          - Directory on the local filesystem, for offline usage and testing.
+
+Uploads are done by an StorageUploader in an background thread with retries, so the main loop
+of the edge device never waits for the storage.
+Downloads (the KI-model) go through an ModelCache on the local disk. It keeps the files content
+addressed (by their sha256) and remembers the version (ETag) of every file, so an unchanged file is not
+transferred again after an restart. Downloads are streamed to the disk in chunks.
+An ModelWatcher checks the version of the KI-model in the background, so an new model can be used without
+an restart of the edge device.
+
+Required imports:
+    - azure-storage-blob (only for BlobStorage)
+
+Classes:
+    * LocalStorage(directory)                               - Storage in an local directory.
+
+    * BlobStorage(connection_string, container_name)        - Storage in an Azure Blob Storage container.
+
+        * download(name, path): none                        - Downloads the file with the name to the path (streamed in chunks).
+
+        * version(name): str                                - Version of the file (ETag) without downloading it.
+
+        * upload(path, name): none                          - Uploads the file at the path with the name.
+
+    * StorageUploader(storage, retries, retry_delay)        - Uploads files in an background thread with retries.
+
+        * upload(path, name, on_done): none                 - Queues an file for the upload.
+
+    * ModelCache(storage, directory)                        - Content addressed cache of downloaded files on the local disk.
+
+        * fetch(name): str                                  - Path to the actual version of the file. Downloads it only when it changed.
+
+        * cached_version(name): str                         - Version of the cached file or None.
+
+    * ModelWatcher(storage, cache, name, on_change, interval, max_failures)
+                                                            - Fetches an file again in an background thread when its version changed.
+
+Functions:
+    * file_hash(path): str                                  - sha256 of an file, read in chunks.
+
+    * open_storage(backend): any                            - Creates the storage backend from the Env variables.
+"""
+
+# -------------------------------- Imports -------------------------------- #
+
+import hashlib
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+
+# -------------------------------- Classes -------------------------------- #
+
+class LocalStorage:
+    """Storage in an local directory.
+
+    Parameters
+    ----------
+    directory : str
+        directory that contains the files
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def download(self, name, path):
+        """Copies the file with the name from the directory to the path.
+
+        Parameters
+        ----------
+        name : str
+            name of the file in the storage
+        path : str
+            local path of the file
+
+        Returns
+        -------
+        none
+
+        """
+        shutil.copyfile(os.path.join(self.directory, name), path)
+
+    def version(self, name):
+        """Version of the file, built from its modification time and size (like an ETag).
+
+        Parameters
+        ----------
+        name : str
+            name of the file in the storage
+
+        Returns
+        -------
+        str :
+            version of the file
+        """
+        stat = os.stat(os.path.join(self.directory, name))
+        return str(stat.st_mtime_ns) + "-" + str(stat.st_size)
+
+    def upload(self, path, name):
+        """Copies the file at the path into the directory.
+
+        Parameters
+        ----------
+        path : str
+            local path of the file
+        name : str
+            name of the file in the storage
+
+        Returns
+        -------
+        none
+
+        """
+        shutil.copyfile(path, os.path.join(self.directory, name))
+
+class BlobStorage:
+    """Storage in an Azure Blob Storage container.
+
+    Parameters
+    ----------
+    connection_string : str
+        connection string of the Azure Storage
+    container_name : str
+        name of the container
+    """
+
+    def __init__(self, connection_string, container_name):
+        from azure.storage.blob import BlobServiceClient
+
+        self.container_name         = container_name
+        self._blob_service_client   = BlobServiceClient.from_connection_string(connection_string)
+
+    def download(self, name, path):
+        """Downloads the blob with the name to the path. The blob is streamed to the file in chunks
+        and is never loaded into the memory as a whole.
+
+        Parameters
+        ----------
+        name : str
+            name of the blob
+        path : str
+            local path of the file
+
+        Returns
+        -------
+        none
+
+        """
+        blob_client = self._blob_service_client.get_blob_client(container=self.container_name, blob=name)
+
+        with open(path, "wb") as download_file:
+            blob_client.download_blob().readinto(download_file)
+
+    def version(self, name):
+        """ETag of the blob. Only the properties of the blob are requested.
+
+        Parameters
+        ----------
+        name : str
+            name of the blob
+
+        Returns
+        -------
+        str :
+            ETag of the blob
+        """
+        blob_client = self._blob_service_client.get_blob_client(container=self.container_name, blob=name)
+
+        return blob_client.get_blob_properties().etag
+
+    def upload(self, path, name):
+        """Uploads the file at the path as blob with the name. An existing blob gets overwritten.
+
+        Parameters
+        ----------
+        path : str
+            local path of the file
+        name : str
+            name of the blob
+
+        Returns
+        -------
+        none
+
+        """
+        blob_client = self._blob_service_client.get_blob_client(container=self.container_name, blob=name)
+
+        with open(path, "rb") as data:
+            blob_client.upload_blob(data, overwrite=True)
+
+class StorageUploader:
+    """Uploads files in an background thread. An failed upload is tried again after
+    retry_delay seconds, the delay doubles with every try.
+
+    Parameters
+    ----------
+    storage : any
+        storage backend (LocalStorage or BlobStorage)
+    retries : int
+        amount of tries after the first failed upload
+    retry_delay : float
+        seconds before the first retry
+    """
+
+    def __init__(self, storage, retries=5, retry_delay=2):
+        self._storage       = storage
+        self._retries       = retries
+        self._retry_delay   = retry_delay
+        self._queue         = queue.Queue()
+
+        threading.Thread(target=self._run, name="storage-uploader", daemon=True).start()
+
+    def upload(self, path, name, on_done=None):
+        """Queues an file for the upload and returns immediately.
+
+        Parameters
+        ----------
+        path : str
+            local path of the file
+        name : str
+            name of the file in the storage
+        on_done : callable
+            gets called (from the upload thread) with the path after the file was uploaded
+
+        Returns
+        -------
+        none
+
+        """
+        self._queue.put((path, name, on_done))
+
+    def _run(self):
+        """Uploads the queued files. Runs in the background thread."""
+        while True:
+            path, name, on_done = self._queue.get()
+            tries               = 0
+
+            while True:
+                try:
+                    self._storage.upload(path, name)
+                    print("Uploaded " + path + " as " + name)
+
+                    if on_done is not None:
+                        on_done(path)
+                    break
+
+                except Exception as error:
+                    if tries >= self._retries:
+                        print("Upload of " + path + " failed: " + str(error))
+                        break
+
+                    time.sleep(self._retry_delay * 2 ** tries)
+                    tries += 1
+
+class ModelCache:
+    """Content addressed cache of downloaded files on the local disk.
+    The files are stored as directory/<sha256> and directory/index.json maps the name
+    of every file to its version (ETag) and its sha256.
+
+    Parameters
+    ----------
+    storage : any
+        storage backend (LocalStorage or BlobStorage)
+    directory : str
+        directory of the cache
+    """
+
+    def __init__(self, storage, directory):
+        self._storage   = storage
+        self._directory = directory
+        self._index     = os.path.join(directory, "index.json")
+
+        os.makedirs(directory, exist_ok=True)
+
+    def fetch(self, name):
+        """Returns the path to the actual version of the file. The version is checked first and the file
+        is only downloaded when it changed. When the storage cant be reached the cached file is used.
+
+        Parameters
+        ----------
+        name : str
+            name of the file in the storage
+
+        Returns
+        -------
+        str :
+            path to the cached file
+        """
+        index   = self._read_index()
+        cached  = index.get(name)
+
+        try:
+            version = self._storage.version(name)
+        except Exception as error:
+            if cached is not None and os.path.isfile(os.path.join(self._directory, cached["sha256"])):
+                print("Storage not reachable, use cached " + name + ": " + str(error))
+                return os.path.join(self._directory, cached["sha256"])
+            raise
+
+        # Unchanged -> no transfer
+        if cached is not None and cached["version"] == version and os.path.isfile(os.path.join(self._directory, cached["sha256"])):
+            print("Use cached " + name + " (version " + str(version) + ")")
+            return os.path.join(self._directory, cached["sha256"])
+
+        # Download to an temporary file and store it by its content hash
+        download = os.path.join(self._directory, "download.tmp")
+        self._storage.download(name, download)
+        sha256 = file_hash(download)
+        os.replace(download, os.path.join(self._directory, sha256))
+
+        index[name] = {"version": version, "sha256": sha256}
+        self._write_index(index)
+        self._remove_unused(index)
+
+        print("Downloaded " + name + " (version " + str(version) + ", sha256 " + sha256 + ")")
+        return os.path.join(self._directory, sha256)
+
+    def cached_version(self, name):
+        """Version of the cached file.
+
+        Parameters
+        ----------
+        name : str
+            name of the file in the storage
+
+        Returns
+        -------
+        str :
+            version of the cached file or None if the file isnt cached
+        """
+        cached = self._read_index().get(name)
+        return cached["version"] if cached is not None else None
+
+    def _read_index(self):
+        """Reads the index of the cache."""
+        try:
+            with open(self._index) as index_file:
+                return json.load(index_file)
+        except (OSError, ValueError):
+            return dict()
+
+    def _write_index(self, index):
+        """Writes the index of the cache (atomic by an rename)."""
+        with open(self._index + ".tmp", "w") as index_file:
+            json.dump(index, index_file)
+        os.replace(self._index + ".tmp", self._index)
+
+    def _remove_unused(self, index):
+        """Removes the cached files that arent in the index anymore."""
+        used = {entry["sha256"] for entry in index.values()}
+
+        for file in os.listdir(self._directory):
+            if len(file) == 64 and file not in used:
+                os.remove(os.path.join(self._directory, file))
+
+class ModelWatcher:
+    """Checks the version of an file in the storage every interval seconds in an background thread.
+    When the version changed the file is fetched through the ModelCache and on_change(path, version) is called
+    (from the watcher thread). The version is only taken when the fetch and on_change succeeded, so an failed reload
+    (e.g. an network error or an half uploaded file) is tried again at the next check. After max_failures failed
+    reloads of the same version it is skipped until the version changes again.
+
+    Parameters
+    ----------
+    storage : any
+        storage backend (LocalStorage or BlobStorage)
+    cache : ModelCache
+        cache of the downloaded files
+    name : str
+        name of the file in the storage
+    on_change : callable
+        gets called with the path to the cached file and its version
+    interval : float
+        seconds between two checks of the version
+    max_failures : int
+        failed reloads of an version before it is skipped
+    """
+
+    def __init__(self, storage, cache, name, on_change, interval=60, max_failures=3):
+        self.version        = cache.cached_version(name)   # Version that was reloaded last
+        self.failures       = dict()                        # version -> failed reloads of an version that is not reloaded yet
+        self._storage       = storage
+        self._cache         = cache
+        self._name          = name
+        self._on_change     = on_change
+        self._interval      = interval
+        self._max_failures  = max_failures
+
+        threading.Thread(target=self._run, name="model-watcher", daemon=True).start()
+
+    def _run(self):
+        """Checks the version of the file. Runs in the background thread."""
+        while True:
+            time.sleep(self._interval)
+
+            version = None
+
+            try:
+                version = self._storage.version(self._name)
+                if version == self.version or self.failures.get(version, 0) >= self._max_failures:
+                    continue
+
+                path = self._cache.fetch(self._name)
+                self._on_change(path, version)
+
+                self.version    = version
+                self.failures   = dict()
+
+            except Exception as error:
+                if version is None:
+                    print("Version check of " + self._name + " failed: " + str(error))
+                    continue
+
+                self.failures = {version: self.failures.get(version, 0) + 1}
+
+                if self.failures[version] >= self._max_failures:
+                    print("Reload of " + self._name + " version " + str(version) + " failed " + str(self.failures[version]) + " times, skipped until the version changes: " + str(error))
+                else:
+                    print("Reload of " + self._name + " version " + str(version) + " failed, tried again in " + str(self._interval) + " s: " + str(error))
+
+# -------------------------------- Functions -------------------------------- #
+
+def file_hash(path):
+    """sha256 of an file, read in chunks.
+
+    Parameters
+    ----------
+    path : str
+        path to the file
+
+    Returns
+    -------
+    str :
+        hex digest of the sha256
+    """
+    sha256 = hashlib.sha256()
+
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(1 << 20), b""):
+            sha256.update(chunk)
+
+    return sha256.hexdigest()
+
+def open_storage(backend):
+    """Creates the storage backend from the Env variables.
+        azure -> BlobStorage with CONNECTION_STRING_TO_AZURE_STORAGE and CONTAINER_NAME
+        local -> LocalStorage with LOCAL_STORAGE_PATH (default: ./storage)
+
+    Parameters
+    ----------
+    backend : str
+        azure or local
+
+    Returns
+    -------
+    any :
+        the storage backend
+    """
+    if backend == "local":
+        return LocalStorage(os.environ.get("LOCAL_STORAGE_PATH", "storage"))
+
+    return BlobStorage(os.environ["CONNECTION_STRING_TO_AZURE_STORAGE"], os.environ["CONTAINER_NAME"])
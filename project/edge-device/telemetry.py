@@ -0,0 +1,89 @@
+"""Telemetry
+
+Decoding of the machine messages on the topic machines/. A machine sends JSON until the edge device
+answers on telemetry_format/MACHINE_ID with an supported binary format. Machines that dont support an
+binary format or dont get an answer keep sending JSON, so both formats are accepted at any time.
+The format of an message is recognized by its first byte, so every message is decoded exactly once.
+
+Binary format version 1 (little endian, fixed layout, the same layout is encoded in machine_model.py of the machines):
+    magic (B) = 0xED, version (B) = 1,
+    status (B), working_time (i), remain_time (i), remaining_repair_time (i), wear (d), alignment (d), temperatur (d),
+    JOB_ID (q, -1 = "none"), job_time (i), remaining_job_time (i), quantity (i), type (B), job status (B),
+    length of MACHINE_ID (B), MACHINE_ID (utf-8)
+
+Functions:
+    * decode(payload): dict                                 - Decodes an JSON or binary message to the machine dict.
+
+    * supported_format(machine): int                        - Returns the binary format that the edge device wants from the machine or None.
+"""
+
+# -------------------------------- Imports -------------------------------- #
+
+import json
+import struct
+
+# -------------------------------- Variables -------------------------------- #
+
+MAGIC               = 0xED
+FORMATS             = (1,)                                                      # Supported binary formats, newest last
+LAYOUT_V1           = struct.Struct("<BBBiiidddqiiiBBB")                        # Fixed part of version 1
+STATUS              = ("RUNNABLE", "WORKING", "BROKEN", "MAINTANCE")
+JOB_TYPE            = ("none", "hard", "normal", "soft")
+JOB_STATUS          = ("none", "unfinished", "processing", "finished")
+
+# -------------------------------- Functions -------------------------------- #
+
+def decode(payload):
+    """Decodes an JSON or binary message to the machine dict.
+
+    Parameters
+    ----------
+    payload : bytes
+        payload of the message on machines/
+
+    Returns
+    -------
+    dict :
+        machine with the same keys as the JSON message
+    """
+    if len(payload) <= 0 or payload[0] != MAGIC:
+        return json.loads(payload)
+
+    if payload[1] != 1:
+        raise ValueError("Unsupported telemetry format: " + str(payload[1]))
+
+    (_, _, status, working_time, remain_time, remaining_repair_time, wear, alignment, temperatur,
+     JOB_ID, job_time, remaining_job_time, quantity, job_type, job_status, id_length) = LAYOUT_V1.unpack_from(payload)
+
+    return {
+        "MACHINE_ID"                : payload[LAYOUT_V1.size:LAYOUT_V1.size + id_length].decode("utf-8"),
+        "Job"                       : { "JOB_ID": JOB_ID if JOB_ID >= 0 else "none", "job_time": job_time, "remaining_job_time": remaining_job_time,
+                                        "quantity": quantity, "type": JOB_TYPE[job_type], "status": JOB_STATUS[job_status] },
+        "status"                    : STATUS[status],
+        "remain_time"               : remain_time,
+        "working_time"              : working_time,
+        "remaining_repair_time"     : remaining_repair_time,
+        "wear"                      : wear,
+        "alignment"                 : alignment,
+        "temperatur"                : temperatur,
+    }
+
+def supported_format(machine):
+    """Returns the newest binary format that the machine and the edge device support.
+    A machine that sends JSON tells its formats with the key telemetry_formats.
+
+    Parameters
+    ----------
+    machine : dict
+        decoded message of the machine
+
+    Returns
+    -------
+    int :
+        version of the format or None if the machine has to keep sending JSON
+    """
+    formats = [version for version in FORMATS if version in machine.get("telemetry_formats", ())]
+
+    if len(formats) > 0:
+        return formats[-1]
+    return None
@@ -0,0 +1,167 @@
+"""Telemetry Archive
+
+Columnar, compressed archive format for the recorded machine data (alternative to the csv file).
+The rows are collected in typed columns and written in chunks as Arrow record batches into an
+Arrow IPC stream file (.arrows). The status is dictionary encoded and the batches are compressed
+(zstd by default). Every flush appends the collected rows as an new batch, so the file can be
+read at any time. A file of an earlier run is rotated to the next part when the edge device starts,
+so an archive is the list of its parts plus the actual file (see TelemetrySink).
+
+The files are read with memory mapping. Without compression (compression="none") the columns
+are used zero-copy from the mapped file, with compression only the decompression allocates memory.
+
+Required imports:
+    - pyarrow
+
+Classes:
+    * ArchiveSink(path, buffer_size, flush_interval, max_bytes, on_rotate, compression, chunk_rows)
+                                                            - TelemetrySink that writes the Arrow archive format.
+
+Functions:
+    * iter_archive(path): generator                         - Yields the record batches of all parts of an archive, oldest first.
+
+    * read_archive(path): pyarrow.Table                     - Reads all parts of an archive into one table.
+"""
+
+# -------------------------------- Imports -------------------------------- #
+
+import os
+import pyarrow as pa
+from telemetry_sink import TelemetrySink, part_files
+
+# -------------------------------- Variables -------------------------------- #
+
+STATUS  = ["RUNNABLE", "WORKING", "BROKEN", "MAINTANCE"]
+
+SCHEMA  = pa.schema([
+    ("MACHINE_ID",      pa.string()),
+    ("working_time",    pa.int32()),
+    ("remain_time",     pa.int32()),
+    ("wear",            pa.float64()),
+    ("alignment",       pa.float64()),
+    ("temperatur",      pa.float64()),
+    ("status",          pa.dictionary(pa.int8(), pa.string())),
+])
+
+# -------------------------------- Classes -------------------------------- #
+
+class ArchiveSink(TelemetrySink):
+    """TelemetrySink that writes the Arrow archive format.
+
+    Parameters
+    ----------
+    path : str
+        path to the archive file (.arrows)
+    buffer_size : int
+        not used, the rows are buffered in columns of chunk_rows rows
+    flush_interval : float
+        seconds after that the collected rows are written as an batch
+    max_bytes : int
+        size of the file after that it gets rotated (0 -> no rotation)
+    on_rotate : callable
+        gets called (from the writer thread) with the path of every completed part
+    compression : str
+        compression of the batches: "zstd", "lz4" or "none"
+    chunk_rows : int
+        amount of rows after that an batch is written
+    """
+
+    def __init__(self, path, buffer_size=0, flush_interval=5, max_bytes=64 << 20, on_rotate=None, compression="zstd", chunk_rows=65536):
+        self._compression   = None if compression == "none" else compression
+        self._chunk_rows    = chunk_rows
+        self._columns       = {name: list() for name in SCHEMA.names}
+        self._status        = pa.array(STATUS, type=pa.string())
+
+        super().__init__(path, SCHEMA.names, buffer_size, flush_interval, max_bytes, on_rotate)
+
+    def _open(self):
+        """Opens an new stream file. The file of an earlier run is rotated first, because an closed stream cant be continued."""
+        if os.path.isfile(self.path) and os.path.getsize(self.path) > 0:
+            self._rotate()
+
+        self._file      = pa.OSFile(self.path, "wb")
+        self._writer    = pa.ipc.new_stream(self._file, SCHEMA, options=pa.ipc.IpcWriteOptions(compression=self._compression))
+        self._size      = self._file.tell()
+
+    def _write_row(self, row):
+        """Appends an row to the columns. Writes an batch when chunk_rows rows are collected."""
+        for name in SCHEMA.names:
+            value = row.get(name, "")
+            self._columns[name].append(None if value == "" else value)
+
+        if len(self._columns["status"]) >= self._chunk_rows:
+            return self._write_batch()
+        return 0
+
+    def _write_batch(self):
+        """Writes the collected rows as one compressed batch and returns the amount of written bytes."""
+        if len(self._columns["status"]) <= 0:
+            return 0
+
+        arrays = list()
+        for field in SCHEMA:
+            if field.name == "status":
+                indices = pa.array([STATUS.index(status) for status in self._columns["status"]], type=pa.int8())
+                arrays.append(pa.DictionaryArray.from_arrays(indices, self._status))
+            else:
+                arrays.append(pa.array(self._columns[field.name], type=field.type))
+
+        before = self._file.tell()
+        self._writer.write_batch(pa.record_batch(arrays, schema=SCHEMA))
+        self._columns = {name: list() for name in SCHEMA.names}
+
+        return self._file.tell() - before
+
+    def _flush_file(self):
+        """Writes the collected rows as an batch, so they can be read from the file."""
+        if self._file is not None:
+            self._size += self._write_batch()
+            self._file.flush()
+
+    def _close_file(self):
+        """Writes the collected rows and the end of the stream and closes the file."""
+        if self._file is not None:
+            self._write_batch()
+            self._writer.close()
+            self._file.close()
+            self._file      = None
+            self._writer    = None
+
+# -------------------------------- Functions -------------------------------- #
+
+def iter_archive(path):
+    """Yields the record batches of all parts of an archive, oldest first.
+    The files are memory mapped, so only the batch that is used gets loaded.
+
+    Parameters
+    ----------
+    path : str
+        path to the actual archive file (.arrows)
+
+    Returns
+    -------
+    generator :
+        pyarrow.RecordBatch of the archive
+    """
+    files = part_files(path)
+    if os.path.isfile(path):
+        files.append(path)
+
+    for file in files:
+        for batch in pa.ipc.open_stream(pa.memory_map(file)):
+            yield batch
+
+def read_archive(path):
+    """Reads all parts of an archive into one table (e.g. for read_archive(path).to_pandas()).
+
+    Parameters
+    ----------
+    path : str
+        path to the actual archive file (.arrows)
+
+    Returns
+    -------
+    pyarrow.Table :
+        all rows of the archive
+    """
+    return pa.Table.from_batches(list(iter_archive(path)), schema=SCHEMA)
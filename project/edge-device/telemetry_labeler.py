@@ -0,0 +1,108 @@
+"""Telemetry Labeler
+
+Labels the recorded machine data online, so the uploaded files can be used for the training without
+an offline pass (see helper_scripts/create_training_file.py).
+The rows of every machine since its last repair (an segment) are kept in memory. When the machine
+gets BROKEN the whole segment is written to the sink with remain_time = working_time at the break - working_time.
+When the segment ends without an break (an planned MAINTANCE or the working_time went back, e.g. after
+an restart of the machine) the rows have no remain_time. They are dropped or, with keep_unlabeled,
+written with an empty remain_time.
+Every labeled segment can also be given to an callback, e.g. for the online training (see online_training.py).
+
+Classes:
+    * TelemetryLabeler(sink, keep_unlabeled, on_segment)    - Buffers the segment of every machine and writes it labeled to the sink.
+
+        * write(row): none                                  - Adds an row (dict) to the segment of its machine.
+
+        * buffered(): int                                   - Amount of rows that wait for the end of their segment.
+"""
+
+# -------------------------------- Classes -------------------------------- #
+
+class TelemetryLabeler:
+    """Buffers the segment of every machine and writes it labeled to the sink.
+    The labeler is not thread safe, the rows have to be written from one thread (the Mqtt callback).
+
+    Parameters
+    ----------
+    sink : TelemetrySink
+        writer of the labeled rows (None -> the rows are not written)
+    keep_unlabeled : bool
+        True -> the rows of an segment without an break are written with an empty remain_time, False -> they are dropped
+    on_segment : callable
+        gets called with the rows of every labeled segment
+    """
+
+    def __init__(self, sink, keep_unlabeled=False, on_segment=None):
+        self._sink              = sink
+        self._keep_unlabeled    = keep_unlabeled
+        self._on_segment        = on_segment
+        self._segments          = dict()    # MACHINE_ID -> rows since the last repair
+        self._broken            = set()     # MACHINE_IDs whose segment ended with an break, until they work again
+
+    def write(self, row):
+        """Adds an row to the segment of its machine. An BROKEN row completes the segment, an MAINTANCE row
+        or an smaller working_time ends it without an label.
+
+        Parameters
+        ----------
+        row : dict
+            values of the machine (MACHINE_ID, working_time, status, ...)
+
+        Returns
+        -------
+        none
+
+        """
+        MACHINE_ID  = row["MACHINE_ID"]
+        segment     = self._segments.get(MACHINE_ID)
+
+        # The machine is repaired (or broken again while it waits for the repair)
+        if row["status"] == "MAINTANCE" or (row["status"] == "BROKEN" and MACHINE_ID in self._broken):
+            self._end(MACHINE_ID)
+            return
+
+        self._broken.discard(MACHINE_ID)
+
+        # The working_time went back without an MAINTANCE message -> the machine started again
+        if segment is not None and row["working_time"] < segment[-1]["working_time"]:
+            self._end(MACHINE_ID)
+            segment = None
+
+        if segment is None:
+            segment = self._segments[MACHINE_ID] = list()
+
+        segment.append(dict(row))
+
+        # Break -> label the whole segment
+        if row["status"] == "BROKEN":
+            working_time    = row["working_time"]
+            segment         = self._segments.pop(MACHINE_ID)
+
+            for labeled in segment:
+                labeled["remain_time"] = working_time - labeled["working_time"]
+                if self._sink is not None:
+                    self._sink.write(labeled)
+
+            if self._on_segment is not None:
+                self._on_segment(segment)
+
+            self._broken.add(MACHINE_ID)
+
+    def buffered(self):
+        """Amount of rows that wait for the end of their segment.
+
+        Returns
+        -------
+        int :
+            amount of rows
+        """
+        return sum(len(segment) for segment in self._segments.values())
+
+    def _end(self, MACHINE_ID):
+        """Ends the segment of an machine without an break."""
+        segment = self._segments.pop(MACHINE_ID, None)
+
+        if segment is not None and self._keep_unlabeled and self._sink is not None:
+            for row in segment:
+                self._sink.write(row)
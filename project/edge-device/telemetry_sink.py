@@ -0,0 +1,281 @@
+"""Telemetry Sink
+
+Long-lived, buffered writer for the recorded machine data (csv file).
+The Mqtt callback only puts the rows into a queue. A background thread writes them into the
+file that is kept open with a large write buffer. The buffer is flushed when it is full or after
+every flush_interval seconds. When the file gets bigger than max_bytes it is closed, renamed to
+the next part (e.g. machine_reports.1.csv) and a new file is started, so long runs dont grow
+one unbounded file. The part numbers continue after the highest existing part, also after the parts
+that were renamed to *.uploaded, so an new part never gets the name of an older one.
+Other file formats (see telemetry_archive.py) derive from TelemetrySink and override
+_open(), _write_row(), _flush_file() and _close_file().
+
+Classes:
+    * TelemetrySink(path, fieldnames, buffer_size, flush_interval, max_bytes, on_rotate)
+                                                            - Buffered csv writer with an background thread and size based rotation.
+
+        * write(row): none                                  - Puts an row (dict) into the queue of the writer.
+
+        * flush(): none                                     - Waits until all rows in the queue are written and flushed to the file.
+
+        * close(): none                                     - Flushes and closes the file.
+
+        * rotate(): none                                    - Closes the actual file and renames it to the next part (in the background).
+
+        * files(): list                                     - Paths of the rotated parts and of the actual file, oldest first.
+
+Functions:
+    * part_files(path): list                                - Paths of the rotated parts of an file, oldest first.
+
+    * last_part_number(path): int                           - Highest number of the rotated and uploaded parts of an file.
+"""
+
+# -------------------------------- Imports -------------------------------- #
+
+import atexit
+import csv
+import glob
+import os
+import queue
+import threading
+import time
+
+# -------------------------------- Variables -------------------------------- #
+
+ROTATE      = object()          # Queue item that requests an rotation
+UPLOADED    = ".uploaded"       # Suffix of an part after its upload
+
+# -------------------------------- Functions -------------------------------- #
+
+def part_files(path):
+    """Paths of the rotated parts of an file (machine_reports.1.csv, machine_reports.2.csv, ...), oldest first.
+
+    Parameters
+    ----------
+    path : str
+        path to the actual file
+
+    Returns
+    -------
+    list :
+        paths of the rotated parts
+    """
+    root, ext   = os.path.splitext(path)
+    parts       = list()
+
+    for part in glob.glob(glob.escape(root) + ".*" + ext):
+        number = part[len(root) + 1:len(part) - len(ext)]
+        if number.isdigit():
+            parts.append((int(number), part))
+
+    return [part for number, part in sorted(parts)]
+
+def last_part_number(path):
+    """Highest number of the rotated parts of an file, the parts that were renamed to *.uploaded included.
+
+    Parameters
+    ----------
+    path : str
+        path to the actual file
+
+    Returns
+    -------
+    int :
+        number of the last part or 0 without parts
+    """
+    root, ext   = os.path.splitext(path)
+    last        = 0
+
+    for part in glob.glob(glob.escape(root) + ".*" + ext) + glob.glob(glob.escape(root) + ".*" + ext + UPLOADED):
+        if part.endswith(UPLOADED):
+            part = part[:-len(UPLOADED)]
+
+        number = part[len(root) + 1:len(part) - len(ext)]
+        if number.isdigit():
+            last = max(last, int(number))
+
+    return last
+
+# -------------------------------- Classes -------------------------------- #
+
+class TelemetrySink:
+    """Buffered csv writer with an background thread and size based rotation.
+
+    Parameters
+    ----------
+    path : str
+        path to the csv file
+    fieldnames : list
+        columns of the csv file
+    buffer_size : int
+        size of the write buffer in bytes
+    flush_interval : float
+        seconds after that the buffer gets flushed
+    max_bytes : int
+        size of the file after that it gets rotated (0 -> no rotation)
+    on_rotate : callable
+        gets called (from the writer thread) with the path of every completed part
+    """
+
+    def __init__(self, path, fieldnames, buffer_size=1 << 20, flush_interval=5, max_bytes=64 << 20, on_rotate=None):
+        self.path               = path
+        self._fieldnames        = fieldnames
+        self._buffer_size       = buffer_size
+        self._flush_interval    = flush_interval
+        self._max_bytes         = max_bytes
+        self._on_rotate         = on_rotate
+        self._queue             = queue.Queue()
+        self._file              = None
+        self._writer            = None
+        self._size              = 0                 # Size of the actual file (tell() would flush the buffer)
+        self._root, self._ext   = os.path.splitext(path)
+        self._parts             = part_files(path)
+        self._last_part         = last_part_number(path)  # Number of the last part, the uploaded parts included
+
+        threading.Thread(target=self._run, name="telemetry-sink", daemon=True).start()
+        atexit.register(self.close)
+
+    def write(self, row):
+        """Puts an row into the queue of the writer. Columns that are missing in the row are written empty.
+
+        Parameters
+        ----------
+        row : dict
+            values of the columns
+
+        Returns
+        -------
+        none
+
+        """
+        self._queue.put(row)
+
+    def flush(self):
+        """Waits until all rows in the queue are written and flushed to the file.
+
+        Returns
+        -------
+        none
+
+        """
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait()
+
+    def close(self):
+        """Flushes and closes the file. The next row opens the file again.
+
+        Returns
+        -------
+        none
+
+        """
+        self.flush()
+        self._queue.put(None)
+        self.flush()
+
+    def rotate(self):
+        """Requests to close the actual file and to rename it to the next part, e.g. to upload it.
+        Returns immediately, on_rotate gets called when the part is completed.
+
+        Returns
+        -------
+        none
+
+        """
+        self._queue.put(ROTATE)
+
+    def files(self):
+        """Paths of the rotated parts and of the actual file, oldest first.
+
+        Returns
+        -------
+        list :
+            paths of the files that contain the recorded rows
+        """
+        files = [part for part in self._parts if os.path.isfile(part)]
+        if os.path.isfile(self.path):
+            files.append(self.path)
+        return files
+
+    def _open(self):
+        """Opens the file with the write buffer. An new or empty file gets the header."""
+        self._file      = open(self.path, "a", newline="", buffering=self._buffer_size)
+        self._writer    = csv.DictWriter(self._file, fieldnames=self._fieldnames, restval="", extrasaction="ignore")
+        self._size      = os.path.getsize(self.path)
+
+        if self._size == 0:
+            self._size += self._writer.writeheader()
+
+    def _write_row(self, row):
+        """Writes an row into the file and returns the amount of written bytes."""
+        return self._writer.writerow(row)
+
+    def _flush_file(self):
+        """Flushes the write buffer to the file."""
+        if self._file is not None:
+            self._file.flush()
+
+    def _close_file(self):
+        """Flushes and closes the file."""
+        if self._file is not None:
+            self._file.close()
+            self._file      = None
+            self._writer    = None
+
+    def _rotate(self):
+        """Closes the actual file and renames it to the next part."""
+        self._close_file()
+
+        self._last_part += 1
+        part             = self._root + "." + str(self._last_part) + self._ext
+
+        os.rename(self.path, part)
+        self._parts.append(part)
+
+        if self._on_rotate is not None:
+            self._on_rotate(part)
+
+    def _run(self):
+        """Writes the rows of the queue into the file. Runs in the background thread."""
+        next_flush = time.monotonic() + self._flush_interval
+
+        while True:
+            try:
+                item = self._queue.get(timeout=max(0, next_flush - time.monotonic()))
+            except queue.Empty:
+                item = False
+
+            try:
+                # Flush request
+                if isinstance(item, threading.Event):
+                    try:
+                        self._flush_file()
+                    finally:
+                        item.set()
+
+                # Close request
+                elif item is None:
+                    self._close_file()
+
+                # Rotation request
+                elif item is ROTATE:
+                    if self._file is not None or os.path.isfile(self.path):
+                        self._rotate()
+
+                # Row
+                elif item is not False:
+                    if self._file is None:
+                        self._open()
+
+                    self._size += self._write_row(item)
+
+                    if self._max_bytes > 0 and self._size >= self._max_bytes:
+                        self._rotate()
+
+                if time.monotonic() >= next_flush:
+                    self._flush_file()
+                    next_flush = time.monotonic() + self._flush_interval
+
+            except Exception as error:
+                print("Telemetry write failed: " + str(error))
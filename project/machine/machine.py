@@ -8,7 +8,17 @@ This script can be started without any arguments.
 
 Required imports: paho-mqtt.
 
+The state machine itself is in machine_model.py (shared with the headless simulator).
+
 The main loop will execute the check_state_of_machine() and publish_machine() functions. 1 loop == 1 Cycle
+When an cycle starts depends on the clock (CLOCK_MODE):
+    * wall                                                  - Every TICK seconds (default 1, 0 -> as fast as possible).
+    * ack                                                   - As soon as the edge device acknowledged the last message on ack/MACHINE_ID,
+                                                              but at least every TICK seconds (when an ack gets lost or the edge device isnt running).
+    * lockstep                                              - When an message on SYNC_TOPIC (default clock/tick/) arrives. The message can contain
+                                                              {"ticks": n} to advance n cycles, else 1 cycle.
+With SEED all random values of the machine come from an random.Random seeded with SEED and the MACHINE_ID,
+so an scenario with the same SEED gets the same breakdowns.
 
 States:
     * RUNNABLE                                              - Machine will cool down until change on WORKING Status. 
@@ -29,12 +39,17 @@ States:
 Functions: 
     * on_connect(client, userdata, flags, rc): none         - Gets triggered when the client connect to the Mqtt broker.
 
-    * on_message(client, userdata, msg): none               - Gets messages that are sended to the topic remain_time/MACHINE_ID, remaining_repair_time/MACHINE_ID, jobs/MACHINE_ID
-                                                              and finished_job/MACHINE_ID. When an subscribed topic receive an message.
+    * on_message(client, userdata, msg): none               - Gets messages that are sended to the topic remain_time/MACHINE_ID, remaining_repair_time/MACHINE_ID, jobs/MACHINE_ID,
+                                                              finished_job/MACHINE_ID and telemetry_format/MACHINE_ID. When an subscribed topic receive an message.
                                                               It will become an message from the edge device that will change the values and state 
                                                               of the machine. 
 
     * publish_machine(): none                               - Publish __data to machines/ (edge device). This will be executed once in the Main loop.
+                                                              The machine sends JSON (with the supported binary formats in telemetry_formats) until
+                                                              the edge device answers on telemetry_format/MACHINE_ID. After this it sends the binary format.
+
+    * encode_machine(): bytes                               - Encodes __data in the binary telemetry format version 1. Returns None when a value
+                                                              doesnt fit in the format, then JSON is sent.
 
     * do_the_job(): none                                    - The logic for work off the Jobs and demolating the machine every loop when the machine has an Job.
                                                               A value between 0.5 - 0.1 will add to the variables temperatur and wear depend on the job attributes.
@@ -48,6 +63,8 @@ Functions:
                                                               Lower an upper are included limits.
 
     * check_state_of_machine(): none                        - Checks the Status of the Machine and apply the "state-machine-logic". It will executed every loop.
+
+    * wait_for_next_cycle(): none                           - Waits until the next cycle starts (depends on CLOCK_MODE).
 """
 
 
@@ -59,6 +76,9 @@ import os
 import json
 import paho.mqtt.client as mqtt
 import random
+import struct
+import threading
+import machine_model
 
 # -------------------------------- Variables -------------------------------- #
 
@@ -78,6 +98,24 @@ __data              = {
 "temperatur"                : 0.0,
 }
 
+# Clock of the simulation: wall, ack or lockstep
+__TICK              = float(os.environ.get("TICK", 1))
+__CLOCK_MODE        = os.environ.get("CLOCK_MODE", "wall")
+__SYNC_TOPIC        = os.environ.get("SYNC_TOPIC", "clock/tick/")
+__acked             = threading.Event()         # Set when the edge device acknowledged the last message (ack)
+__ticks             = threading.Semaphore(0)    # Released for every cycle of an sync message (lockstep)
+__next_cycle        = time.monotonic()          # Start of the next cycle (wall)
+
+# Random values of the machine. Seeded with SEED and the MACHINE_ID -> reproducible scenarios
+__SEED              = os.environ.get("SEED")
+__random            = random.Random(None if __SEED is None else __SEED + "/" + __data["MACHINE_ID"])
+
+# Telemetry format that the edge device wants. None -> JSON
+__telemetry_format  = None
+
+# Binary telemetry format version 1 (see machine_model.py, decoded by telemetry.py of the edge device)
+__TELEMETRY_FORMATS = list(machine_model.TELEMETRY_FORMATS)
+
 # -------------------------------- Functions -------------------------------- #
 
 def on_connect(client, user__data, flags, rc):
@@ -134,9 +172,22 @@ def on_message(client, user__data, msg):
                     This is a class with members topic, payload, qos, retain.
     """
 
+    # Advance the clock
+    if msg.topic == __SYNC_TOPIC:
+        ticks = json.loads(msg.payload).get("ticks", 1) if len(msg.payload) > 0 else 1
+        for i in range(ticks):
+            __ticks.release()
+        return
+
+    elif msg.topic == "ack/" + __data["MACHINE_ID"] + "/":
+        __acked.set()
+        return
+
     # Prints the topic and message
     print(msg.topic + " " + str(msg.payload))
     
+    global __telemetry_format
+
     # convert to json
     job = json.loads(msg.payload)
     
@@ -159,6 +210,11 @@ def on_message(client, user__data, msg):
     elif msg.topic == "finished_job/" + __data["MACHINE_ID"] + "/":
         __data["status"]    = "RUNNABLE"
         __data["Job"]       = __reseted_job
+
+    # Edge device wants the binary format
+    elif msg.topic == "telemetry_format/" + __data["MACHINE_ID"] + "/":
+        if job["format"] in __TELEMETRY_FORMATS:
+            __telemetry_format = job["format"]
           
 def publish_machine():
     """Publish __data to machines/ (edge device).
@@ -168,56 +224,59 @@ def publish_machine():
     none
     
     """
+    payload = None
+
+    # Binary format if the edge device wants it
+    if __telemetry_format == 1:
+        payload = encode_machine()
+
+    # Else JSON with the binary formats that the machine supports
+    if payload is None:
+        payload = json.dumps(dict(__data, telemetry_formats=__TELEMETRY_FORMATS, clock=__CLOCK_MODE))
+
     # Publish values of the machine to edge device
-    client.publish("machines/", json.dumps(__data))
+    client.publish("machines/", payload)
     
     # Prints published message 
     print("machines/" + str(__data))
 
+def encode_machine():
+    """Encodes __data in the binary telemetry format version 1.
+    Other keys of the job than JOB_ID, job_time, remaining_job_time, quantity, type and status are not sent.
+
+    Returns
+    -------
+    bytes
+        encoded machine or None when a value doesnt fit in the format (e.g. an JOB_ID that is no number)
+    
+    """
+    job = __data["Job"]
+
+    try:
+        JOB_ID      = -1 if job["JOB_ID"] == "none" else job["JOB_ID"]
+        MACHINE_ID  = __data["MACHINE_ID"].encode("utf-8")
+
+        return machine_model.LAYOUT_V1.pack(machine_model.TELEMETRY_MAGIC, 1,
+                                            machine_model.STATUS.index(__data["status"]), __data["working_time"], __data["remain_time"], __data["remaining_repair_time"],
+                                            __data["wear"], __data["alignment"], __data["temperatur"],
+                                            JOB_ID, job["job_time"], job["remaining_job_time"], int(job["quantity"]),
+                                            machine_model.JOB_TYPE.index(job["type"]), machine_model.JOB_STATUS.index(job["status"]), len(MACHINE_ID)) + MACHINE_ID
+    except (struct.error, ValueError, KeyError, TypeError):
+        return None
+
 def do_the_job():
-    """The logic for work off the Jobs and demolating the machine every loop when the machine has an Job. 
-    A value between 0.5 - 0.1 will add to the variables temperatur and wear depend on the job attributes. A value between 0.5 - 0.1 will add to alignment randomly. 
-    +1 will add to working_time. -1 will add to remaining_job_time. 
+    """The logic for work off the Jobs and demolating the machine every loop when the machine has an Job (see machine_model.do_the_job()).
 
     Returns
     -------
     none
     
     """
-    # If the machine has an Job. Dekrement the remaintime to finish the job.
-    if __data["Job"]["JOB_ID"] != "none" and __data["status"] == "WORKING":
-        
-        # Wear += 0.1 - 0.5
-        if __data["Job"]["type"] == "hard":
-            __data["wear"] += 0.5
-        elif __data["Job"]["type"] == "normal":
-            __data["wear"] += 0.2
-        elif __data["Job"]["type"] == "soft":
-            __data["wear"] += 0.1
-
-        # Temperatur += 0.1 - 0.5
-        if int(__data["Job"]["quantity"]) >= 10:
-            __data["temperatur"] += 0.5
-        elif int(__data["Job"]["quantity"]) < 10 and int(__data["Job"]["quantity"]) >= 5:
-            __data["temperatur"] += 0.2
-        elif int(__data["Job"]["quantity"]) < 5:
-            __data["temperatur"] += 0.1
-
-        # Alignment += 0.1 - 0.5 
-        __data["alignment"] += float(random.randrange(0,5) / 10)
-
-        # Dekrement remain job time
-        __data["Job"]["remaining_job_time"]    -= 1
-        
-        # Inkrement working_time
-        __data["working_time"] += 1
+    machine_model.do_the_job(__data, __random)
 
 def is_broken(lower, upper, probability):
     """Checks if any of the attributes of the Machine is between this limits (lower - upper) to 
-    decide if the machine is broken or not.
-    If between -> return if (randomly generatet value from 0 to 100 ) < (probability).
-    If not between -> return false
-    Lower an upper are included limits.
+    decide if the machine is broken or not (see machine_model.is_broken()).
 
     Parameters
     ----------
@@ -236,80 +295,64 @@ def is_broken(lower, upper, probability):
         False: Machine values are NOT between the limits OR the random number is OVER probability
     
     """
-    # Organische random funktion. Noise function.
-    # Decide if values are between limits and under the probability 
-    if  (lower <= __data["wear"] <= upper) or (lower <= __data["alignment"] <= upper) or (lower <= __data["temperatur"] <= upper):
-        return random.randrange(0,100) < probability
-    else:
-        return False
+    return machine_model.is_broken(__data, lower, upper, probability, __random)
 
 def check_state_of_machine():
-    """Checks the Status of the Machine and apply the "state-machine-logic".
+    """Checks the Status of the Machine and apply the "state-machine-logic" (see machine_model.step()).
     
     Returns
     -------
     none    
     """
 
-    global __data
-
     # Prints attributes of the machine
     print("Status: " + __data["status"] + ", Working Time: " + str(__data["working_time"])+ ", Alignment: " + str(__data["alignment"])+ ", Wear: " + str(__data["wear"])+ ", Temperatur: " + str(__data["temperatur"]))
 
     # Machine will cool down until change on WORKING Status
     if __data["status"] == "RUNNABLE":
-        
         print("Waiting for an Job")
 
-        # Cool down when no job have to do
-        if __data["temperatur"] > 0:
-            __data["temperatur"] -= 0.02
-        else:
-            __data["temperatur"] = 0
-
-    # Machine will do the job
+    # Machine will do the job or wait until the finished job gets taken by the edge-device
     elif __data["status"] == "WORKING":
-        
-        # Prints the remaining job time
         print("Remaining time to finish the Job:" + str(__data["Job"]["remaining_job_time"]))
 
-        # If r_j_t is > 0 do the job
-        if __data["Job"]["remaining_job_time"] > 0: 
-            
-            # Do the Job
-            do_the_job()
-        
-            # Check if the Machine is broken if true set status on broken
-            if is_broken(3, 5, 1) or is_broken(6, 8, 3) or is_broken(9, 11, 6) or is_broken(12, 14, 10) or is_broken(15, 9999999, 60):   
-                __data["status"]    = "BROKEN"
-        
-        # else job is finished wait until job gets taken by the edge-device
-        else:
+        if __data["Job"]["remaining_job_time"] <= 0:
             print("Job is finished")
-        
+
     # Machine will do nothing until change on MAINTANCE Status
     elif __data["status"] == "BROKEN":
         print("Need to be repaired")
 
     # Machine will get repaired then set the status on RUNNABLE   
     elif __data["status"] == "MAINTANCE":
-
-        # Prints r_r_t
         print("Remaining time to be rapaired:" + str(__data["remaining_repair_time"]))
 
-        # If remain_time > 0 -> dekrement
-        if __data["remaining_repair_time"] > 0:
-            __data["remaining_repair_time"] -= 1
-
-        # Else -> reset attributes and set status on RUNNABLE
-        else:
-            __data["status"]        = "RUNNABLE"
-            __data["wear"]          = 0
-            __data["alignment"]     = 0
-            __data["temperatur"]    = 0
-            __data["working_time"]  = 0
-            __data["remain_time"]   = -1
+    machine_model.step(__data, __random)
         
+def wait_for_next_cycle():
+    """Waits until the next cycle starts.
+        wall     -> TICK seconds after the start of the last cycle
+        ack      -> the edge device acknowledged the last message or TICK seconds are over
+        lockstep -> an sync message arrived
+
+    Returns
+    -------
+    none
+    """
+
+    global __next_cycle
+
+    if __CLOCK_MODE == "ack":
+        __acked.wait(__TICK)
+        __acked.clear()
+
+    elif __CLOCK_MODE == "lockstep":
+        __ticks.acquire()
+
+    else:
+        __next_cycle += __TICK
+        time.sleep(max(0, __next_cycle - time.monotonic()))
+
 # -------------------------------- Need to be Initialized -------------------------------- #
 
 # Create an client, connect to the Mqtt Broker and subscribe to the topics.
@@ -321,13 +364,16 @@ client.subscribe("jobs/" + __data["MACHINE_ID"] + "/#")
 client.subscribe("remain_time/" + __data["MACHINE_ID"] + "/#")
 client.subscribe("remaining_repair_time/" + __data["MACHINE_ID"] + "/#")
 client.subscribe("finished_job/" + __data["MACHINE_ID"] + "/#")
+client.subscribe("telemetry_format/" + __data["MACHINE_ID"] + "/#")
+client.subscribe("ack/" + __data["MACHINE_ID"] + "/#")
+client.subscribe(__SYNC_TOPIC)
 client.loop_start()
 
 # -------------------------------- Main Loop -------------------------------- #
 
 while True:
 
-    time.sleep(1)
+    wait_for_next_cycle()
     publish_machine() 
     check_state_of_machine()
 
@@ -0,0 +1,460 @@
+"""Machine Host
+
+The script simulates MACHINE_COUNT machines in one process (instead of one machine per process and container like machine.py).
+The machines have the same state machine and the same topic contract as machine.py: every machine publishes its values to machines/
+and gets the messages of the edge device on remain_time/MACHINE_ID, remaining_repair_time/MACHINE_ID, jobs/MACHINE_ID,
+finished_job/MACHINE_ID and telemetry_format/MACHINE_ID. All machines share one Mqtt connection.
+
+The state of the machines is stored in NumPy arrays (one entry per machine). Once per cycle the state machine is applied
+to all machines at once: do_the_job(), is_broken(), the cool down and the maintenance are vectorized over the arrays.
+The messages of the edge device are collected by the Mqtt thread and applied at the start of the next cycle,
+so the arrays are only changed by the main loop.
+The status and job codes, the limits of the breakdowns and the binary telemetry format come from machine_model.py,
+so the host and machine.py can not drift apart.
+
+Env variables:
+    * MACHINE_COUNT                                         - Amount of simulated machines (default 100).
+    * MACHINE_ID_PREFIX                                     - MACHINE_ID of the machines is MACHINE_ID_PREFIX + number (default "", ids 0, 1, 2, ...).
+    * MACHINE_ID_OFFSET                                     - Number of the first machine (default 0), for more than one host.
+    * TICK, CLOCK_MODE, SYNC_TOPIC                          - Clock of the simulation like in machine.py. With CLOCK_MODE=ack the next cycle
+                                                              starts when the edge device acknowledged the messages of all machines.
+    * SEED                                                  - Integer seed of the random values, the same SEED gives the same breakdowns.
+
+This script can be started without any arguments.
+
+Required imports: paho-mqtt, numpy.
+
+Functions:
+    * on_connect(client, userdata, flags, rc): none         - Gets triggered when the client connect to the Mqtt broker.
+
+    * on_message(client, userdata, msg): none               - Puts the messages of the edge device for the machines into the queue of the main loop.
+
+    * apply_message(machine_index, topic, message): none    - Applies an message of the edge device to the machine (same logic as on_message() in machine.py).
+
+    * wait_for_next_cycle(): none                           - Applies the messages of the edge device until the next cycle starts (depends on CLOCK_MODE).
+
+    * set_job(machine_index, job): none                     - Sets the job of an machine and the wear and temperatur that it adds every cycle.
+
+    * machine_dict(machine_index): dict                     - Values of an machine in the form of __data in machine.py.
+
+    * encode_machine(machine_index): bytes                  - Encodes an machine in the binary telemetry format version 1 or returns None.
+
+    * publish_machines(): none                              - Publish all machines to machines/ over the shared connection.
+
+    * do_the_job(working): none                             - Vectorized do_the_job() of machine.py for the machines in working.
+
+    * is_broken(candidates, lower, upper, probability): array - Vectorized is_broken() of machine.py for the machines in candidates.
+
+    * check_state_of_machines(): none                       - Applies the "state-machine-logic" to all machines. It will executed every loop.
+"""
+
+
+# -------------------------------- Imports -------------------------------- #
+
+import time
+import os
+import json
+import queue
+import struct
+import paho.mqtt.client as mqtt
+import numpy as np
+from machine_model import BROKEN_LIMITS, COOL_DOWN, JOB_STATUS, JOB_TYPE, LAYOUT_V1, RESETED_JOB, STATUS, TELEMETRY_FORMATS, TELEMETRY_MAGIC, WEAR
+
+# -------------------------------- Variables -------------------------------- #
+
+# Machines of this host
+__MACHINE_COUNT     = int(os.environ.get("MACHINE_COUNT", 100))
+__MACHINE_ID_PREFIX = os.environ.get("MACHINE_ID_PREFIX", "")
+__MACHINE_ID_OFFSET = int(os.environ.get("MACHINE_ID_OFFSET", 0))
+__MACHINE_IDS       = [__MACHINE_ID_PREFIX + str(__MACHINE_ID_OFFSET + number) for number in range(__MACHINE_COUNT)]
+__machine_indexes   = {MACHINE_ID: machine_index for machine_index, MACHINE_ID in enumerate(__MACHINE_IDS)}
+
+# Status codes (index in machine_model.STATUS)
+RUNNABLE, WORKING, BROKEN, MAINTANCE = (STATUS.index(status) for status in ("RUNNABLE", "WORKING", "BROKEN", "MAINTANCE"))
+
+# All Machine attributes, one entry per machine
+__status                = np.full(__MACHINE_COUNT, RUNNABLE, dtype=np.int8)
+__remain_time           = np.full(__MACHINE_COUNT, -1, dtype=np.int64)
+__working_time          = np.zeros(__MACHINE_COUNT, dtype=np.int64)
+__remaining_repair_time = np.zeros(__MACHINE_COUNT, dtype=np.int64)
+__wear                  = np.zeros(__MACHINE_COUNT, dtype=np.float64)
+__alignment             = np.zeros(__MACHINE_COUNT, dtype=np.float64)
+__temperatur            = np.zeros(__MACHINE_COUNT, dtype=np.float64)
+__remaining_job_time    = np.zeros(__MACHINE_COUNT, dtype=np.int64)
+__has_job               = np.zeros(__MACHINE_COUNT, dtype=bool)
+__job_wear              = np.zeros(__MACHINE_COUNT, dtype=np.float64)      # Wear that the job adds every cycle
+__job_temperatur        = np.zeros(__MACHINE_COUNT, dtype=np.float64)      # Temperatur that the job adds every cycle
+__jobs                  = [None] * __MACHINE_COUNT                         # Job dict of every machine (None -> reseted job)
+
+# Telemetry format that the edge device wants from every machine. 0 -> JSON
+__telemetry_format  = np.zeros(__MACHINE_COUNT, dtype=np.int8)
+
+# Messages of the edge device (machine_index, topic, message), applied by the main loop
+__messages          = queue.Queue()
+
+# Random numbers of the simulation. Seeded with SEED -> reproducible scenarios
+__SEED              = os.environ.get("SEED")
+__random            = np.random.default_rng(None if __SEED is None else int(__SEED))
+
+# Clock of the simulation: wall, ack or lockstep
+__TICK              = float(os.environ.get("TICK", 1))
+__CLOCK_MODE        = os.environ.get("CLOCK_MODE", "wall")
+__SYNC_TOPIC        = os.environ.get("SYNC_TOPIC", "clock/tick/")
+__acked             = np.zeros(__MACHINE_COUNT, dtype=bool)     # Machines whose last message was acknowledged (ack)
+__ticks             = 0                                         # Cycles of the sync messages that didnt start yet (lockstep)
+__next_cycle        = time.monotonic()                          # Start of the next cycle (wall)
+
+# -------------------------------- Functions -------------------------------- #
+
+def on_connect(client, userdata, flags, rc):
+    """ Prints at successful connection and subscribes the topics of all machines.
+        The subscriptions are wildcards over the MACHINE_ID, messages for machines of other hosts are ignored.
+    """
+    print("Connected with result code " + str(rc))
+
+    for topic in ("jobs", "remain_time", "remaining_repair_time", "finished_job", "telemetry_format", "ack"):
+        client.subscribe(topic + "/+/#")
+    client.subscribe(__SYNC_TOPIC)
+
+def on_message(client, userdata, msg):
+    """ Gets triggered when an subscribed topic receive an message.
+        Puts the message into the queue of the main loop when its for an machine of this host.
+    """
+    # Advance the clock
+    if msg.topic == __SYNC_TOPIC:
+        __messages.put((None, "sync", json.loads(msg.payload).get("ticks", 1) if len(msg.payload) > 0 else 1))
+        return
+
+    parts           = msg.topic.split("/")
+    machine_index   = __machine_indexes.get(parts[1]) if len(parts) > 1 else None
+
+    if machine_index is not None:
+        __messages.put((machine_index, parts[0], json.loads(msg.payload) if len(msg.payload) > 0 else None))
+
+def apply_message(machine_index, topic, message):
+    """Applies an message of the edge device to the machine (same logic as on_message() in machine.py).
+
+    Parameters
+    ----------
+    machine_index : int
+        index of the machine
+    topic : str
+        first part of the topic (e.g. jobs)
+    message : dict
+        decoded message
+
+    Returns
+    -------
+    none
+
+    """
+    global __ticks
+
+    # Sync message -> cycles that can start
+    if topic == "sync":
+        __ticks += message
+
+    # Edge device handled the last message of the machine
+    elif topic == "ack":
+        __acked[machine_index] = True
+
+    # If Machine get r_t from edge device set it
+    elif topic == "remain_time":
+        __remain_time[machine_index] = message["remain_time"]
+
+    # If Machine get an remaining_repair_time its going to MAINTANCE
+    elif topic == "remaining_repair_time":
+        set_job(machine_index, None)
+        __remaining_repair_time[machine_index]  = message["remaining_repair_time"]
+        __status[machine_index]                 = MAINTANCE
+
+    # Set Job and status on WORKING
+    elif topic == "jobs":
+        set_job(machine_index, message)
+        __status[machine_index]                 = WORKING
+
+    # Set state on RUNNABLE when an job is fininshed and reset the job
+    elif topic == "finished_job":
+        set_job(machine_index, None)
+        __status[machine_index]                 = RUNNABLE
+
+    # Edge device wants the binary format
+    elif topic == "telemetry_format":
+        if message["format"] in TELEMETRY_FORMATS:
+            __telemetry_format[machine_index]   = message["format"]
+
+def set_job(machine_index, job):
+    """Sets the job of an machine and the wear and temperatur that it adds every cycle.
+
+    Parameters
+    ----------
+    machine_index : int
+        index of the machine
+    job : dict
+        job of the edge device or None to reset the job
+
+    Returns
+    -------
+    none
+
+    """
+    __jobs[machine_index] = job
+
+    if job is None:
+        __has_job[machine_index]            = False
+        __remaining_job_time[machine_index] = 0
+        __job_wear[machine_index]           = 0
+        __job_temperatur[machine_index]     = 0
+        return
+
+    quantity = int(job["quantity"])
+
+    __has_job[machine_index]            = job["JOB_ID"] != "none"
+    __remaining_job_time[machine_index] = job["remaining_job_time"]
+    __job_wear[machine_index]           = WEAR.get(job["type"], 0)
+    __job_temperatur[machine_index]     = 0.5 if quantity >= 10 else 0.2 if quantity >= 5 else 0.1
+
+def machine_dict(machine_index):
+    """Values of an machine in the form of __data in machine.py.
+
+    Parameters
+    ----------
+    machine_index : int
+        index of the machine
+
+    Returns
+    -------
+    dict :
+        values of the machine
+    """
+    job = __jobs[machine_index]
+
+    if job is None:
+        job = dict(RESETED_JOB)
+    else:
+        job = dict(job, remaining_job_time=int(__remaining_job_time[machine_index]))
+
+    return {
+        "MACHINE_ID"                : __MACHINE_IDS[machine_index],
+        "Job"                       : job,
+        "status"                    : STATUS[__status[machine_index]],
+        "remain_time"               : int(__remain_time[machine_index]),
+        "working_time"              : int(__working_time[machine_index]),
+        "remaining_repair_time"     : int(__remaining_repair_time[machine_index]),
+        "wear"                      : float(__wear[machine_index]),
+        "alignment"                 : float(__alignment[machine_index]),
+        "temperatur"                : float(__temperatur[machine_index]),
+    }
+
+def encode_machine(machine_index):
+    """Encodes an machine in the binary telemetry format version 1 (see machine_model.py).
+
+    Parameters
+    ----------
+    machine_index : int
+        index of the machine
+
+    Returns
+    -------
+    bytes
+        encoded machine or None when a value doesnt fit in the format (e.g. an JOB_ID that is no number)
+
+    """
+    job = __jobs[machine_index]
+
+    try:
+        MACHINE_ID = __MACHINE_IDS[machine_index].encode("utf-8")
+
+        if job is None:
+            JOB_ID, job_time, quantity, job_type, job_status = -1, 0, 0, 0, 0
+        else:
+            JOB_ID      = -1 if job["JOB_ID"] == "none" else job["JOB_ID"]
+            job_time    = job["job_time"]
+            quantity    = int(job["quantity"])
+            job_type    = JOB_TYPE.index(job["type"])
+            job_status  = JOB_STATUS.index(job["status"])
+
+        return LAYOUT_V1.pack(TELEMETRY_MAGIC, 1,
+                              int(__status[machine_index]), int(__working_time[machine_index]), int(__remain_time[machine_index]),
+                              int(__remaining_repair_time[machine_index]),
+                              float(__wear[machine_index]), float(__alignment[machine_index]), float(__temperatur[machine_index]),
+                              JOB_ID, job_time, int(__remaining_job_time[machine_index]), quantity,
+                              job_type, job_status, len(MACHINE_ID)) + MACHINE_ID
+    except (struct.error, ValueError, KeyError, TypeError):
+        return None
+
+def publish_machines():
+    """Publish all machines to machines/ (edge device) over the shared connection.
+    An machine sends JSON (with the supported binary formats in telemetry_formats) until the edge device
+    answers on telemetry_format/MACHINE_ID. After this it sends the binary format.
+
+    Returns
+    -------
+    none
+
+    """
+    for machine_index in range(__MACHINE_COUNT):
+        payload = None
+
+        # Binary format if the edge device wants it
+        if __telemetry_format[machine_index] == 1:
+            payload = encode_machine(machine_index)
+
+        # Else JSON with the binary formats that the machine supports
+        if payload is None:
+            payload = json.dumps(dict(machine_dict(machine_index), telemetry_formats=list(TELEMETRY_FORMATS), clock=__CLOCK_MODE))
+
+        client.publish("machines/", payload)
+
+def do_the_job(working):
+    """The logic for work off the Jobs and demolating the machines (vectorized do_the_job() of machine.py).
+    The wear and temperatur of the job, a value between 0.0 - 0.4 for the alignment, +1 for the working_time
+    and -1 for the remaining_job_time are added to all machines in working that have an job.
+
+    Parameters
+    ----------
+    working : numpy.ndarray
+        bool mask of the machines that are WORKING and have remaining_job_time > 0
+
+    Returns
+    -------
+    none
+
+    """
+    doing = working & __has_job
+
+    __wear[doing]               += __job_wear[doing]
+    __temperatur[doing]         += __job_temperatur[doing]
+    __alignment[doing]          += __random.integers(0, 5, size=int(doing.sum())) / 10
+    __remaining_job_time[doing] -= 1
+    __working_time[doing]       += 1
+
+def is_broken(candidates, lower, upper, probability):
+    """Checks for all machines in candidates if any of their attributes is between this limits (lower - upper) to
+    decide if the machine is broken or not (vectorized is_broken() of machine.py).
+    If between -> (randomly generatet value from 0 to 100) < (probability).
+    If not between -> False
+    Lower an upper are included limits.
+
+    Parameters
+    ----------
+    candidates : numpy.ndarray
+        bool mask of the machines that get checked
+    lower : any
+        lower limit
+    upper : any
+        upper limit
+    probability : any
+        if any of the values from the machine is between the limits
+        the probability decide whether the machine is broken
+
+    Returns
+    -------
+    numpy.ndarray
+        bool mask of the broken machines
+    """
+    between = (((lower <= __wear) & (__wear <= upper)) | ((lower <= __alignment) & (__alignment <= upper))
+               | ((lower <= __temperatur) & (__temperatur <= upper)))
+
+    return candidates & between & (__random.integers(0, 100, size=__MACHINE_COUNT) < probability)
+
+def check_state_of_machines():
+    """Applies the "state-machine-logic" of check_state_of_machine() in machine.py to all machines at once.
+
+    Returns
+    -------
+    none
+    """
+    runnable    = __status == RUNNABLE
+    working     = (__status == WORKING) & (__remaining_job_time > 0)
+    maintance   = __status == MAINTANCE
+
+    # Machines will cool down until change on WORKING Status
+    cooling                 = runnable & (__temperatur > 0)
+    __temperatur[cooling]   -= COOL_DOWN
+    __temperatur[runnable & ~cooling] = 0
+
+    # Machines will do the job and check if they are broken
+    do_the_job(working)
+
+    broken = np.zeros(__MACHINE_COUNT, dtype=bool)
+    for lower, upper, probability in BROKEN_LIMITS:
+        broken |= is_broken(working & ~broken, lower, upper, probability)
+    __status[broken] = BROKEN
+
+    # Machines will get repaired then set the status on RUNNABLE
+    repairing                           = maintance & (__remaining_repair_time > 0)
+    repaired                            = maintance & ~repairing
+    __remaining_repair_time[repairing]  -= 1
+    __status[repaired]                  = RUNNABLE
+    __wear[repaired]                    = 0
+    __alignment[repaired]               = 0
+    __temperatur[repaired]              = 0
+    __working_time[repaired]            = 0
+    __remain_time[repaired]             = -1
+
+def wait_for_next_cycle():
+    """Applies the messages of the edge device until the next cycle starts.
+        wall     -> TICK seconds after the start of the last cycle
+        ack      -> the edge device acknowledged the last messages of all machines or TICK seconds are over
+        lockstep -> an sync message arrived
+
+    Returns
+    -------
+    none
+    """
+
+    global __next_cycle, __ticks
+
+    if __CLOCK_MODE == "wall":
+        __next_cycle += __TICK
+        time.sleep(max(0, __next_cycle - time.monotonic()))
+
+    deadline = time.monotonic() + __TICK
+
+    while True:
+
+        # Next cycle can start
+        if ((__CLOCK_MODE == "ack" and (__acked.all() or time.monotonic() >= deadline))
+                or (__CLOCK_MODE == "lockstep" and __ticks > 0)
+                or __CLOCK_MODE not in ("ack", "lockstep")):
+            break
+
+        try:
+            apply_message(*__messages.get(timeout=max(0, deadline - time.monotonic()) if __CLOCK_MODE == "ack" else None))
+        except queue.Empty:
+            pass
+
+    # Apply the messages that arrived in the meantime
+    while True:
+        try:
+            apply_message(*__messages.get_nowait())
+        except queue.Empty:
+            break
+
+    if __CLOCK_MODE == "lockstep":
+        __ticks -= 1
+
+    __acked[:] = False
+
+# -------------------------------- Need to be Initialized -------------------------------- #
+
+# Create one client for all machines and connect to the Mqtt Broker. The topics are subscribed in on_connect().
+client              = mqtt.Client()
+client.on_connect   = on_connect
+client.on_message   = on_message
+client.connect("localhost", 1883, 60)
+client.loop_start()
+
+print("Simulate " + str(__MACHINE_COUNT) + " machines: " + ", ".join(__MACHINE_IDS[:5]) + (" ..." if __MACHINE_COUNT > 5 else ""))
+
+# -------------------------------- Main Loop -------------------------------- #
+
+while True:
+
+    wait_for_next_cycle()
+    publish_machines()
+    check_state_of_machines()
+
+    # Prints the amount of machines in every status
+    print(", ".join(name + ": " + str(int(count)) for name, count in zip(STATUS, np.bincount(__status, minlength=4))))
@@ -0,0 +1,229 @@
+"""Machine Model
+
+State machine of an simulated machine without Mqtt, shared by machine.py (one machine per container) and the
+headless simulator (project/simulator/simulator.py). An machine is the dict that machine.py publishes
+(__data), the random values come from an random.Random that the caller owns, so an seeded caller gets
+reproducible breakdowns.
+The status and job codes, the limits of the breakdowns and the binary telemetry format are defined here once
+for machine.py and machine_host.py. The edge device decodes the same format in its own telemetry.py.
+
+Functions:
+    * new_machine(MACHINE_ID): dict                         - Machine with the start values.
+
+    * do_the_job(data, rng): none                           - Works off the job for one cycle and demolates the machine.
+
+    * is_broken(data, lower, upper, probability, rng): bool - Checks if any attribute of the machine is between the limits and draws the breakdown.
+
+    * check_broken(data, rng, limits): bool                 - Checks all limits of is_broken() like the machine does after every cycle of an job.
+
+    * step(data, rng, limits): none                         - Applies the "state-machine-logic" for one cycle.
+"""
+
+# -------------------------------- Imports -------------------------------- #
+
+import struct
+
+# -------------------------------- Variables -------------------------------- #
+
+# Status of an machine, type and status of an job. The index is the code in the binary telemetry format
+STATUS              = ("RUNNABLE", "WORKING", "BROKEN", "MAINTANCE")
+JOB_TYPE            = ("none", "hard", "normal", "soft")
+JOB_STATUS          = ("none", "unfinished", "processing", "finished")
+
+# Binary telemetry format version 1 (little endian, fixed layout, decoded by telemetry.py of the edge device):
+#   magic (B) = 0xED, version (B) = 1,
+#   status (B), working_time (i), remain_time (i), remaining_repair_time (i), wear (d), alignment (d), temperatur (d),
+#   JOB_ID (q, -1 = "none"), job_time (i), remaining_job_time (i), quantity (i), type (B), job status (B),
+#   length of MACHINE_ID (B), MACHINE_ID (utf-8)
+TELEMETRY_MAGIC     = 0xED
+TELEMETRY_FORMATS   = (1,)                                          # Binary formats that the machines support
+LAYOUT_V1           = struct.Struct("<BBBiiidddqiiiBBB")            # Fixed part of version 1
+
+# Wear that an job type adds every cycle
+WEAR                = {"hard": 0.5, "normal": 0.2, "soft": 0.1}
+
+# Constant reseted job
+RESETED_JOB         = { "JOB_ID": "none", "job_time": 0, "remaining_job_time": 0, "quantity": 0, "type": "none", "status": "none" }
+
+# Limits and probabilities of is_broken() (lower, upper, probability), checked in this order
+BROKEN_LIMITS       = ((3, 5, 1), (6, 8, 3), (9, 11, 6), (12, 14, 10), (15, 9999999, 60))
+
+# Temperatur that an RUNNABLE machine cools down every cycle
+COOL_DOWN           = 0.02
+
+# -------------------------------- Functions -------------------------------- #
+
+def new_machine(MACHINE_ID):
+    """Machine with the start values.
+
+    Parameters
+    ----------
+    MACHINE_ID : str
+        ID of the machine
+
+    Returns
+    -------
+    dict :
+        all attributes of the machine
+    """
+    return {
+        "MACHINE_ID"                : MACHINE_ID,
+        "Job"                       : dict(RESETED_JOB),
+        "status"                    : "RUNNABLE",
+        "remain_time"               :-1,
+        "working_time"              : 0,
+        "remaining_repair_time"     : 0,
+        "wear"                      : 0.0,
+        "alignment"                 : 0.0,
+        "temperatur"                : 0.0,
+    }
+
+def do_the_job(data, rng):
+    """The logic for work off the Jobs and demolating the machine every loop when the machine has an Job.
+    A value between 0.5 - 0.1 will add to the variables temperatur and wear depend on the job attributes. A value between 0.5 - 0.1 will add to alignment randomly.
+    +1 will add to working_time. -1 will add to remaining_job_time.
+
+    Parameters
+    ----------
+    data : dict
+        the machine
+    rng : random.Random
+        random values of the machine
+
+    Returns
+    -------
+    none
+
+    """
+    # If the machine has an Job. Dekrement the remaintime to finish the job.
+    if data["Job"]["JOB_ID"] != "none" and data["status"] == "WORKING":
+
+        # Wear += 0.1 - 0.5
+        if data["Job"]["type"] in WEAR:
+            data["wear"] += WEAR[data["Job"]["type"]]
+
+        # Temperatur += 0.1 - 0.5
+        if int(data["Job"]["quantity"]) >= 10:
+            data["temperatur"] += 0.5
+        elif int(data["Job"]["quantity"]) < 10 and int(data["Job"]["quantity"]) >= 5:
+            data["temperatur"] += 0.2
+        elif int(data["Job"]["quantity"]) < 5:
+            data["temperatur"] += 0.1
+
+        # Alignment += 0.1 - 0.5
+        data["alignment"] += float(rng.randrange(0,5) / 10)
+
+        # Dekrement remain job time
+        data["Job"]["remaining_job_time"]    -= 1
+
+        # Inkrement working_time
+        data["working_time"] += 1
+
+def is_broken(data, lower, upper, probability, rng):
+    """Checks if any of the attributes of the Machine is between this limits (lower - upper) to
+    decide if the machine is broken or not.
+    If between -> return if (randomly generatet value from 0 to 100 ) < (probability).
+    If not between -> return false
+    Lower an upper are included limits.
+
+    Parameters
+    ----------
+    data : dict
+        the machine
+    lower : any
+        lower limit
+    upper : any
+        upper limit
+    probability : any
+        if any of the values from the machine is between the limits
+        the probability decide whether the machine return true or false
+    rng : random.Random
+        random values of the machine
+
+    Returns
+    -------
+    bool
+        True: Machine values are between the limits and the random number is under probability
+        False: Machine values are NOT between the limits OR the random number is OVER probability
+
+    """
+    # Organische random funktion. Noise function.
+    # Decide if values are between limits and under the probability
+    if  (lower <= data["wear"] <= upper) or (lower <= data["alignment"] <= upper) or (lower <= data["temperatur"] <= upper):
+        return rng.randrange(0,100) < probability
+    else:
+        return False
+
+def check_broken(data, rng, limits=BROKEN_LIMITS):
+    """Checks the limits one after the other until one of them breaks the machine.
+
+    Parameters
+    ----------
+    data : dict
+        the machine
+    rng : random.Random
+        random values of the machine
+    limits : tuple
+        (lower, upper, probability) of every check
+
+    Returns
+    -------
+    bool
+        True if the machine is broken
+    """
+    for lower, upper, probability in limits:
+        if is_broken(data, lower, upper, probability, rng):
+            return True
+    return False
+
+def step(data, rng, limits=BROKEN_LIMITS):
+    """Applies the "state-machine-logic" for one cycle.
+
+    Parameters
+    ----------
+    data : dict
+        the machine
+    rng : random.Random
+        random values of the machine
+    limits : tuple
+        (lower, upper, probability) of the breakdown checks
+
+    Returns
+    -------
+    none
+    """
+    # Machine will cool down until change on WORKING Status
+    if data["status"] == "RUNNABLE":
+
+        # Cool down when no job have to do
+        if data["temperatur"] > 0:
+            data["temperatur"] -= COOL_DOWN
+        else:
+            data["temperatur"] = 0
+
+    # Machine will do the job. If r_j_t is > 0 do the job, else job is finished wait until job gets taken by the edge-device
+    elif data["status"] == "WORKING":
+        if data["Job"]["remaining_job_time"] > 0:
+
+            # Do the Job
+            do_the_job(data, rng)
+
+            # Check if the Machine is broken if true set status on broken
+            if check_broken(data, rng, limits):
+                data["status"]    = "BROKEN"
+
+    # Machine will get repaired then set the status on RUNNABLE. BROKEN machines do nothing until change on MAINTANCE Status
+    elif data["status"] == "MAINTANCE":
+
+        # If remain_time > 0 -> dekrement
+        if data["remaining_repair_time"] > 0:
+            data["remaining_repair_time"] -= 1
+
+        # Else -> reset attributes and set status on RUNNABLE
+        else:
+            data["status"]        = "RUNNABLE"
+            data["wear"]          = 0
+            data["alignment"]     = 0
+            data["temperatur"]    = 0
+            data["working_time"]  = 0
+            data["remain_time"]   = -1
@@ -0,0 +1,287 @@
+"""Benchmark
+
+Reproducible benchmark of the order processing. For every scenario of the sweep (amount of machines, amount of jobs,
+job mix, quantity and prediction on/off) the jobs are generated with SEED and processed, then the metrics are written
+to an JSON file (RESULTS), so an regression in deploy_job() or in the main loop can be found by comparing two files.
+
+Modes (MODE):
+    * e2e                                                   - Runs the real edge device (edge-device.py) against an machine host (machine_host.py)
+                                                              with CLOCK_MODE=ack and an local job table (JOB_TABLE_BACKEND=local). An Mqtt broker
+                                                              must run on localhost:1883. The benchmark listens to all topics to measure:
+                                                                jobs per hour, makespan, time from RUNNABLE to the job (p50/p99),
+                                                                CPU of the edge device per machine and messages per second.
+    * simulation                                            - Runs the headless simulator (simulator.py). Measures the jobs per hour, the makespan
+                                                              and the dispatch latency in cycles and the CPU time of the run.
+
+Env variables (lists are separated by ",", the job mixes and quantities by ";"):
+    * MODE                                                  - e2e or simulation (default e2e).
+    * MACHINES                                              - Amounts of machines (default 3,10).
+    * JOBS                                                  - Amounts of jobs (default 50).
+    * MIX                                                   - Job types to choose from, an type can be repeated to weight it (default hard,normal,soft).
+    * QUANTITY                                              - Lowest-highest quantity of the jobs (default 1-14).
+    * PREDICTION                                            - Prediction on/off (default False). True needs MODEL.
+    * MODEL                                                 - Path to an KI-Model (joblib or an JSON artifact, see model_artifact.py) for the prediction.
+    * SEED                                                  - Seed of the jobs, the machines and the edge device (default 0).
+    * WORKLOAD                                              - Workload file (see helper_scripts/generate_random_jobs.py). If set every scenario
+                                                              processes its jobs instead of generated ones (JOBS, MIX and QUANTITY are ignored).
+    * TIMEOUT                                               - Seconds after that an e2e scenario is stopped (default 600).
+    * RESULTS                                               - Path of the JSON file (default benchmark_results.json).
+
+This script can be started without any arguments: python benchmark.py
+
+Required imports: paho-mqtt (e2e), numpy and joblib only with prediction.
+
+Functions:
+    * scenarios(): list                                     - All scenarios of the sweep from the Env variables.
+
+    * run_e2e(scenario, jobs): dict                         - Runs an scenario with the edge device and the machine host and returns the metrics.
+
+    * run_simulation(scenario, jobs): dict                  - Runs an scenario with the headless simulator and returns the metrics.
+"""
+
+# -------------------------------- Imports -------------------------------- #
+
+import itertools
+import json
+import os
+import platform
+import random
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+# simulator puts project/machine and project/edge-device on the path
+from simulator import Simulation, generate_jobs, load_workload, percentile
+
+import telemetry
+from job_table import LocalTable
+
+# -------------------------------- Variables -------------------------------- #
+
+__DIRECTORY         = os.path.dirname(os.path.abspath(__file__))
+__EDGE_DEVICE       = os.path.join(__DIRECTORY, "..", "edge-device", "edge-device.py")
+__MACHINE_HOST      = os.path.join(__DIRECTORY, "..", "machine", "machine_host.py")
+
+__MODE              = os.environ.get("MODE", "e2e")
+__SEED              = os.environ.get("SEED", "0")
+__MODEL             = os.environ.get("MODEL")
+__TIMEOUT           = float(os.environ.get("TIMEOUT", 600))
+__RESULTS           = os.environ.get("RESULTS", "benchmark_results.json")
+__WORKLOAD          = os.environ.get("WORKLOAD")
+
+# -------------------------------- Functions -------------------------------- #
+
+def scenarios():
+    """All scenarios of the sweep from the Env variables.
+
+    Returns
+    -------
+    list :
+        scenarios {machines, jobs, mix, quantity, prediction}
+    """
+    machines    = [int(value) for value in os.environ.get("MACHINES", "3,10").split(",")]
+    jobs        = [int(value) for value in os.environ.get("JOBS", "50").split(",")]
+    mixes       = [tuple(mix.split(",")) for mix in os.environ.get("MIX", "hard,normal,soft").split(";")]
+    quantities  = [tuple(int(value) for value in quantity.split("-")) for quantity in os.environ.get("QUANTITY", "1-14").split(";")]
+    predictions = [value != "False" for value in os.environ.get("PREDICTION", "False").split(",")]
+
+    return [{"machines": m, "jobs": j, "mix": list(mix), "quantity": list(quantity), "prediction": prediction}
+            for m, j, mix, quantity, prediction in itertools.product(machines, jobs, mixes, quantities, predictions)]
+
+def run_e2e(scenario, jobs):
+    """Runs an scenario with the edge device and the machine host and returns the metrics.
+    The scenario is done when all jobs are finished in the local job table.
+
+    Parameters
+    ----------
+    scenario : dict
+        the scenario
+    jobs : list
+        fields of the jobs
+
+    Returns
+    -------
+    dict :
+        metrics of the run
+    """
+    import paho.mqtt.client as mqtt
+
+    directory   = tempfile.mkdtemp(prefix="edge-benchmark-")
+    table_path  = os.path.join(directory, "jobs.json")
+    LocalTable(table_path).batch_insert(jobs)
+
+    if scenario["prediction"]:
+        os.makedirs(os.path.join(directory, "storage"))
+        shutil.copyfile(__MODEL, os.path.join(directory, "storage", "model" + os.path.splitext(__MODEL)[1]))
+
+    # Observed machine messages
+    lock            = threading.Lock()
+    messages        = [0]
+    cycles          = [0]
+    runnable_since  = dict()    # MACHINE_ID -> (time, machine messages) when the machine got RUNNABLE
+    latencies       = list()    # (seconds, cycles) from RUNNABLE to WORKING
+
+    def on_message(client, userdata, msg):
+        with lock:
+            messages[0] += 1
+
+            if msg.topic != "machines/":
+                return
+
+            cycles[0]   += 1
+            machine     = telemetry.decode(msg.payload)
+
+            if machine["status"] == "RUNNABLE":
+                runnable_since.setdefault(machine["MACHINE_ID"], (time.monotonic(), cycles[0]))
+
+            elif machine["status"] == "WORKING" and machine["MACHINE_ID"] in runnable_since:
+                since, since_cycles = runnable_since.pop(machine["MACHINE_ID"])
+                latencies.append((time.monotonic() - since, (cycles[0] - since_cycles) / scenario["machines"]))
+
+            else:
+                runnable_since.pop(machine["MACHINE_ID"], None)
+
+    # Edge device with the local job table and the local storage
+    edge_env = dict(os.environ, PYTHONUNBUFFERED="1", JOB_TABLE_BACKEND="local", LOCAL_JOB_TABLE=table_path, JOB_FLUSH_INTERVAL="0.1",
+                    RECORD_MACHINE_DATA="False", PREDICTION=str(scenario["prediction"]), PATH_TO_ML_FILE="model" + os.path.splitext(str(__MODEL))[1],
+                    STORAGE_BACKEND="local", LOCAL_STORAGE_PATH=os.path.join(directory, "storage"),
+                    MODEL_CACHE_DIR=os.path.join(directory, "model_cache"), SEED=__SEED)
+    edge = subprocess.Popen([sys.executable, __EDGE_DEVICE], cwd=directory, env=edge_env,
+                            stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+
+    # Read the output of the edge device until its started, then drop it
+    started = threading.Event()
+    output  = list()
+
+    def read_output():
+        for line in edge.stdout:
+            output.append(line)
+            del output[:-20]
+            if line.startswith("Startup:"):
+                started.set()
+        started.set()
+
+    threading.Thread(target=read_output, daemon=True).start()
+    started.wait(60)
+    if edge.poll() is not None:
+        raise RuntimeError("Edge device stopped:\n" + "".join(output))
+
+    observer            = mqtt.Client()
+    observer.on_message = on_message
+    observer.connect("localhost", 1883, 60)
+    observer.subscribe("#")
+    observer.loop_start()
+
+    host_env    = dict(os.environ, MACHINE_COUNT=str(scenario["machines"]), CLOCK_MODE="ack", TICK="1", SEED=__SEED)
+    host        = subprocess.Popen([sys.executable, __MACHINE_HOST], cwd=directory, env=host_env, stdout=subprocess.DEVNULL)
+    start       = time.monotonic()
+
+    # Wait until all jobs are finished
+    finished = 0
+    while time.monotonic() - start < __TIMEOUT:
+        time.sleep(0.1)
+        finished = sum(1 for record in LocalTable(table_path).get_all() if record["fields"]["status"] == "finished")
+        if finished >= len(jobs):
+            break
+    makespan = time.monotonic() - start
+
+    # Stop the machines and the edge device, the CPU time of the edge device is taken from its resource usage
+    host.terminate()
+    host.wait()
+    edge.send_signal(signal.SIGTERM)
+    pid, status, usage = os.wait4(edge.pid, 0)
+    observer.loop_stop()
+    observer.disconnect()
+    shutil.rmtree(directory, ignore_errors=True)
+
+    edge_cpu = usage.ru_utime + usage.ru_stime
+
+    with lock:
+        return {
+            "finished_jobs"                 : finished,
+            "timed_out"                     : finished < len(jobs),
+            "makespan_seconds"              : makespan,
+            "makespan_cycles"               : cycles[0] / scenario["machines"],
+            "jobs_per_hour"                 : finished * 3600 / makespan,
+            "dispatch_latency_p50_seconds"  : percentile([latency[0] for latency in latencies], 50),
+            "dispatch_latency_p99_seconds"  : percentile([latency[0] for latency in latencies], 99),
+            "dispatch_latency_p50_cycles"   : percentile([latency[1] for latency in latencies], 50),
+            "dispatch_latency_p99_cycles"   : percentile([latency[1] for latency in latencies], 99),
+            "edge_cpu_seconds"              : edge_cpu,
+            "edge_cpu_per_machine"          : edge_cpu / scenario["machines"] / makespan,
+            "messages"                      : messages[0],
+            "messages_per_second"           : messages[0] / makespan,
+        }
+
+def run_simulation(scenario, jobs):
+    """Runs an scenario with the headless simulator and returns the metrics.
+
+    Parameters
+    ----------
+    scenario : dict
+        the scenario
+    jobs : list
+        fields of the jobs
+
+    Returns
+    -------
+    dict :
+        metrics of the run
+    """
+    predictor = None
+    if scenario["prediction"]:
+        from predictor import Predictor
+
+        if __MODEL.endswith(".json"):
+            from model_artifact import load_artifact
+            predictor = Predictor(load_artifact(__MODEL))
+        else:
+            import joblib
+            predictor = Predictor(joblib.load(__MODEL))
+
+    cpu     = time.process_time()
+    report  = Simulation(scenario["machines"], jobs, __SEED, predictor).run()
+
+    return {
+        "finished_jobs"                 : report["finished_jobs"],
+        "makespan_cycles"               : report["makespan"],
+        "jobs_per_hour"                 : report["jobs_per_hour"],
+        "dispatch_latency_p50_cycles"   : report["dispatch_latency_p50"],
+        "dispatch_latency_p99_cycles"   : report["dispatch_latency_p99"],
+        "breakdowns"                    : report["breakdowns"],
+        "repair_time"                   : report["repair_time"],
+        "cpu_seconds"                   : time.process_time() - cpu,
+    }
+
+# -------------------------------- Main -------------------------------- #
+
+if __name__ == "__main__":
+
+    if __MODEL is None and "True" in os.environ.get("PREDICTION", ""):
+        sys.exit("PREDICTION=True needs MODEL")
+
+    results = list()
+
+    for scenario in scenarios():
+        if __WORKLOAD is not None:
+            jobs = load_workload(__WORKLOAD)
+            scenario.update(jobs=len(jobs), mix=None, quantity=None, workload=__WORKLOAD)
+        else:
+            jobs = generate_jobs(scenario["jobs"], random.Random(__SEED), tuple(scenario["mix"]), tuple(scenario["quantity"]))
+
+        print("Run " + json.dumps(scenario))
+        metrics = run_e2e(scenario, jobs) if __MODE == "e2e" else run_simulation(scenario, jobs)
+        print(json.dumps(metrics))
+
+        results.append(dict(scenario, **metrics))
+
+    with open(__RESULTS, "w") as results_file:
+        json.dump({"created": datetime.utcnow().isoformat() + "Z", "mode": __MODE, "seed": __SEED, "python": platform.python_version(),
+                   "results": results}, results_file, indent=4)
+
+    print("Results written to " + __RESULTS)
@@ -0,0 +1,475 @@
+"""Simulator
+
+Headless discrete-event simulation of the factory without Mqtt, database and cloud. The machines use the
+state machine of machine_model.py (project/machine) and the edge device decisions of dispatch.py
+(project/edge-device), so an run here behaves like the containers but the time jumps from event to event:
+    * DISPATCH                                              - An RUNNABLE machine gets handled by the edge device (job, riskly job, maintenance or waiting).
+    * FINISHED                                              - An machine finished its job.
+    * BROKEN                                                - An machine broke during its job. The job goes back to the ready jobs with its remaining_job_time
+                                                              (or is finished when it was done in the cycle of the breakdown).
+The cycles of an job and of an repair are calculated at once with machine_model.step(), the cycles in which an machine
+only waits or cools down are skipped. An command of the edge device reaches the machine LATENCY cycles after the
+state that it reacts to (1 cycle like the containers with an tick of 1 s).
+With an KI-Model (MODEL) the remain_time of the machine is predicted when the machine gets handled, else the
+shortest job is deployed (like PREDICTION=False).
+
+At the end an report with the makespan, the breakdowns, the repair times and the dispatch latency (cycles from RUNNABLE
+until the job reached the machine) is printed (and written as JSON to REPORT).
+
+Env variables:
+    * MACHINES                                              - Amount of machines (default 3).
+    * JOBS                                                  - Amount of random jobs like generate_random_jobs.py (default 200).
+    * WORKLOAD                                              - JSON file with an list of jobs (job_time, remaining_job_time, quantity, type). Replaces JOBS.
+    * SEED                                                  - Seed of the jobs, the machines and the edge device (default 0).
+    * MODEL                                                 - Path to an KI-Model (joblib or an JSON artifact, see model_artifact.py). If set the remain_time is predicted.
+    * REPAIR_TIME, TOTAL_DAMAGE_REPAIR_TIME, TOTAL_DAMAGE_PROBABILITY
+                                                            - Repair times of the edge device (default see dispatch.py).
+    * BROKEN_LIMITS                                         - Limits of is_broken() as lower:upper:probability,... (default see machine_model.py).
+    * LATENCY                                               - Cycles until an command of the edge device reaches the machine (default 1).
+    * REPORT                                                - Path of the JSON report (optional).
+
+This script can be started without any arguments: python simulator.py
+
+Required imports: numpy and joblib only with MODEL (numpy only with an JSON artifact).
+
+Classes:
+    * JobPool(jobs)                                         - Jobs of the simulation with the interface of the JobStore that dispatch.choose_job() uses.
+
+    * Simulation(machines, jobs, seed, predictor, repair_time, total_damage_repair_time, total_damage_probability, broken_limits, latency)
+                                                            - Discrete-event simulation of the machines and the edge device.
+
+        * run(max_time): dict                               - Runs until all jobs are finished and returns the report.
+
+Functions:
+    * generate_jobs(count, rng, types, quantity, job_time): list
+                                                            - Random jobs like generate_random_jobs.py.
+
+    * load_workload(path): list                             - Jobs of an workload file.
+
+    * percentile(values, percent): any                      - Percentile of the values (nearest rank).
+
+    * parse_broken_limits(text): tuple                      - Limits of is_broken() from lower:upper:probability,...
+"""
+
+# -------------------------------- Imports -------------------------------- #
+
+import heapq
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "machine"))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "edge-device"))
+
+import machine_model
+import dispatch
+from ready_queue import ReadyQueue
+
+# -------------------------------- Variables -------------------------------- #
+
+DISPATCH    = 0
+FINISHED    = 1
+BROKEN      = 2
+
+# -------------------------------- Classes -------------------------------- #
+
+class JobPool:
+    """Jobs of the simulation with the interface of the JobStore that dispatch.choose_job() uses.
+
+    Parameters
+    ----------
+    jobs : list
+        fields of the jobs (JOB_ID, job_time, remaining_job_time, quantity, type, status)
+    """
+
+    def __init__(self, jobs):
+        self._jobs      = {job["JOB_ID"]: dict(job) for job in jobs}
+        self._queue     = ReadyQueue()
+        self.unfinished = 0
+
+        for job in self._jobs.values():
+            self._queue.put(job)
+            if job["status"] != "finished" and job["remaining_job_time"] > 0:
+                self.unfinished += 1
+
+    def ready_count(self):
+        """Amount of unfinished jobs that are not taken."""
+        return len(self._queue)
+
+    def shortest_job(self):
+        """Fields of the shortest unfinished job that is not taken or None."""
+        JOB_ID = self._queue.shortest()
+        return dict(self._jobs[JOB_ID]) if JOB_ID is not None else None
+
+    def largest_job_under(self, limit):
+        """Fields of the largest unfinished job with remaining_job_time < limit that is not taken or None."""
+        JOB_ID = self._queue.largest_under(limit)
+        return dict(self._jobs[JOB_ID]) if JOB_ID is not None else None
+
+    def take(self, JOB_ID):
+        """Marks an job as taken by an machine and sets it on processing."""
+        self._queue.take(JOB_ID)
+        self._jobs[JOB_ID]["status"] = "processing"
+
+    def give_back(self, JOB_ID, remaining_job_time):
+        """Job of an broken machine. It gets unfinished with the remaining_job_time and can be deployed again."""
+        self._jobs[JOB_ID].update(status="unfinished", remaining_job_time=remaining_job_time)
+        self._queue.put(self._jobs[JOB_ID])
+        self._queue.release(JOB_ID)
+
+    def finish(self, JOB_ID):
+        """Sets an job on finished."""
+        self._jobs[JOB_ID].update(status="finished", remaining_job_time=0)
+        self._queue.put(self._jobs[JOB_ID])
+        self._queue.release(JOB_ID)
+        self.unfinished -= 1
+
+class Simulation:
+    """Discrete-event simulation of the machines and the edge device.
+
+    Parameters
+    ----------
+    machines : int
+        amount of machines
+    jobs : list
+        fields of the jobs
+    seed : any
+        seed of the machines and the edge device
+    predictor : any
+        Predictor (predictor.py) for the remain_time or None for the shortest job first
+    repair_time : int
+        constant repair time
+    total_damage_repair_time : int
+        constant total damage repair time
+    total_damage_probability : int
+        probability (0 - 100) of an total damage
+    broken_limits : tuple
+        (lower, upper, probability) of the breakdown checks
+    latency : int
+        cycles until an command of the edge device reaches the machine
+    """
+
+    def __init__(self, machines, jobs, seed=0, predictor=None, repair_time=dispatch.REPAIR_TIME,
+                 total_damage_repair_time=dispatch.TOTAL_DAMAGE_REPAIR_TIME, total_damage_probability=dispatch.TOTAL_DAMAGE_PROBABILITY,
+                 broken_limits=machine_model.BROKEN_LIMITS, latency=1):
+        self.pool                       = JobPool(jobs)
+        self.machines                   = [machine_model.new_machine(str(i)) for i in range(machines)]
+        self._rngs                      = [random.Random(str(seed) + "/" + str(i)) for i in range(machines)]
+        self._edge_rng                  = random.Random(seed)
+        self._predictor                 = predictor
+        self._repair_time               = repair_time
+        self._total_damage_repair_time  = total_damage_repair_time
+        self._total_damage_probability  = total_damage_probability
+        self._broken_limits             = broken_limits
+        self._latency                   = latency
+        self._events                    = list()        # Heap of (time, sequence, kind, machine_index)
+        self._sequence                  = 0
+        self._idle_since                = [0] * machines    # Cycle since that the machine is RUNNABLE
+        self._waiting                   = list()        # Machines that wait for an job
+        self._runnable_since            = [0] * machines    # Cycle since that the machine is RUNNABLE (for the dispatch latency)
+        self.dispatch_latencies         = list()        # Cycles from RUNNABLE until the job reached the machine
+        self.stats                      = {"breakdowns": 0, "total_damages": 0, "repair_time": 0, "maintenances": 0, "maintenance_time": 0,
+                                           "risky_jobs": 0, "deployed_jobs": 0, "working_time": 0, "finished_jobs": 0, "makespan": 0}
+
+    def run(self, max_time=None):
+        """Runs until all jobs are finished (or max_time cycles are over) and returns the report.
+
+        Parameters
+        ----------
+        max_time : int
+            last cycle that gets simulated (None -> no limit)
+
+        Returns
+        -------
+        dict :
+            report of the simulation
+        """
+        started = time.perf_counter()
+
+        for machine_index in range(len(self.machines)):
+            self._push(0, DISPATCH, machine_index)
+
+        while len(self._events) > 0 and self.pool.unfinished > 0:
+            now, sequence, kind, machine_index = heapq.heappop(self._events)
+
+            if max_time is not None and now > max_time:
+                break
+
+            if kind == DISPATCH:
+                self._dispatch(machine_index, now)
+            elif kind == FINISHED:
+                self._finished(machine_index, now)
+            elif kind == BROKEN:
+                self._broken(machine_index, now)
+
+        return self.report(time.perf_counter() - started)
+
+    def report(self, wall_seconds):
+        """Report of the simulation. An cycle is 1 s like in the containers.
+
+        Parameters
+        ----------
+        wall_seconds : float
+            real duration of the simulation
+
+        Returns
+        -------
+        dict :
+            report of the simulation
+        """
+        makespan        = self.stats["makespan"]
+        machine_hours   = len(self.machines) * makespan / 3600
+
+        return dict(self.stats,
+                    machines                    = len(self.machines),
+                    jobs                        = self.stats["finished_jobs"] + self.pool.unfinished,
+                    unfinished_jobs             = self.pool.unfinished,
+                    prediction                  = self._predictor is not None,
+                    jobs_per_hour               = self.stats["finished_jobs"] * 3600 / makespan if makespan > 0 else 0,
+                    dispatch_latency_p50        = percentile(self.dispatch_latencies, 50),
+                    dispatch_latency_p99        = percentile(self.dispatch_latencies, 99),
+                    utilization                 = self.stats["working_time"] / (len(self.machines) * makespan) if makespan > 0 else 0,
+                    machine_hours               = machine_hours,
+                    wall_seconds                = wall_seconds,
+                    machine_hours_per_second    = machine_hours / wall_seconds if wall_seconds > 0 else 0)
+
+    def _push(self, at, kind, machine_index):
+        """Schedules an event."""
+        heapq.heappush(self._events, (at, self._sequence, kind, machine_index))
+        self._sequence += 1
+
+    def _cool_down(self, machine_index, until):
+        """Cools an RUNNABLE machine down until the cycle. Stops early when the temperatur is 0."""
+        data    = self.machines[machine_index]
+        cycles  = until - self._idle_since[machine_index]
+
+        while cycles > 0 and data["temperatur"] != 0:
+            machine_model.step(data, self._rngs[machine_index], self._broken_limits)
+            cycles -= 1
+
+        self._idle_since[machine_index] = until
+
+    def _dispatch(self, machine_index, now):
+        """The edge device handles an RUNNABLE machine."""
+        data = self.machines[machine_index]
+        self._cool_down(machine_index, now)
+
+        # Predict the remain_time with the actual values of the machine
+        if self._predictor is not None:
+            data["remain_time"] = self._predictor.predict([[data["working_time"], data["wear"], data["alignment"], data["temperatur"]]])[0]
+
+        action, job = dispatch.choose_job(self.pool, data, self._predictor is not None)
+
+        if action == dispatch.WAIT:
+            self._waiting.append(machine_index)
+
+        elif action == dispatch.MAINTANCE:
+            self.stats["maintenances"]      += 1
+            self.stats["maintenance_time"]  += self._repair_time
+            self._repair(machine_index, now + self._latency, self._repair_time)
+
+        else:
+            if action == dispatch.RISKY_JOB:
+                self.stats["risky_jobs"] += 1
+            self.stats["deployed_jobs"] += 1
+
+            # The job reaches the machine, until then it cools down
+            self.pool.take(job["JOB_ID"])
+            self._cool_down(machine_index, now + self._latency)
+            self.dispatch_latencies.append(now + self._latency - self._runnable_since[machine_index])
+            data["Job"]     = job
+            data["status"]  = "WORKING"
+
+            # All cycles of the job until its finished or the machine is broken
+            cycles = 0
+            while data["status"] == "WORKING" and data["Job"]["remaining_job_time"] > 0:
+                machine_model.step(data, self._rngs[machine_index], self._broken_limits)
+                cycles += 1
+
+            self.stats["working_time"] += cycles
+            self._push(now + self._latency + cycles, BROKEN if data["status"] == "BROKEN" else FINISHED, machine_index)
+
+    def _finished(self, machine_index, now):
+        """An machine finished its job. The job is set on finished and the machine gets RUNNABLE."""
+        data = self.machines[machine_index]
+
+        self.pool.finish(data["Job"]["JOB_ID"])
+        self.stats["finished_jobs"] += 1
+        self.stats["makespan"]      = now
+
+        # finished_job reaches the machine
+        data["Job"]     = dict(machine_model.RESETED_JOB)
+        data["status"]  = "RUNNABLE"
+        self._idle_since[machine_index]     = now + self._latency
+        self._runnable_since[machine_index] = now + self._latency
+        self._push(now + self._latency, DISPATCH, machine_index)
+
+    def _broken(self, machine_index, now):
+        """An machine broke. The job goes back to the ready jobs and the machine gets an repair time."""
+        data = self.machines[machine_index]
+
+        # An job that was done in the cycle of the breakdown is finished
+        if data["Job"]["remaining_job_time"] > 0:
+            self.pool.give_back(data["Job"]["JOB_ID"], data["Job"]["remaining_job_time"])
+        else:
+            self.pool.finish(data["Job"]["JOB_ID"])
+            self.stats["finished_jobs"] += 1
+            self.stats["makespan"]      = now
+
+        repair_time = dispatch.repair_time(self._edge_rng, self._repair_time, self._total_damage_repair_time, self._total_damage_probability)
+
+        self.stats["breakdowns"]    += 1
+        self.stats["repair_time"]   += repair_time
+        if repair_time == self._total_damage_repair_time:
+            self.stats["total_damages"] += 1
+
+        self._repair(machine_index, now + self._latency, repair_time)
+
+        # The job can be deployed to the waiting machines
+        for waiting in self._waiting:
+            self._push(now, DISPATCH, waiting)
+        self._waiting = list()
+
+    def _repair(self, machine_index, at, repair_time):
+        """remaining_repair_time reaches the machine. It gets repaired and is RUNNABLE afterwards."""
+        data                            = self.machines[machine_index]
+        data["Job"]                     = dict(machine_model.RESETED_JOB)
+        data["remaining_repair_time"]   = repair_time
+        data["status"]                  = "MAINTANCE"
+
+        cycles = 0
+        while data["status"] == "MAINTANCE":
+            machine_model.step(data, self._rngs[machine_index], self._broken_limits)
+            cycles += 1
+
+        self._idle_since[machine_index]     = at + cycles
+        self._runnable_since[machine_index] = at + cycles
+        self._push(at + cycles, DISPATCH, machine_index)
+
+# -------------------------------- Functions -------------------------------- #
+
+def generate_jobs(count, rng, types=("hard", "normal", "soft"), quantity=(1, 14), job_time=(5, 30)):
+    """Random jobs like generate_random_jobs.py.
+
+    Parameters
+    ----------
+    count : int
+        amount of jobs
+    rng : random.Random
+        random values of the jobs
+    types : tuple
+        job types to choose from (an type can be repeated to weight it)
+    quantity : tuple
+        lowest and highest quantity
+    job_time : tuple
+        lowest and highest job_time
+
+    Returns
+    -------
+    list :
+        fields of the jobs
+    """
+    jobs = list()
+
+    for JOB_ID in range(1, count + 1):
+        length = rng.randint(*job_time)
+        jobs.append({"JOB_ID": JOB_ID, "job_time": length, "remaining_job_time": length, "quantity": rng.randint(*quantity),
+                     "type": rng.choice(types), "status": "unfinished"})
+
+    return jobs
+
+def load_workload(path):
+    """Jobs of an workload file (JSON list of jobs). Jobs without JOB_ID are numbered, missing
+    remaining_job_time and status are taken from job_time and unfinished.
+
+    Parameters
+    ----------
+    path : str
+        path to the workload file
+
+    Returns
+    -------
+    list :
+        fields of the jobs
+    """
+    with open(path) as workload_file:
+        jobs = json.load(workload_file)
+
+    for JOB_ID, job in enumerate(jobs, 1):
+        job.setdefault("JOB_ID", JOB_ID)
+        job.setdefault("remaining_job_time", job["job_time"])
+        job.setdefault("status", "unfinished")
+
+    return jobs
+
+def percentile(values, percent):
+    """Percentile of the values (nearest rank).
+
+    Parameters
+    ----------
+    values : list
+        values
+    percent : float
+        0 - 100
+
+    Returns
+    -------
+    any :
+        the percentile or None when there are no values
+    """
+    if len(values) <= 0:
+        return None
+
+    values = sorted(values)
+    return values[max(0, min(len(values) - 1, -(-len(values) * percent // 100) - 1))]
+
+def parse_broken_limits(text):
+    """Limits of is_broken() from lower:upper:probability,...
+
+    Parameters
+    ----------
+    text : str
+        e.g. 3:5:1,6:8:3
+
+    Returns
+    -------
+    tuple :
+        (lower, upper, probability) of every check
+    """
+    return tuple(tuple(float(value) for value in limit.split(":")) for limit in text.split(","))
+
+# -------------------------------- Main -------------------------------- #
+
+if __name__ == "__main__":
+
+    seed    = os.environ.get("SEED", "0")
+    jobs    = load_workload(os.environ["WORKLOAD"]) if "WORKLOAD" in os.environ else generate_jobs(int(os.environ.get("JOBS", 200)), random.Random(seed))
+
+    # KI-Model for the prediction of the remain_time
+    predictor = None
+    if "MODEL" in os.environ:
+        from predictor import Predictor
+
+        if os.environ["MODEL"].endswith(".json"):
+            from model_artifact import load_artifact
+            predictor = Predictor(load_artifact(os.environ["MODEL"]))
+        else:
+            import joblib
+            predictor = Predictor(joblib.load(os.environ["MODEL"]))
+
+    simulation = Simulation(int(os.environ.get("MACHINES", 3)), jobs, seed, predictor,
+                            int(os.environ.get("REPAIR_TIME", dispatch.REPAIR_TIME)),
+                            int(os.environ.get("TOTAL_DAMAGE_REPAIR_TIME", dispatch.TOTAL_DAMAGE_REPAIR_TIME)),
+                            int(os.environ.get("TOTAL_DAMAGE_PROBABILITY", dispatch.TOTAL_DAMAGE_PROBABILITY)),
+                            parse_broken_limits(os.environ["BROKEN_LIMITS"]) if "BROKEN_LIMITS" in os.environ else machine_model.BROKEN_LIMITS,
+                            int(os.environ.get("LATENCY", 1)))
+    report = simulation.run()
+
+    for key, value in report.items():
+        print(key + ": " + str(round(value, 3) if isinstance(value, float) else value))
+
+    if "REPORT" in os.environ:
+        with open(os.environ["REPORT"], "w") as report_file:
+            json.dump(report, report_file, indent=4)